@@ -0,0 +1,60 @@
+"""
+Benchmark StepBuilder.add_mesh_solid against the per-face reference loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_mesh_solid --subdivisions 5 6 7
+"""
+import argparse
+import time
+
+import trimesh
+
+from src.step_builder import StepBuilder
+
+
+def time_builder(method, vertices, faces, intern=False):
+    builder = StepBuilder(intern=intern)
+    start = time.perf_counter()
+    getattr(builder, method)(vertices, faces)
+    elapsed = time.perf_counter() - start
+    return elapsed, "\n".join(builder.entities), builder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subdivisions", type=int, nargs="+", default=[5, 6, 7],
+                        help="icosphere subdivision levels (level 7 = 327,680 faces)")
+    parser.add_argument("--skip-reference", action="store_true",
+                        help="only time the batched path (reference loop is slow on big meshes)")
+    parser.add_argument("--intern", action="store_true",
+                        help="also time the batched path with entity interning and report size savings")
+    args = parser.parse_args()
+
+    print(f"{'faces':>10} {'batched s':>10} {'s/M faces':>10} {'reference s':>12} {'speedup':>8} identical")
+    for level in args.subdivisions:
+        mesh = trimesh.creation.icosphere(subdivisions=level)
+        vertices = mesh.vertices.tolist()
+        faces = mesh.faces.tolist()
+        n_faces = len(faces)
+
+        fast_t, fast_out, _ = time_builder("add_mesh_solid", vertices, faces)
+        per_million = fast_t * 1e6 / n_faces
+
+        if args.skip_reference:
+            print(f"{n_faces:>10} {fast_t:>10.3f} {per_million:>10.3f} {'-':>12} {'-':>8} -")
+        else:
+            ref_t, ref_out, _ = time_builder("_add_mesh_solid_python", vertices, faces)
+            print(f"{n_faces:>10} {fast_t:>10.3f} {per_million:>10.3f} {ref_t:>12.3f} "
+                  f"{ref_t / fast_t:>7.1f}x {fast_out == ref_out}")
+
+        if args.intern:
+            int_t, int_out, builder = time_builder("add_mesh_solid", vertices, faces, intern=True)
+            stats = builder.intern_stats()
+            print(f"{'interned':>10} {int_t:>10.3f} {int_t * 1e6 / n_faces:>10.3f} "
+                  f"size {len(int_out) / len(fast_out):.0%} of plain, "
+                  f"hit rate {stats['hit_rate']:.1%}, {stats['evictions']} evictions, "
+                  f"{stats['reused_refs']} reused refs")
+
+
+if __name__ == "__main__":
+    main()
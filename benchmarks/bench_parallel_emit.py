@@ -0,0 +1,65 @@
+"""
+Scaling benchmark of parallel STEP emission (StepBuilder emit_workers).
+
+Run from the repository root:
+    python -m benchmarks.bench_parallel_emit --subdivisions 7 8 --workers 1 2 4 8 16 32
+
+The mesh is an icosphere whose MeshIndex is saved and memory-mapped, as in
+the pipeline, so workers read the arrays straight from the .npy files.
+Interning is off (parallel emission requires it). Each run streams a STEP
+file to a temporary directory; "parent cpu" is the CPU time of the
+coordinating process (splicing the parts and the shell list), which bounds
+the achievable speedup.
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+import trimesh
+
+from src.mesh_index import MeshIndex
+from src.step_builder import StepBuilder
+
+
+def time_emit(index, workers, out_path):
+    with open(out_path, "wb") as f:
+        builder = StepBuilder(stream=f, intern=False, emit_workers=workers)
+        start, start_cpu = time.perf_counter(), time.process_time()
+        builder.add_mesh_solid(index.vertices, index.faces, index.face_normals)
+        builder.generate_step_from_strategy({})
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - start_cpu
+    with open(out_path, "rb") as f:
+        data = f.read()
+    # The header holds a timestamp; compare the DATA section only
+    digest = hashlib.md5(data[data.index(b"DATA;"):]).hexdigest()
+    return elapsed, cpu, len(data), digest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subdivisions", type=int, nargs="+", default=[7, 8],
+                        help="icosphere subdivision levels (level 8 = 1,310,720 faces)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="emit_workers values; 1 is the single-process baseline")
+    args = parser.parse_args()
+
+    print(f"cpus: {os.cpu_count()}")
+    print(f"{'faces':>10} {'workers':>8} {'wall s':>8} {'parent cpu s':>13} {'MB':>8} {'speedup':>8} identical")
+    with tempfile.TemporaryDirectory(prefix="bench_emit_") as tmp:
+        for level in args.subdivisions:
+            index_dir = os.path.join(tmp, f"index_{level}")
+            MeshIndex.build(trimesh.creation.icosphere(subdivisions=level)).save(index_dir)
+            index = MeshIndex.load(index_dir)
+            out_path = os.path.join(tmp, "out.step")
+
+            base_t, _, _, base_digest = time_emit(index, 1, out_path)
+            for workers in args.workers:
+                elapsed, cpu, size, digest = time_emit(index, workers, out_path)
+                print(f"{len(index.faces):>10} {workers:>8} {elapsed:>8.3f} {cpu:>13.3f} {size / 1e6:>8.1f} "
+                      f"{base_t / elapsed:>7.2f}x {digest == base_digest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark feature_hints.extract_planar_hints against the per-facet reference loop.
+
+Run from the repository root:
+    python -m benchmarks.bench_planar_hints --boxes 250 500 1000
+
+The test meshes are randomly rotated boxes plus faceted cylinders, so the
+facet count scales like a tessellated CAD export. The MeshIndex (which
+computes mesh.facets) is built before timing; both implementations share
+the facets.
+"""
+import argparse
+import time
+
+import numpy as np
+import trimesh
+
+from src import feature_hints
+from src.mesh_index import MeshIndex
+
+
+def make_mesh(n_boxes, seed=0):
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(n_boxes):
+        if i % 10 == 0:
+            part = trimesh.creation.cylinder(radius=rng.uniform(2, 8), height=rng.uniform(5, 20), sections=32)
+        else:
+            part = trimesh.creation.box(extents=rng.uniform(1, 20, 3))
+        part.apply_transform(trimesh.transformations.random_rotation_matrix(rng.random(3)))
+        part.apply_translation(rng.uniform(-500, 500, 3))
+        parts.append(part)
+    mesh = trimesh.util.concatenate(parts)
+    return trimesh.Trimesh(vertices=mesh.vertices, faces=mesh.faces, process=False)
+
+
+def time_call(fn, mesh, min_area_fraction):
+    start = time.perf_counter()
+    hints = fn(mesh, min_area_fraction)
+    return time.perf_counter() - start, hints
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[250, 500, 1000],
+                        help="number of parts per test mesh")
+    parser.add_argument("--min-area-fraction", type=float, default=0.0,
+                        help="facet area threshold (0 keeps every facet, the worst case)")
+    args = parser.parse_args()
+
+    print(f"{'faces':>9} {'facets':>8} {'hints':>7} {'index s':>9} {'batched s':>10} {'loop s':>8} {'speedup':>8} identical")
+    for n_boxes in args.boxes:
+        mesh = make_mesh(n_boxes)
+        start = time.perf_counter()
+        index = MeshIndex.build(mesh)
+        index_t = time.perf_counter() - start
+
+        fast_t, fast = time_call(feature_hints.extract_planar_hints, index, args.min_area_fraction)
+        slow_t, slow = time_call(feature_hints._extract_planar_hints_python, mesh, args.min_area_fraction)
+        print(f"{len(mesh.faces):>9} {index.num_facets:>8} {len(fast):>7} {index_t:>9.3f} {fast_t:>10.3f} "
+              f"{slow_t:>8.3f} {slow_t / fast_t:>7.1f}x {fast == slow}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Per-stage timing and peak memory of the conversion pipeline on synthetic
+meshes, with regression checks against a stored baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_stages --update-baseline        # record a baseline
+    python -m benchmarks.bench_stages                          # compare against it
+    python -m benchmarks.bench_stages --faces 1000000 5000000 --shapes box scan --json big.json
+
+Each mesh (see benchmarks.synthetic) is written to a temporary binary STL,
+then a fresh process times the stages the server runs: load (stl_io),
+index (MeshIndex.build), stats, planar_hints, cylinder_hints, step_build
+(the add_*_solid call, streaming entities to disk) and step_write (the
+product structure and footer). "peak MB" is the tracemalloc peak of a
+stage above what was allocated when it started (numpy buffers included),
+"rss MB" the peak resident size of the whole process. cylinder_hints
+runs until CYLINDER_TIME_BUDGET (see src/config.py) on most meshes, so its
+time mostly tracks that setting.
+
+A stage regresses when it is slower (or needs more memory) than the
+baseline by more than the threshold fraction and by more than an absolute
+floor, which keeps millisecond stages from flagging noise. Thresholds are
+stored in the baseline file; the flags override them. The exit status is 1
+if anything regressed. Baselines are machine-specific: record one on the
+machine the comparison runs on.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.synthetic import SHAPES, make_mesh
+from src import config, stl_io, mesh_stats, feature_hints
+from src.mesh_index import MeshIndex
+from src.pipeline import FACE_MODE_ASSUMPTIONS
+from src.step_builder import StepBuilder
+
+try:
+    import resource
+except ImportError:  # unavailable on Windows; rss is then not reported
+    resource = None
+
+STAGES = ("load", "index", "stats", "planar_hints", "cylinder_hints", "step_build", "step_write")
+DEFAULT_BASELINE = os.path.join("benchmarks", "stage_baseline.json")
+DEFAULT_THRESHOLDS = {
+    "time": 0.25,        # fraction slower than the baseline
+    "memory": 0.20,      # fraction more peak memory
+    "min_seconds": 0.05, # ignore smaller absolute slowdowns
+    "min_mb": 5.0,       # ignore smaller absolute memory growth
+}
+
+
+def measure(stages, name, fn, *args, **kwargs):
+    """Run fn, recording its wall time and peak traced memory under stages[name]."""
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    stages[name] = {
+        "seconds": round(elapsed, 4),
+        "peak_mb": round((tracemalloc.get_traced_memory()[1] - base) / 1e6, 2),
+    }
+    return value
+
+
+def build_step(index, step_path, face_mode, stages):
+    with open(step_path, "wb") as f:
+        builder = StepBuilder(
+            stream=f,
+            intern=config.get_step_intern_enabled(),
+            intern_max_entries=config.get_step_intern_max_entries(),
+            schema="AP242" if face_mode == "tessellated" else "AP214",
+        )
+        if face_mode == "merged":
+            measure(stages, "step_build", builder.add_region_solid, index.vertices, index.faces,
+                    index.facet_faces, index.facet_starts, normals=index.face_normals)
+        elif face_mode == "tessellated":
+            measure(stages, "step_build", builder.add_tessellated_solid, index.vertices, index.faces)
+        else:
+            measure(stages, "step_build", builder.add_mesh_solid, index.vertices, index.faces,
+                    normals=index.face_normals)
+        measure(stages, "step_write", builder.generate_step_from_strategy, {"entities": [], "assumptions": []})
+
+
+def run_case(stl_path, face_mode):
+    """Time the stages on one STL (run in a fresh worker process)."""
+    stages = {}
+    step_path = stl_path + ".step"
+    tracemalloc.start()
+    try:
+        mesh = measure(stages, "load", stl_io.load_stl, stl_path)
+        index = measure(stages, "index", MeshIndex.build, mesh)
+        del mesh
+        measure(stages, "stats", mesh_stats.compute_mesh_stats, index)
+        planar = measure(stages, "planar_hints", feature_hints.extract_planar_hints, index)
+        cylinders = measure(stages, "cylinder_hints", feature_hints.extract_cylindrical_hints, index,
+                            time_budget=config.get_cylinder_time_budget())
+        build_step(index, step_path, face_mode, stages)
+        step_mb = os.path.getsize(step_path) / 1e6
+    finally:
+        tracemalloc.stop()
+        if os.path.exists(step_path):
+            os.remove(step_path)
+    # ru_maxrss is in KiB on Linux
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / 1e6 if resource else None
+    return {
+        "faces": len(index.faces),
+        "planar_hints": len(planar),
+        "cylindrical_hints": len(cylinders),
+        "step_mb": round(step_mb, 2),
+        "rss_mb": None if rss_mb is None else round(rss_mb, 1),
+        "stages": stages,
+    }
+
+
+def run_suite(shapes, sizes, face_mode, seed):
+    cases = []
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{'shape':<9} {'target':>8} {'faces':>9} " + " ".join(f"{s:>14}" for s in STAGES)
+          + f" {'total s':>8} {'peak MB':>8} {'rss MB':>7}")
+    with tempfile.TemporaryDirectory(prefix="bench_stages_") as tmp:
+        for shape in shapes:
+            for target in sizes:
+                stl_path = os.path.join(tmp, f"{shape}_{target}.stl")
+                make_mesh(shape, target, seed).export(stl_path, file_type="stl")
+                # A process per case: rss and allocator state start clean
+                with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                    case = pool.submit(run_case, stl_path, face_mode).result()
+                os.remove(stl_path)
+                case = dict(shape=shape, target_faces=target, face_mode=face_mode, **case)
+                cases.append(case)
+
+                total = sum(s["seconds"] for s in case["stages"].values())
+                peak = max(s["peak_mb"] for s in case["stages"].values())
+                print(f"{shape:<9} {target:>8} {case['faces']:>9} "
+                      + " ".join(f"{case['stages'][s]['seconds']:>14.3f}" for s in STAGES)
+                      + f" {total:>8.2f} {peak:>8.1f} {case['rss_mb'] or 0:>7.0f}", flush=True)
+    return cases
+
+
+def compare(cases, baseline, thresholds):
+    """
+    Returns:
+        list: (case, stage, metric, baseline value, current value) per regression.
+    """
+    base_cases = {(c["shape"], c["target_faces"], c["face_mode"]): c for c in baseline.get("cases", [])}
+    regressions = []
+    for case in cases:
+        base = base_cases.get((case["shape"], case["target_faces"], case["face_mode"]))
+        if base is None:
+            continue
+        name = f"{case['shape']}/{case['target_faces']}"
+        for stage, current in case["stages"].items():
+            old = base["stages"].get(stage)
+            if old is None:
+                continue
+            for metric, key, floor in (("seconds", "time", "min_seconds"), ("peak_mb", "memory", "min_mb")):
+                limit = old[metric] * (1 + thresholds[key])
+                if current[metric] > limit and current[metric] - old[metric] > thresholds[floor]:
+                    regressions.append((name, stage, metric, old[metric], current[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="target face counts (up to 5000000; the STEP files are written to the temp dir)")
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=SHAPES)
+    parser.add_argument("--face-mode", default="faceted", choices=sorted(FACE_MODE_ASSUMPTIONS),
+                        help="STEP geometry built in step_build")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the scan noise")
+    parser.add_argument("--json", help="also save the results to this file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline results file")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="save the results as the new baseline instead of comparing")
+    parser.add_argument("--time-threshold", type=float, help="allowed fraction slower per stage")
+    parser.add_argument("--memory-threshold", type=float, help="allowed fraction more peak memory per stage")
+    args = parser.parse_args()
+
+    print(f"cpus: {os.cpu_count()}, python {platform.python_version()}, numpy {np.__version__}")
+    cases = run_suite(args.shapes, args.faces, args.face_mode, args.seed)
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": {
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+        },
+        "cases": cases,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=1)
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    thresholds = dict(DEFAULT_THRESHOLDS, **(baseline or {}).get("thresholds", {}))
+    if args.time_threshold is not None:
+        thresholds["time"] = args.time_threshold
+    if args.memory_threshold is not None:
+        thresholds["memory"] = args.memory_threshold
+
+    if args.update_baseline:
+        # Merge, so a partial run (e.g. --faces 5000000) keeps the other cases
+        kept = [c for c in (baseline or {}).get("cases", [])
+                if (c["shape"], c["target_faces"], c["face_mode"])
+                not in {(n["shape"], n["target_faces"], n["face_mode"]) for n in cases}]
+        with open(args.baseline, "w") as f:
+            json.dump(dict(results, thresholds=thresholds, cases=kept + cases), f, indent=1)
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; record one with --update-baseline")
+        return 0
+
+    if baseline.get("machine", {}).get("platform") != results["machine"]["platform"]:
+        print(f"note: baseline recorded on {baseline.get('machine', {}).get('platform')}")
+    regressions = compare(cases, baseline, thresholds)
+    for name, stage, metric, old, new in regressions:
+        print(f"REGRESSION {name} {stage} {metric}: {old} -> {new} ({new / max(old, 1e-9):.2f}x)")
+    print(f"{len(regressions)} regressions (thresholds: {thresholds})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Measure LLM prompt size, full vs compact encoding, over a corpus of meshes.
+
+Run from the repository root:
+    python -m benchmarks.prompt_size path/to/meshes "parts/**/*.stl" --budget 2000
+
+Arguments are STL files, directories (searched recursively) or glob patterns.
+Token counts use tiktoken when installed, otherwise a 4 chars/token estimate.
+"""
+import argparse
+import glob
+import json
+import os
+
+from src import stl_io, mesh_stats, feature_hints, prompt_builder
+from src.mesh_index import MeshIndex
+
+
+def find_meshes(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += glob.glob(os.path.join(item, "**", "*.stl"), recursive=True)
+            paths += glob.glob(os.path.join(item, "**", "*.STL"), recursive=True)
+        elif os.path.exists(item):
+            paths.append(item)
+        else:
+            paths += glob.glob(item, recursive=True)
+    return sorted(set(paths))
+
+
+def measure(path, budget, top_k):
+    mesh = stl_io.load_stl(path)
+    if mesh is None:
+        return None
+    index = MeshIndex.build(mesh)
+    stats = mesh_stats.compute_mesh_stats(index)
+    features = {
+        "planar": feature_hints.extract_planar_hints(index),
+        "cylindrical": feature_hints.extract_cylindrical_hints(index)
+    }
+    full = prompt_builder.build_structured_prompt(stats, features, {"mode": "full"})
+    compact = prompt_builder.build_structured_prompt(
+        stats, features, {"mode": "compact", "token_budget": budget, "top_k": top_k}
+    )
+    return {
+        "file": path,
+        "faces": stats["num_faces"],
+        "planar_hints": len(features["planar"]),
+        "full_chars": len(full),
+        "full_tokens": prompt_builder.count_tokens(full),
+        "compact_chars": len(compact),
+        "compact_tokens": prompt_builder.count_tokens(compact),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="STL files, directories or glob patterns")
+    parser.add_argument("--budget", type=int, default=2000, help="compact prompt token budget")
+    parser.add_argument("--top-k", type=int, default=20, help="most planes listed individually")
+    parser.add_argument("--json", action="store_true", help="print one JSON object per mesh instead of a table")
+    args = parser.parse_args()
+
+    paths = find_meshes(args.inputs)
+    if not paths:
+        parser.error("no STL files found")
+
+    if not args.json:
+        counter = "tiktoken" if prompt_builder.tiktoken else "estimated"
+        print(f"token counts: {counter}")
+        print(f"{'file':<32} {'faces':>9} {'planes':>7} {'full tok':>9} {'compact tok':>12} {'ratio':>6}")
+    totals = [0, 0]
+    for path in paths:
+        try:
+            row = measure(path, args.budget, args.top_k)
+        except ValueError as e:
+            print(f"{path}: {e}")
+            continue
+        if row is None:
+            print(f"{path}: not a readable STL")
+            continue
+        totals[0] += row["full_tokens"]
+        totals[1] += row["compact_tokens"]
+        if args.json:
+            print(json.dumps(row))
+        else:
+            name = os.path.basename(path)[:32]
+            ratio = row["full_tokens"] / max(row["compact_tokens"], 1)
+            print(f"{name:<32} {row['faces']:>9} {row['planar_hints']:>7} "
+                  f"{row['full_tokens']:>9} {row['compact_tokens']:>12} {ratio:>5.1f}x")
+    if not args.json:
+        print(f"{'total':<32} {'':>9} {'':>7} {totals[0]:>9} {totals[1]:>12} "
+              f"{totals[0] / max(totals[1], 1):>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Procedural test meshes of a requested size, for the benchmarks.
+
+Run from the repository root to write them as STL files (e.g. as input for
+python -m src.batch):
+    python -m benchmarks.synthetic --faces 1000 100000 5000000 --out /tmp/meshes
+
+Shapes:
+    box       a box with every side split into a square grid: six large
+              planar facets, the best case for planar hints
+    sphere    an icosphere (sizes are powers of 4 times 20, the nearest is used)
+    cylinder  a prism of a few dozen sections, subdivided: tessellated CAD
+              style, with a cylindrical hint to find
+    scan      a noisy ellipsoid: no two faces coplanar, as in a 3D scan
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+import trimesh
+
+SHAPES = ("box", "sphere", "cylinder", "scan")
+
+
+def make_mesh(shape, target_faces, seed=0):
+    """
+    Build a closed, consistently wound mesh of about target_faces triangles.
+
+    Args:
+        shape (str): One of SHAPES.
+        target_faces (int): Wanted face count; the result is within a few
+            percent of it (sphere: within a factor of 2).
+        seed (int): Seed of the scan noise.
+
+    Returns:
+        trimesh.Trimesh: The mesh, unprocessed.
+    """
+    if shape == "box":
+        return _grid_box(max(1, round(math.sqrt(target_faces / 12))), (40.0, 30.0, 20.0))
+    if shape == "sphere":
+        level = max(0, round(math.log(max(target_faces, 20) / 20, 4)))
+        return trimesh.creation.icosphere(subdivisions=level, radius=25.0)
+    if shape == "cylinder":
+        # cylinder(sections=s) has 4 * s faces, each subdivision 4x that
+        level = max(0, math.ceil(math.log(max(target_faces, 1) / (4 * 64), 4)))
+        sections = max(8, round(target_faces / (4 * 4 ** level)))
+        mesh = trimesh.creation.cylinder(radius=10.0, height=30.0, sections=sections)
+        for _ in range(level):
+            mesh = mesh.subdivide()
+        return trimesh.Trimesh(vertices=mesh.vertices, faces=mesh.faces, process=False)
+    if shape == "scan":
+        # uv_sphere(count=[a, b]) has 4 * b * (a - 2) faces, with a and b
+        # rounded up to even numbers
+        a = max(4, 2 * round((1 + math.sqrt(1 + target_faces / 4)) / 2))
+        b = max(4, 2 * round(target_faces / (8 * (a - 2))))
+        mesh = trimesh.creation.uv_sphere(radius=1.0, count=[a, b])
+        rng = np.random.default_rng(seed)
+        vertices = mesh.vertices * (1.0 + rng.normal(scale=0.002, size=(len(mesh.vertices), 1)))
+        return trimesh.Trimesh(vertices=vertices * [30.0, 20.0, 12.0], faces=mesh.faces, process=False)
+    raise ValueError(f"Unknown shape: {shape}")
+
+
+def _grid_box(n, extents):
+    """Box whose sides are n x n grids of quads (12 * n^2 faces)."""
+    t = np.linspace(-0.5, 0.5, n + 1)
+    u, v = (a.ravel() for a in np.meshgrid(t, t, indexing="ij"))
+    cell = (np.arange(n)[:, None] * (n + 1) + np.arange(n)).ravel()
+    # Vertex (i, j) is i * (n + 1) + j; both triangles wind u x v
+    quad = np.stack([cell, cell + n + 1, cell + n + 2, cell + 1], axis=1)
+    side_faces = np.concatenate([quad[:, [0, 1, 2]], quad[:, [0, 2, 3]]])
+
+    vertices, faces = [], []
+    for axis in range(3):
+        for sign in (-0.5, 0.5):
+            points = np.empty((len(u), 3))
+            points[:, axis] = sign
+            points[:, (axis + 1) % 3] = u
+            points[:, (axis + 2) % 3] = v
+            # u x v points along +axis; flip the winding on the - side
+            faces.append((side_faces if sign > 0 else side_faces[:, ::-1]) + len(u) * len(vertices))
+            vertices.append(points)
+    mesh = trimesh.Trimesh(vertices=np.concatenate(vertices) * extents, faces=np.concatenate(faces), process=False)
+    # Sides share their border vertices
+    mesh.merge_vertices()
+    return mesh
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces", type=int, nargs="+", default=[1000, 10000, 100000], help="target face counts")
+    parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=SHAPES)
+    parser.add_argument("--out", default=".", help="output directory")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for shape in args.shapes:
+        for target in args.faces:
+            mesh = make_mesh(shape, target)
+            path = os.path.join(args.out, f"{shape}_{target}.stl")
+            mesh.export(path, file_type="stl")
+            print(f"{path}: {len(mesh.faces)} faces, watertight {mesh.is_watertight}")
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,8 @@ interface AnalysisData {
 
 interface GenerationData {
   download_url: string;
-  explanation: string;
+  explanation: string | null;
+  explanation_status?: 'pending' | 'ready' | 'failed';
   status?: string;
 }
 
@@ -48,10 +49,11 @@ export default function App() {
 
   const fetchHistory = async () => {
     try {
-      const res = await fetch(`${API_BASE}/api/history`);
+      // Newest page only; the browser revalidates it with If-None-Match
+      const res = await fetch(`${API_BASE}/api/history?limit=100`);
       if (res.ok) {
         const data = await res.json();
-        setRecords(data);
+        setRecords(data.items);
       }
     } catch (e) {
       console.error("Failed to fetch history", e);
@@ -81,6 +83,25 @@ export default function App() {
     }
   };
 
+  // The explanation is written after the STEP file; fetch it if it was still pending
+  const handleViewExplanation = async () => {
+    if (generationData && generationData.explanation_status === 'pending' && sessionId) {
+      try {
+        const res = await fetch(`${API_BASE}/api/session/${sessionId}`);
+        if (res.ok) {
+          const data = await res.json();
+          setGenerationData(data.generation);
+          if (data.generation.explanation_status === 'pending') {
+            toast.info("The explanation report is still being generated.");
+          }
+        }
+      } catch (e) {
+        console.error("Failed to fetch explanation", e);
+      }
+    }
+    setCurrentScreen('explanation');
+  };
+
   const handleBackToHome = () => {
     setCurrentScreen('upload');
     setSelectedRecordId(null);
@@ -149,7 +170,7 @@ export default function App() {
               apiBase={API_BASE}
               data={generationData}
               analysisData={analysisData}
-              onViewExplanation={() => setCurrentScreen('explanation')}
+              onViewExplanation={handleViewExplanation}
               onBackToHome={handleBackToHome}
             />
           )}
@@ -157,7 +178,7 @@ export default function App() {
           {currentScreen === 'explanation' && generationData && (
             <Explanation
               key="explanation"
-              explanationMarkdown={generationData.explanation}
+              explanationMarkdown={generationData.explanation ?? ''}
               onBack={() => setCurrentScreen('result')}
               onBackToHome={handleBackToHome}
             />
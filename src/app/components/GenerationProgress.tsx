@@ -14,21 +14,46 @@ const steps = [
   'Generating STEP representation'
 ];
 
+// Job stage reported by the server -> index in steps
+const stageStep: Record<string, number> = {
+  strategy: 1,
+  build: 2,
+  explanation: 2
+};
+
 export function GenerationProgress({ onComplete, apiBase, sessionId }: GenerationProgressProps) {
   const [currentStep, setCurrentStep] = useState(0);
   const [showViewResults, setShowViewResults] = useState(false);
   const [generationData, setGenerationData] = useState<any>(null);
   const [error, setError] = useState<string | null>(null);
+  const [detail, setDetail] = useState<string | null>(null);
+  const [stageFraction, setStageFraction] = useState(0);
 
   useEffect(() => {
     let mounted = true;
+    let events: EventSource | null = null;
 
     // Simulate initial steps while waiting for server
     const stepInterval = setInterval(() => {
       setCurrentStep(prev => prev < 1 ? prev + 1 : prev);
     }, 1000);
 
-    // Call API
+    const finish = (data: any) => {
+      if (!mounted) return;
+      setGenerationData(data);
+      setCurrentStep(2); // Done
+      setStageFraction(1);
+      setDetail(null);
+      clearInterval(stepInterval);
+      setTimeout(() => setShowViewResults(true), 500);
+    };
+
+    const fail = (message: string) => {
+      clearInterval(stepInterval);
+      if (mounted) setError(message);
+    };
+
+    // Start the job, then follow its progress stream
     const generate = async () => {
       try {
         setCurrentStep(1); // Analysis done (backend re-uses it)
@@ -36,19 +61,45 @@ export function GenerationProgress({ onComplete, apiBase, sessionId }: Generatio
           method: 'POST'
         });
 
+        if (response.status === 503) throw new Error("The server is busy, please retry shortly.");
         if (!response.ok) throw new Error("Generation failed");
 
-        const data = await response.json();
+        const job = await response.json();
+        if (!mounted) return;
 
-        if (mounted) {
-          setGenerationData(data);
-          setCurrentStep(2); // Done
+        events = new EventSource(`${apiBase}${job.events_url}`);
+        events.addEventListener('progress', (e) => {
+          const update = JSON.parse((e as MessageEvent).data);
+          if (!mounted || !update.stage) return;
           clearInterval(stepInterval);
-          setTimeout(() => setShowViewResults(true), 500);
-        }
+          setCurrentStep(stageStep[update.stage] ?? 1);
+          const progress = update.progress;
+          setDetail(progress?.message ?? null);
+          setStageFraction(progress && progress.total ? progress.done / progress.total : 0);
+        });
+        events.addEventListener('complete', (e) => {
+          const result = JSON.parse((e as MessageEvent).data).result;
+          // The STEP file is ready; the explanation may follow in an 'explanation' event
+          if (result.explanation_status !== 'pending') events?.close();
+          finish(result);
+        });
+        events.addEventListener('explanation', (e) => {
+          events?.close();
+          if (mounted) setGenerationData(JSON.parse((e as MessageEvent).data).result);
+        });
+        events.addEventListener('failed', (e) => {
+          events?.close();
+          fail(JSON.parse((e as MessageEvent).data).error || "An error occurred during generation.");
+        });
+        events.onerror = () => {
+          // The stream closes after the final event; only a stream lost mid-job is an error
+          if (events?.readyState === EventSource.CLOSED) fail("Lost connection to the server.");
+        };
       } catch (e) {
         console.error(e);
-        if (mounted) setError("An error occurred during generation.");
+        fail(e instanceof Error && e.message !== "Generation failed"
+          ? e.message
+          : "An error occurred during generation.");
       }
     };
 
@@ -56,11 +107,14 @@ export function GenerationProgress({ onComplete, apiBase, sessionId }: Generatio
 
     return () => {
       mounted = false;
+      events?.close();
       clearInterval(stepInterval);
     };
   }, [apiBase, sessionId]);
 
-  const progress = ((currentStep + 1) / steps.length) * 100;
+  const progress = showViewResults
+    ? 100
+    : ((currentStep + Math.min(stageFraction, 1)) / steps.length) * 100;
 
   return (
     <motion.div
@@ -150,6 +204,9 @@ export function GenerationProgress({ onComplete, apiBase, sessionId }: Generatio
                   }`}>
                   {step}
                 </div>
+                {index === currentStep && detail && !showViewResults && !error && (
+                  <div className="text-sm text-gray-500">{detail}</div>
+                )}
               </div>
 
               {index === currentStep && !showViewResults && !error && (
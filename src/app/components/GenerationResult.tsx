@@ -8,7 +8,7 @@ interface GenerationResultProps {
   apiBase: string;
   data: {
     download_url: string;
-    explanation: string;
+    explanation: string | null;
   };
   analysisData: any;
 }
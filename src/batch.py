@@ -0,0 +1,244 @@
+"""
+Headless batch conversion: STL files in, STEP files out, no server.
+
+Run from the repository root:
+    python -m src.batch drops/2024-06-01 "more/**/*.stl" --out converted --no-llm
+
+Arguments are STL files, directories (searched recursively) or glob
+patterns. Each file runs the server's pipeline (analyze_mesh, the LLM
+strategy, build_step, the explanation report) in a process pool, largest
+file first so one huge mesh does not start last and leave the other
+workers idle. Output goes to <out>/<sha256 of the file>/<settings>/, e.g.
+.../faceted-intern0-none/converted.step; a file whose folder for the
+current settings already holds a finished result is skipped, as are
+repeated copies of one file within a batch.
+
+One JSON line per input (status, faces, bytes, per-stage timings) is
+written to --summary. --no-llm keeps the run offline: the strategy is a
+fixed placeholder and only the geometry-derived report is written.
+"""
+import argparse
+import datetime
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from src import config, pipeline, storage, compression, explain, prompt_builder, llm_client
+
+logger = logging.getLogger(__name__)
+
+RESULT_FILE = "result.json"
+OFFLINE_ASSUMPTION = "Converted offline in batch mode; no LLM strategy was requested."
+
+def find_inputs(inputs):
+    """STL paths from files, directories (recursive) and glob patterns, deduplicated."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths += glob.glob(os.path.join(item, "**", "*.stl"), recursive=True)
+            paths += glob.glob(os.path.join(item, "**", "*.STL"), recursive=True)
+        elif os.path.exists(item):
+            paths.append(item)
+        else:
+            paths += glob.glob(item, recursive=True)
+    return sorted(set(os.path.abspath(p) for p in paths))
+
+def load_result(run_dir):
+    """
+    Returns:
+        dict: The result saved by a finished conversion with these settings, or None.
+    """
+    try:
+        with open(os.path.join(run_dir, RESULT_FILE), "r") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(result.get("step_path", "")):
+        return None
+    return result
+
+def convert_file(path, file_hash, options):
+    """
+    Convert one STL into <out>/<file_hash>/<variant>/ (runs in a worker process).
+
+    Args:
+        path (str): STL path.
+        file_hash (str): SHA-256 of its content, naming the run folder.
+        options (dict): "out", "variant", "face_mode", "compression",
+            "compression_level", "intern", "intern_max_entries", "no_llm".
+
+    Returns:
+        dict: Summary record; "status" is "converted" or "failed".
+    """
+    timings = {}
+    start = time.perf_counter()
+    record = {"file": path, "hash": file_hash, "bytes": os.path.getsize(path)}
+    run_id = os.path.join(file_hash, options["variant"])
+    run_dir = os.path.join(options["out"], run_id)
+    # The MeshIndex arrays are only needed until the STEP file is written
+    arrays_dir = os.path.join(run_dir, "arrays")
+    try:
+        analysis = pipeline.analyze_mesh(path, arrays_dir)
+        timings["analyze"] = time.perf_counter() - start
+        if analysis is None:
+            raise ValueError("not a readable STL")
+        hints = {"planar": analysis["planar_hints"], "cylindrical": analysis["cylindrical_hints"]}
+
+        lap = time.perf_counter()
+        if options["no_llm"]:
+            strategy = {"assumptions": [OFFLINE_ASSUMPTION]}
+        else:
+            strategy, _ = llm_client.call_llm(prompt_builder.build_structured_prompt(analysis["stats"], hints))
+        timings["llm"] = time.perf_counter() - lap
+
+        lap = time.perf_counter()
+        step_path = storage.get_step_path(run_id, options["compression"], root=options["out"])
+        result = pipeline.build_step(
+            step_path,
+            dict(strategy),
+            path,
+            arrays_dir,
+            options["intern"],
+            options["intern_max_entries"],
+            face_mode=options["face_mode"],
+            compression_level=options["compression_level"]
+        )
+        timings["build"] = time.perf_counter() - lap
+
+        lap = time.perf_counter()
+        report = explain.build_explanation(
+            analysis["stats"],
+            {"planar_features": analysis["planar_hints"], "cylindrical_hints": analysis["cylindrical_hints"]},
+            result["strategy"]
+        )
+        storage.save_temp_artifacts(run_id, os.path.basename(path), None, report, root=options["out"])
+        timings["explain"] = time.perf_counter() - lap
+
+        record.update({
+            "status": "converted",
+            "faces": result["num_faces"],
+            "step_path": step_path,
+            "step_bytes": result["step_bytes"],
+            "stored_bytes": result["stored_bytes"],
+            "planar_hints": len(analysis["planar_hints"]),
+            "cylindrical_hints": len(analysis["cylindrical_hints"]),
+        })
+    except Exception as e:
+        record.update({"status": "failed", "error": str(e)})
+    finally:
+        shutil.rmtree(arrays_dir, ignore_errors=True)
+    timings["total"] = time.perf_counter() - start
+    record["timings"] = {k: round(v, 3) for k, v in timings.items()}
+
+    if record["status"] == "converted":
+        # Written last: its presence marks the conversion as done
+        saved = dict(record, variant=options["variant"], converted_at=datetime.datetime.now().isoformat())
+        tmp_path = os.path.join(run_dir, RESULT_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, os.path.join(run_dir, RESULT_FILE))
+    return record
+
+def run_batch(paths, options, workers, summary_file):
+    """
+    Convert paths with `workers` processes, writing one JSON line per input
+    to summary_file as results arrive.
+
+    Returns:
+        dict: Number of inputs per status.
+    """
+    counts = {}
+
+    def emit(record):
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+        summary_file.write(json.dumps(record) + "\n")
+        summary_file.flush()
+
+    # Hashing is I/O bound; threads overlap the reads
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        hashes = list(pool.map(storage.hash_file, paths))
+
+    todo = []
+    first_path = {}
+    for path, file_hash in zip(paths, hashes):
+        if file_hash in first_path:
+            emit({"file": path, "hash": file_hash, "status": "duplicate", "duplicate_of": first_path[file_hash]})
+            continue
+        first_path[file_hash] = path
+        done = load_result(os.path.join(options["out"], file_hash, options["variant"]))
+        if done is not None:
+            emit({"file": path, "hash": file_hash, "status": "skipped", "step_path": done["step_path"]})
+            continue
+        todo.append((os.path.getsize(path), path, file_hash))
+
+    # Largest first: long jobs start early, small ones fill the gaps at the end
+    todo.sort(key=lambda item: -item[0])
+    logger.info(f"{len(paths)} inputs, {len(todo)} to convert with {workers} workers")
+    if not todo:
+        return counts
+    # spawn: the same start method the server's stage pool uses
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(convert_file, path, file_hash, options): path for _, path, file_hash in todo}
+        for n, future in enumerate(as_completed(futures), 1):
+            try:
+                record = future.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed for memory)
+                record = {"file": futures[future], "status": "failed", "error": str(e)}
+            emit(record)
+            logger.info(f"[{n}/{len(todo)}] {record['status']}: {record['file']}")
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="STL files, directories or glob patterns")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(config.get_output_dir()), "batch"),
+                        help="output root; one folder per input content hash")
+    parser.add_argument("--summary", help="JSONL summary path (default: <out>/summary-<timestamp>.jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--format", default=config.get_step_face_mode(),
+                        choices=sorted(pipeline.FACE_MODE_ASSUMPTIONS), help="STEP geometry")
+    parser.add_argument("--compression", default=config.get_step_compression(),
+                        help="artifact compression: none, gzip, zstd or stpz")
+    parser.add_argument("--no-llm", action="store_true", help="do not call the LLM (fully offline)")
+    args = parser.parse_args(argv)
+
+    paths = find_inputs(args.inputs)
+    if not paths:
+        parser.error("no STL files found")
+    try:
+        compression.artifact_suffix(args.compression)
+    except ValueError as e:
+        parser.error(str(e))
+
+    intern = config.get_step_intern_enabled()
+    options = {
+        "out": os.path.abspath(args.out),
+        "variant": pipeline.generation_variant(args.format, intern, args.compression),
+        "face_mode": args.format,
+        "compression": args.compression,
+        "compression_level": config.get_step_compression_level(),
+        "intern": intern,
+        "intern_max_entries": config.get_step_intern_max_entries(),
+        "no_llm": args.no_llm,
+    }
+    os.makedirs(options["out"], exist_ok=True)
+    summary_path = args.summary or os.path.join(
+        options["out"], f"summary-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+    )
+
+    start = time.perf_counter()
+    with open(summary_path, "w") as summary_file:
+        counts = run_batch(paths, options, max(1, args.workers), summary_file)
+    logger.info(f"Done in {time.perf_counter() - start:.1f}s: {counts}; summary in {summary_path}")
+    return 1 if counts.get("failed") else 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Compressed STEP artifacts: streaming writers/readers and Accept-Encoding
+negotiation. gzip is always available; zstd needs the optional zstandard
+package.
+"""
+import gzip
+import os
+
+try:
+    import zstandard
+except ImportError:  # optional; zstd artifacts are unavailable without it
+    zstandard = None
+
+# STEP_COMPRESSION value -> (content coding, artifact file suffix)
+ARTIFACT_FORMATS = {
+    "none": ("identity", ".step"),
+    "gzip": ("gzip", ".step.gz"),
+    "zstd": ("zstd", ".step.zst"),
+    # gzip under the .stpz name CAD tools open directly
+    "stpz": ("gzip", ".stpz"),
+}
+
+# Fast levels: compression runs inline with STEP generation
+DEFAULT_LEVELS = {"gzip": 1, "zstd": 3}
+
+READ_CHUNK = 1024 * 1024
+
+def is_available(encoding):
+    return encoding != "zstd" or zstandard is not None
+
+def artifact_suffix(compression):
+    """
+    File suffix of a STEP artifact stored with the given STEP_COMPRESSION.
+
+    Raises:
+        ValueError: On an unknown value, or zstd without zstandard installed.
+    """
+    if compression not in ARTIFACT_FORMATS:
+        raise ValueError(f"Unknown STEP compression: {compression}")
+    encoding, suffix = ARTIFACT_FORMATS[compression]
+    if not is_available(encoding):
+        raise ValueError(f"STEP compression {compression} needs the zstandard package")
+    return suffix
+
+def encoding_of(path):
+    """Content coding of an artifact, from its file name."""
+    if path.endswith((".gz", ".stpz")):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "identity"
+
+class _Writer:
+    """Binary file that compresses everything written to it, closing both layers."""
+
+    def __init__(self, path, encoding, level):
+        self.raw = open(path, "wb")
+        self.name = path
+        if encoding == "gzip":
+            # mtime=0: identical content gives identical bytes (and ETags)
+            self.stream = gzip.GzipFile(fileobj=self.raw, mode="wb", compresslevel=level, mtime=0)
+        else:
+            self.stream = zstandard.ZstdCompressor(level=level).stream_writer(self.raw, closefd=False)
+
+    def write(self, data):
+        return self.stream.write(data)
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_writer(path, level=None):
+    """
+    Open an artifact for streaming writes, compressed as its name says.
+
+    Args:
+        path (str): Artifact path (see artifact_suffix).
+        level (int, optional): Compression level; DEFAULT_LEVELS when omitted.
+
+    Returns:
+        A writable binary file object (also a context manager).
+    """
+    encoding = encoding_of(path)
+    if encoding == "identity":
+        return open(path, "wb")
+    return _Writer(path, encoding, DEFAULT_LEVELS[encoding] if level is None else level)
+
+def iter_decoded(path, chunk_size=READ_CHUNK):
+    """Yield the uncompressed bytes of an artifact in chunks."""
+    encoding = encoding_of(path)
+    with open(path, "rb") as raw:
+        if encoding == "gzip":
+            stream = gzip.GzipFile(fileobj=raw, mode="rb")
+        elif encoding == "zstd":
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        else:
+            stream = raw
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+def accepts(accept_encoding, encoding):
+    """
+    Whether an Accept-Encoding header value allows a content coding, by its
+    q-values (an explicit q=0 refuses it, "*" covers unlisted codings).
+    """
+    if encoding == "identity":
+        return True
+    wildcard = None
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name == encoding or (encoding == "gzip" and name == "x-gzip"):
+            return q > 0
+        if name == "*":
+            wildcard = q > 0
+    return bool(wildcard)
+
+def decoded_name(path):
+    """Download name of an artifact once decoded, e.g. converted.step."""
+    name = os.path.basename(path)
+    for suffix in (".gz", ".zst"):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    if name.endswith(".stpz"):
+        return name[:-len(".stpz")] + ".step"
+    return name
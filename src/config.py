@@ -15,3 +15,118 @@ def get_model_name():
 
 def get_output_dir():
     return os.getenv("OUTPUT_DIR", "outputs/runs")
+
+def get_step_intern_enabled():
+    # Off by default: every entity is emitted fresh (byte-identical legacy output,
+    # and STEP_EMIT_WORKERS can format chunks in parallel). STEP_INTERN=1 opts in.
+    return os.getenv("STEP_INTERN", "0").lower() not in ("0", "false", "no", "")
+
+def get_step_face_mode():
+    # Default output format: "faceted" (FACETED_BREP, one face per triangle),
+    # "merged" (ADVANCED_FACEs, one per coplanar region) or "tessellated"
+    # (AP242 TESSELLATED_SHELL)
+    return os.getenv("STEP_FACE_MODE", "faceted").lower()
+
+def get_step_emit_workers():
+    # Processes formatting FACETED_BREP chunks in parallel (0: in the stage's own
+    # process). Applies only with STEP_INTERN=0.
+    return int(os.getenv("STEP_EMIT_WORKERS", "0"))
+
+def get_step_compression():
+    # How STEP artifacts are stored: "none", "gzip", "zstd" (needs zstandard) or
+    # "stpz" (gzip named .stpz); downloads negotiate Content-Encoding
+    return os.getenv("STEP_COMPRESSION", "none").lower()
+
+def get_step_compression_level():
+    # Empty: the codec's fast default (see compression.DEFAULT_LEVELS)
+    level = os.getenv("STEP_COMPRESSION_LEVEL", "")
+    return int(level) if level else None
+
+def get_step_intern_max_entries():
+    return int(os.getenv("STEP_INTERN_MAX_ENTRIES", "500000"))
+
+def get_result_cache_dir():
+    return os.getenv("RESULT_CACHE_DIR", os.path.join(get_output_dir(), "cache"))
+
+def get_result_cache_max_entries():
+    return int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+
+def get_result_cache_max_bytes():
+    return int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+def get_worker_processes():
+    # 0 runs the heavy stages on threads inside the API process instead
+    return int(os.getenv("WORKER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+def get_worker_max_pending():
+    return int(os.getenv("WORKER_MAX_PENDING", "8"))
+
+def get_history_db_path():
+    return os.getenv("HISTORY_DB", os.path.join(get_output_dir(), "history.sqlite3"))
+
+def get_llm_timeout():
+    return float(os.getenv("LLM_TIMEOUT", "60"))
+
+def get_llm_max_retries():
+    return int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+def get_llm_retry_base_delay():
+    return float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+
+def get_llm_retry_max_delay():
+    return float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+
+def get_llm_cache_dir():
+    return os.getenv("LLM_CACHE_DIR", os.path.join(get_output_dir(), "llm_cache"))
+
+def get_llm_cache_ttl():
+    # Seconds; 0 disables the response cache
+    return float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+def get_cylinder_time_budget():
+    # Seconds the RANSAC cylinder search may spend per upload
+    return float(os.getenv("CYLINDER_TIME_BUDGET", "2.0"))
+
+def get_prompt_mode():
+    # "compact" (token-budgeted) or "full" (every hint, pretty-printed JSON)
+    return os.getenv("PROMPT_MODE", "compact")
+
+def get_prompt_token_budget():
+    return int(os.getenv("PROMPT_TOKEN_BUDGET", "2000"))
+
+def get_prompt_top_k():
+    return int(os.getenv("PROMPT_TOP_K", "20"))
+
+def get_trace_max_traces():
+    # Traces kept in memory for /api/traces/{trace_id}; the oldest are dropped first
+    return int(os.getenv("TRACE_MAX_TRACES", "500"))
+
+def get_session_ttl():
+    # Seconds an upload session lives after its last use
+    return float(os.getenv("SESSION_TTL", str(6 * 3600)))
+
+def get_session_max_count():
+    # Sessions kept in memory; the least recently used go first
+    return int(os.getenv("SESSION_MAX_COUNT", "1000"))
+
+def get_session_sweep_interval():
+    # Seconds between sweeps of expired sessions, orphaned temp files and the quota
+    return float(os.getenv("SESSION_SWEEP_INTERVAL", "60"))
+
+def get_session_backend():
+    # Where sessions and generate jobs live: memory (one process), sqlite (shared by local workers) or redis
+    return os.getenv("SESSION_BACKEND", "memory").lower()
+
+def get_session_db_path():
+    return os.getenv("SESSION_DB", os.path.join(get_output_dir(), "sessions.sqlite3"))
+
+def get_session_redis_url():
+    return os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+def get_output_quota_bytes():
+    # Disk quota of OUTPUT_DIR; old run folders are deleted beyond it (0 disables)
+    return int(os.getenv("OUTPUT_QUOTA_BYTES", str(10 * 1024 ** 3)))
+
+def get_history_retain_artifacts():
+    # Newest history records whose run folders the quota never deletes
+    return int(os.getenv("HISTORY_RETAIN_ARTIFACTS", "100"))
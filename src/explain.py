@@ -49,7 +49,14 @@ We analyzed the input mesh and identified the following geometric features:
         report += f"\n### Cylindrical Features ({len(hints['cylindrical_hints'])} detected)\n"
         for i, c in enumerate(hints['cylindrical_hints']):
              axis = c.get('axis_hint', [0,0,0])
-             report += f"- **Cylinder {i+1}**: Axis aligned with [{axis[0]}, {axis[1]}, {axis[2]}]. {c.get('reason','')}\n"
+             if 'origin' in c:
+                 o = c['origin']
+                 kind = "Boss" if c.get('convex', True) else "Hole"
+                 report += (f"- **Cylinder {i+1}** ({kind}): Axis [{axis[0]}, {axis[1]}, {axis[2]}] through "
+                            f"[{o[0]:.2f}, {o[1]:.2f}, {o[2]:.2f}], Radius={c['radius']:.2f} mm, "
+                            f"Height={c['height']:.2f} mm, Arc={c['arc_degrees']:.0f}°\n")
+             else:
+                 report += f"- **Cylinder {i+1}**: Axis aligned with [{axis[0]}, {axis[1]}, {axis[2]}]. {c.get('reason','')}\n"
         
     report += "\n## 3. Generative Strategy\n"
     report += f"**Detected Shape Class**: {strategy.get('detected_shape', 'General 3D Object')}\n\n"
@@ -1,10 +1,143 @@
+import time
+
 import numpy as np
 import trimesh
 
+from src.mesh_index import as_index
+
+# RANSAC cylinder detection (extract_cylindrical_hints)
+CYLINDER_BATCH = 512             # hypotheses scored per batch
+CYLINDER_SCORE_SAMPLE = 4096     # faces each batch is scored against
+CYLINDER_NEIGHBORS = 64          # second sample is among the first's nearest faces
+CYLINDER_MIN_TURN = 0.2          # |n1 x n2| of a sample pair
+CYLINDER_REFITS = 4              # best hypotheses of a batch refit before giving up
+CYLINDER_MIN_FACES = 8
+CYLINDER_MIN_AREA_FRACTION = 0.01
+CYLINDER_MAX_FAILURES = 8        # empty batches in a row before giving up
+CYLINDER_RADIUS_TOL = 0.02       # distance tolerance, relative to the radius
+CYLINDER_NORMAL_COS = 0.95       # normal vs radial direction
+CYLINDER_AXIAL_SIN = 0.05        # normal vs axis
+CYLINDER_MIN_ARC_DEGREES = 60
+CYLINDER_MIN_HEIGHT_RATIO = 0.35 # height / radius; a sphere's equator band is about 0.3
+CYLINDER_MIN_STRAIGHTNESS = 0.9  # share of the height each arc sector spans (see _refit_cylinder)
+CYLINDER_SMOOTH_COS = 0.9        # facets meeting a neighbor this flat may be cylinder strips
+
 def extract_planar_hints(mesh, min_area_fraction=0.01):
     """
     Identify potential planar features in the mesh.
-    Uses trimesh's facet generation (clustering of coplanar faces).
+    Uses trimesh's facet generation (clustering of coplanar faces), as kept
+    flat in the MeshIndex.
+    
+    All facets are processed together over the flat facet face array, and
+    areas, vertex centroids and
+    projected bounding boxes are grouped reductions over it. Facets of equal
+    size are reduced as one (n, size) block, so every sum runs in the same
+    order as in the per-facet loop (_extract_planar_hints_python) and the
+    output is identical to it.
+    
+    Args:
+        mesh (trimesh.Trimesh or MeshIndex): The target mesh.
+        min_area_fraction (float): Minimum area fraction to consider a facet as a significant plane.
+        
+    Returns:
+        list: A list of dictionaries describing planar hints.
+    """
+    index = as_index(mesh)
+    if index.num_facets == 0:
+        return []
+    
+    # facet_faces[offsets[i]:offsets[i] + lengths[i]] are the faces of facet i
+    offsets = np.asarray(index.facet_starts[:-1])
+    lengths = np.diff(index.facet_starts)
+    facet_faces = np.asarray(index.facet_faces)
+    
+    facet_area = np.empty(index.num_facets)
+    face_areas = index.face_areas[facet_faces]
+    for sel, idx in _size_groups(offsets, lengths):
+        facet_area[sel] = face_areas[idx].sum(axis=1)
+    
+    keep = facet_area / index.area >= min_area_fraction
+    if not keep.any():
+        return []
+    
+    # Restrict the flat arrays to the significant facets
+    normals = index.face_normals[facet_faces[offsets[keep]]]
+    facet_faces = facet_faces[np.repeat(keep, lengths)]
+    facet_area = facet_area[keep]
+    lengths = lengths[keep]
+    n_keep = len(lengths)
+    labels = np.repeat(np.arange(n_keep), lengths)
+    
+    # Unique vertices of each facet, ordered by (facet, vertex) like np.unique per facet
+    n_verts = len(index.vertices)
+    pairs = np.unique(labels.repeat(index.faces.shape[1]) * n_verts + index.faces[facet_faces].ravel())
+    v_label = pairs // n_verts
+    vertices = index.vertices[pairs % n_verts]
+    v_counts = np.bincount(v_label, minlength=n_keep)
+    v_starts = np.cumsum(v_counts) - v_counts
+    
+    # Tangent frame: x = normal x arb, with arb = Z unless the normal is near Z
+    arb = np.zeros_like(normals)
+    near_z = np.abs(normals[:, 2]) > 0.9
+    arb[~near_z, 2] = 1
+    arb[near_z, 1] = 1
+    x_axis = np.cross(normals, arb)
+    x_axis = x_axis / np.sqrt(np.matmul(x_axis[:, None, :], x_axis[:, :, None])[:, 0])
+    y_axis = np.cross(normals, x_axis)
+    
+    # Project each facet's vertices onto its plane, around their centroid
+    center_v = np.empty((n_keep, 3))
+    min_u, max_u = np.empty(n_keep), np.empty(n_keep)
+    min_v, max_v = np.empty(n_keep), np.empty(n_keep)
+    for sel, idx in _size_groups(v_starts, v_counts):
+        block = vertices[idx]
+        center = np.mean(block, axis=1)
+        centered_vs = block - center[:, None, :]
+        u = np.matmul(centered_vs, x_axis[sel][:, :, None])[..., 0]
+        v = np.matmul(centered_vs, y_axis[sel][:, :, None])[..., 0]
+        center_v[sel] = center
+        min_u[sel], max_u[sel] = u.min(axis=1), u.max(axis=1)
+        min_v[sel], max_v[sel] = v.min(axis=1), v.max(axis=1)
+    
+    width = max_u - min_u
+    height = max_v - min_v
+    
+    # Center of the bbox in 3D
+    u_center = (min_u + max_u) / 2
+    v_center = (min_v + max_v) / 2
+    bbox_center = center_v + (u_center[:, None] * x_axis) + (v_center[:, None] * y_axis)
+    
+    hints = [
+        {
+            "type": "plane",
+            "normal": normals[i].tolist(),
+            "area": float(facet_area[i]),
+            "center": bbox_center[i].tolist(), # Use bbox center, not mass center
+            "param_u": float(width[i]),
+            "param_v": float(height[i]),
+            "x_axis": x_axis[i].tolist(),
+            "y_axis": y_axis[i].tolist(),
+            "face_count": int(lengths[i])
+        }
+        for i in range(n_keep)
+    ]
+    
+    # Sort by area descending
+    hints.sort(key=lambda x: x["area"], reverse=True)
+    return hints
+
+def _size_groups(starts, counts):
+    """
+    Yield (selector, index_block) per distinct group size, where index_block
+    is the (n, size) array of flat indices of the n groups of that size.
+    """
+    for size in np.unique(counts):
+        sel = np.flatnonzero(counts == size)
+        yield sel, starts[sel][:, None] + np.arange(size)
+
+def _extract_planar_hints_python(mesh, min_area_fraction=0.01):
+    """
+    Per-facet reference implementation of extract_planar_hints.
     
     Args:
         mesh (trimesh.Trimesh): The target mesh.
@@ -83,80 +216,281 @@ def extract_planar_hints(mesh, min_area_fraction=0.01):
     hints.sort(key=lambda x: x["area"], reverse=True)
     return hints
 
-def extract_cylindrical_hints(mesh):
+def extract_cylindrical_hints(mesh, time_budget=2.0, max_cylinders=16, seed=0):
     """
-    Identify potential cylindrical features.
+    Detect cylindrical surfaces with RANSAC.
     
-    This is a simplified heuristic since full B-Rep extraction is complex.
-    We assume that if we have large non-planar components, they might be cylindrical.
+    Each hypothesis comes from two faces whose normals both point away from
+    the same axis: the axis is the cross product of the two normals, and
+    the center and radius follow from intersecting the normal lines in the
+    plane across the axis. Batches of hypotheses are scored at once against
+    a sample of faces (distance to the axis within tolerance of the radius,
+    normal radial and perpendicular to the axis, weighted by face area). The
+    best one is refit on all of its inlier faces, which are then removed,
+    and the search repeats until time_budget runs out or nothing is found.
+    Large planar facets bounded by sharp edges (box sides, a plate under a
+    boss) never take part, and the search stops as soon as too little
+    non-planar area is left to hold a cylinder.
+    Second samples are drawn from the first sample's nearest faces through
+    the MeshIndex KD-tree over face centers, so both faces usually lie on
+    one surface, and refits only scan faces in the normal bins around the
+    hypothesis' great circle.
     
-    For Milestone 3, we act conservatively:
-    - If we find a region that isn't a plane, we describe its bounding box or dominant axis.
+    Args:
+        mesh (trimesh.Trimesh or MeshIndex): The target mesh.
+        time_budget (float): Seconds to spend searching; bounds upload latency.
+        max_cylinders (int): Most cylinders to report.
+        seed (int): RNG seed, so the same mesh gives the same hints.
+        
+    Returns:
+        list: Cylinder hints {"type", "origin", "axis", "radius", "height",
+        "extent", "arc_degrees", "convex", "area", "face_count", "axis_hint",
+        "reason"}, where convex is False for holes,
+        largest area first. "origin" is the axis point at the middle of the
+        cylinder and "extent" the [min, max] axial offsets from it.
     """
-    # Placeholder for advanced logic.
-    # We can rely on the fact that if a mesh is mostly planes, the "rest" might be fillets or cylinders.
-    # For now, we return a generic hint if the planar area is significantly less than total area.
+    deadline = time.perf_counter() + time_budget
+    index = as_index(mesh)
+    n_faces = len(index.faces)
+    if n_faces < CYLINDER_MIN_FACES:
+        return []
     
-    hints = []
+    centers = np.asarray(index.face_centers)
+    normals = np.asarray(index.face_normals)
+    areas = np.asarray(index.face_areas)
+    total_area = index.area
+    scale = float(np.linalg.norm(index.extents))
+    if total_area <= 0 or scale <= 0:
+        return []
     
-    # If standard cylinder detection is needed, we'd need RANSAC here.
-    # Since we lack a dedicated library in the requirements for RANSAC primitive fitting (like pyransac3d),
-    # we will rely on a "Global Feature Assumption" for the LLM.
-    # i.e., "If there are many normals perpendicular to Z, it might be a vertical cylinder."
+    rng = np.random.default_rng(seed)
+    tree = index.center_tree
+    k_near = min(CYLINDER_NEIGHBORS, n_faces)
+    min_area = total_area * CYLINDER_MIN_AREA_FRACTION
+    remaining = ~_planar_facet_mask(index, normals, areas, min_area)
+    hints = []
+    failures = 0
     
-    # Function to check for curvature (varying normals)
-    def has_curvature(face_mask, axis_of_rotation):
-        relevant_normals = mesh.face_normals[face_mask]
-        if len(relevant_normals) == 0:
-            return False
+    while len(hints) < max_cylinders and failures < CYLINDER_MAX_FAILURES:
+        if time.perf_counter() > deadline:
+            break
+        candidates = np.flatnonzero(remaining)
+        if len(candidates) < CYLINDER_MIN_FACES or areas[candidates].sum() < min_area:
+            break
         
-        # Project normals onto difference plane (exclude axis comp) and check variance
-        # Or simpler: check if they are all parallel to each other.
-        # If mean normal length is close to 1, they are all pointing same way.
-        mean_normal = np.mean(relevant_normals, axis=0)
-        mean_len = np.linalg.norm(mean_normal)
+        # Hypotheses: first face by area, second a random nearby face whose
+        # normal is turned far enough for a stable axis (any face if none is)
+        weights = areas[candidates] / areas[candidates].sum()
+        first = rng.choice(candidates, size=CYLINDER_BATCH, p=weights)
+        _, near = tree.query(centers[first], k=k_near)
+        near = near.reshape(CYLINDER_BATCH, -1)
+        turn = np.linalg.norm(np.cross(normals[first][:, None, :], normals[near]), axis=2)
+        usable = (turn > CYLINDER_MIN_TURN) & remaining[near]
+        pick = np.argmax(rng.random(near.shape) * usable, axis=1)
+        second = np.where(
+            usable.any(axis=1),
+            near[np.arange(CYLINDER_BATCH), pick],
+            rng.choice(candidates, size=CYLINDER_BATCH)
+        )
+        axes, origins, radii = _cylinder_hypotheses(centers[first], normals[first], centers[second], normals[second])
+        valid = (radii > scale * 1e-4) & (radii < scale)
+        if not valid.any():
+            failures += 1
+            continue
+        axes, origins, radii = axes[valid], origins[valid], radii[valid]
         
-        # If mean length is close to 1.0, vectors are aligned -> Flat Plane
-        # If mean length is significantly < 1.0, vectors are spread -> Curved
-        return mean_len < 0.95  # Threshold: lower means more spread
+        # Score every hypothesis against one sample of the remaining faces
+        sample = candidates if len(candidates) <= CYLINDER_SCORE_SAMPLE else rng.choice(
+            candidates, size=CYLINDER_SCORE_SAMPLE, replace=False)
+        inlier = _cylinder_inliers(centers[sample], normals[sample], axes, origins, radii, scale)
+        scores = inlier.astype(np.float64) @ areas[sample]
+        # A few large triangles (a plate corner) can outscore a real cylinder
+        # by area alone, so hypotheses need enough faces too, and the best few
+        # are refit in turn before the batch counts as a failure
+        min_count = max(3, CYLINDER_MIN_FACES * len(sample) / len(candidates))
+        scores[inlier.sum(axis=1) < min_count] = 0.0
+        min_score = min_area * len(sample) / len(candidates)
+        cylinder = None
+        for best in np.argsort(scores)[::-1][:CYLINDER_REFITS]:
+            # A refit scans every face in the normal band; on huge meshes one
+            # can take a sizeable part of the budget
+            if scores[best] < min_score or time.perf_counter() > deadline:
+                break
+            cylinder = _refit_cylinder(index, centers, normals, areas, remaining,
+                                       axes[best], origins[best], radii[best], scale)
+            if cylinder is not None and cylinder["area"] >= min_area:
+                break
+            cylinder = None
+        if cylinder is None:
+            failures += 1
+            continue
+        remaining &= ~cylinder.pop("mask")
+        hints.append(cylinder)
+        failures = 0
+    
+    hints.sort(key=lambda h: h["area"], reverse=True)
+    return hints
 
-    # Check for vertical cylinder characteristics (normals perpendicular to Z)
-    z_axis = [0, 0, 1]
-    dots = np.abs(np.dot(mesh.face_normals, z_axis))
-    # Faces with dot product near 0 are vertical (normals in XY plane)
-    vertical_faces_mask = dots < 0.1
-    vertical_area = np.sum(mesh.area_faces[vertical_faces_mask])
-    
-    if vertical_area / mesh.area > 0.1:
-        if has_curvature(vertical_faces_mask, z_axis):
-            hints.append({
-                "type": "cylinder_candidate",
-                "axis_hint": [0, 0, 1],
-                "reason": "Significant curved surface area with normals perpendicular to Z axis."
-            })
+def _planar_facet_mask(index, normals, areas, min_area):
+    """
+    Faces of the planar facets of at least min_area whose every neighbor
+    across the facet border is turned by a sharp edge. The strips of a
+    finely tessellated cylinder are facets too, but they meet the next strip
+    almost flat and are kept.
+    """
+    mask = np.zeros(len(areas), dtype=bool)
+    if index.num_facets == 0:
+        return mask
+    offsets = np.asarray(index.facet_starts[:-1])
+    lengths = np.diff(index.facet_starts)
+    facet_faces = np.asarray(index.facet_faces)
+    facet_area = np.add.reduceat(areas[facet_faces], offsets)
+    
+    labels = np.asarray(index.facet_labels)
+    pairs = np.asarray(index.face_adjacency)
+    a, b = labels[pairs[:, 0]], labels[pairs[:, 1]]
+    smooth = (a != b) & (np.einsum("ij,ij->i", normals[pairs[:, 0]], normals[pairs[:, 1]]) > CYLINDER_SMOOTH_COS)
+    smooth_facet = np.zeros(index.num_facets, dtype=bool)
+    smooth_facet[a[smooth & (a >= 0)]] = True
+    smooth_facet[b[smooth & (b >= 0)]] = True
+    
+    planar = (facet_area >= min_area) & ~smooth_facet
+    mask[facet_faces[np.repeat(planar, lengths)]] = True
+    return mask
 
-    # Check for horizontal cylinder (X axis)
-    x_axis = [1, 0, 0]
-    dots_x = np.abs(np.dot(mesh.face_normals, x_axis))
-    horizontal_faces_mask = dots_x < 0.1
-    horizontal_area = np.sum(mesh.area_faces[horizontal_faces_mask])
-    
-    if horizontal_area / mesh.area > 0.1:
-         if has_curvature(horizontal_faces_mask, x_axis):
-            hints.append({
-                "type": "cylinder_candidate",
-                "axis_hint": [1, 0, 0],
-                "reason": "Significant curved surface area with normals perpendicular to X axis."
-            })
-            
-    return hints
+def _cylinder_hypotheses(p1, n1, p2, n2):
+    """Axis, axis point and radius of the cylinder through two oriented faces (batched)."""
+    axes = np.cross(n1, n2)
+    norm = np.linalg.norm(axes, axis=1)
+    # Near-parallel normals give no axis; mark them with radius 0
+    ok = norm > 0.05
+    axes[ok] /= norm[ok, None]
+    
+    # In the plane across the axis, the normal lines p1 + t n1 and p2 + s n2 meet at the center
+    d = p2 - p1
+    n1n2 = np.einsum("ij,ij->i", n1, n2)
+    denom = 1.0 - n1n2 ** 2
+    denom[~ok] = 1.0
+    t = (np.einsum("ij,ij->i", d, n1) - n1n2 * np.einsum("ij,ij->i", d, n2)) / denom
+    origins = p1 + t[:, None] * n1
+    # t < 0 for a convex surface (boss), t > 0 for a concave one (hole)
+    radii = np.where(ok, np.abs(t), 0.0)
+    return axes, origins, radii
+
+def _cylinder_inliers(points, normals, axes, origins, radii, scale):
+    """(hypotheses, points) mask of faces lying on each hypothesized cylinder."""
+    rel = points[None, :, :] - origins[:, None, :]
+    along = np.einsum("hpj,hj->hp", rel, axes)
+    radial = rel - along[..., None] * axes[:, None, :]
+    dist = np.linalg.norm(radial, axis=2)
+    tol = np.maximum(radii * CYLINDER_RADIUS_TOL, scale * 1e-3)
+    n_radial = np.einsum("hpj,hpj->hp", radial, normals[None, :, :]) / np.maximum(dist, 1e-12)
+    n_axial = np.abs(normals @ axes.T).T
+    return (
+        (np.abs(dist - radii[:, None]) < tol[:, None])
+        & (np.abs(n_radial) > CYLINDER_NORMAL_COS)
+        & (n_axial < CYLINDER_AXIAL_SIN)
+    )
+
+def _refit_cylinder(index, centers, normals, areas, remaining, axis, origin, radius, scale):
+    """Refit a hypothesis on all remaining faces; None if it is not a real cylinder."""
+    mask = np.zeros(len(centers), dtype=bool)
+    for _ in range(2):
+        # Inliers need normals across the axis; the normal bins narrow the scan
+        idx = index.faces_in_normal_band(axis, CYLINDER_AXIAL_SIN)
+        idx = idx[remaining[idx]]
+        inlier = _cylinder_inliers(centers[idx], normals[idx], axis[None], origin[None], np.array([radius]), scale)[0]
+        if inlier.sum() < CYLINDER_MIN_FACES:
+            return None
+        pts, nrm, w = centers[idx][inlier], normals[idx][inlier], areas[idx][inlier]
+        
+        # Axis: direction the inlier normals are most perpendicular to
+        _, vecs = np.linalg.eigh((nrm * w[:, None]).T @ nrm)
+        axis = vecs[:, 0]
+        # Center and radius: algebraic circle fit in the plane across the axis
+        u = np.cross(axis, [1.0, 0.0, 0.0] if abs(axis[0]) < 0.9 else [0.0, 1.0, 0.0])
+        u /= np.linalg.norm(u)
+        v = np.cross(axis, u)
+        x, y = pts @ u, pts @ v
+        A = np.column_stack([x, y, np.ones_like(x)]) * np.sqrt(w)[:, None]
+        b = (x ** 2 + y ** 2) * np.sqrt(w)
+        (cx, cy, c), *_ = np.linalg.lstsq(A, b, rcond=None)
+        r2 = c + (cx / 2) ** 2 + (cy / 2) ** 2
+        if r2 <= 0:
+            return None
+        radius = float(np.sqrt(r2))
+        origin = (cx / 2) * u + (cy / 2) * v + (pts @ axis).mean() * axis
+    
+    # Face centers sit inside the true surface; the vertices lie on it. Faces
+    # with a corner off the surface (a flat face grazing it) are dropped.
+    faces = idx[inlier]
+    corners = index.vertices[index.faces[faces]] - origin
+    along = corners @ axis
+    corner_r = np.linalg.norm(corners - along[..., None] * axis, axis=2)
+    radius = float(np.median(corner_r))
+    on_surface = (np.abs(corner_r - radius) <= radius * CYLINDER_RADIUS_TOL * 2).all(axis=1)
+    if on_surface.sum() < CYLINDER_MIN_FACES:
+        return None
+    faces, along = faces[on_surface], along[on_surface]
+    pts, nrm, w = pts[on_surface], nrm[on_surface], w[on_surface]
+    radius = float(corner_r[on_surface].mean())
+    height = float(along.max() - along.min())
+    mask[faces] = True
+    
+    # Reject flat or barely curved patches: inlier normals must sweep an arc.
+    # A 10 degree bin only counts with a fair share of the area, so a flat
+    # face plus a few stray triangles does not pass for a cylinder.
+    angles = np.arctan2(nrm @ v, nrm @ u)
+    bins = np.floor((angles + np.pi) / (2 * np.pi) * 36).astype(int) % 36
+    bin_area = np.bincount(bins, weights=w, minlength=36)
+    arc_degrees = 10.0 * int((bin_area >= w.sum() / 72).sum())
+    rel = pts - origin
+    outward = np.einsum("ij,ij->i", rel - np.outer(rel @ axis, axis), nrm).mean() > 0
+    if arc_degrees < CYLINDER_MIN_ARC_DEGREES or height < radius * CYLINDER_MIN_HEIGHT_RATIO:
+        return None
+    
+    # Reject doubly curved surfaces: on a cylinder every sector of the arc
+    # runs the full height, while a band fit into a sphere or a torus bulges
+    # and its sectors away from the widest point fall short of it.
+    lo = np.full(36, np.inf)
+    hi = np.full(36, -np.inf)
+    np.minimum.at(lo, bins, along.min(axis=1))
+    np.maximum.at(hi, bins, along.max(axis=1))
+    filled = bin_area > 0
+    straightness = (bin_area[filled] * (hi - lo)[filled]).sum() / (w.sum() * height)
+    if straightness < CYLINDER_MIN_STRAIGHTNESS:
+        return None
+    
+    # Canonical axis direction and origin at the middle of the extent
+    if axis[np.argmax(np.abs(axis))] < 0:
+        axis = -axis
+        along = -along
+    mid = (along.max() + along.min()) / 2
+    origin = origin + mid * axis
+    return {
+        "type": "cylinder",
+        "origin": origin.tolist(),
+        "axis": axis.tolist(),
+        "radius": radius,
+        "height": height,
+        "extent": [float(along.min() - mid), float(along.max() - mid)],
+        "arc_degrees": arc_degrees,
+        "convex": bool(outward),
+        "area": float(w.sum()),
+        "face_count": len(faces),
+        "axis_hint": np.round(axis, 3).tolist(),
+        "reason": (f"RANSAC fit {'boss' if outward else 'hole'}: radius {radius:.2f}, "
+                   f"height {height:.2f}, {arc_degrees:.0f} deg arc."),
+        "mask": mask
+    }
 
 def get_feature_report(mesh):
     """
     Combined feature report for LLM.
     """
-    planar = extract_planar_hints(mesh)
-    cylindrical = extract_cylindrical_hints(mesh)
+    index = as_index(mesh)
+    planar = extract_planar_hints(index)
+    cylindrical = extract_cylindrical_hints(index)
     
     return {
         "planar_features": planar,
@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import base64
+import sqlite3
+import datetime
+import threading
+
+_SIZE_RE = re.compile(r"^\s*([\d.]+)\s*([KMG]?B)\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+# Sort key of each supported sort field; seq breaks ties so cursors are stable
+SORT_COLUMNS = {
+    "date": "created_at",
+    "fileSize": "COALESCE(file_size_bytes, -1)",
+}
+
+class HistoryStore:
+    """
+    Conversion history in a SQLite database.
+
+    Each row keeps the full history record as JSON plus indexed columns
+    (session id, creation time, file name, status, file size in bytes), so a
+    lookup by session id is a single index probe and an insert is one atomic
+    transaction, safe across threads and worker processes. Writing a record
+    for an existing session id replaces it and moves it to the top.
+
+    A legacy history.json next to the database is imported once on first use
+    and renamed to history.json.migrated.
+    """
+
+    def __init__(self, db_path, legacy_json_path=None):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def add(self, record, file_size_bytes=None, created_at=None):
+        """
+        Insert (or replace) the record of a session.
+
+        Args:
+            record (dict): History record; must have an "id".
+            file_size_bytes (int, optional): Upload size; parsed from
+                record["fileSize"] when omitted.
+            created_at (str, optional): ISO timestamp; taken from the record's
+                "date"/"time" or the current time when omitted.
+        """
+        with self._connect() as conn:
+            self._insert(conn, record, file_size_bytes, created_at)
+
+    def update(self, session_id, fields):
+        """
+        Merge fields into the stored record of a session, keeping its
+        position. Does nothing if the session has no record.
+        """
+        with self._connect() as conn:
+            # Take the write lock before reading so concurrent updates serialize
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT record FROM history WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return
+            record = json.loads(row[0])
+            record.update(fields)
+            conn.execute(
+                "UPDATE history SET status = ?, record = ? WHERE id = ?",
+                (record.get("status"), json.dumps(record), session_id)
+            )
+
+    def get(self, session_id):
+        """
+        Returns:
+            dict: The history record of session_id, or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT record FROM history WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def list(self, limit=None):
+        """
+        Returns:
+            list: History records, newest first.
+        """
+        sql = "SELECT record FROM history ORDER BY seq DESC"
+        params = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def page(self, limit=50, cursor=None, sort="date", order="desc",
+             date_from=None, date_to=None, name=None, status=None):
+        """
+        One page of history records, using keyset pagination.
+
+        Args:
+            limit (int): Maximum number of records.
+            cursor (str, optional): next_cursor of the previous page.
+            sort (str): "date" or "fileSize".
+            order (str): "desc" or "asc".
+            date_from (str, optional): Earliest day included (YYYY-MM-DD).
+            date_to (str, optional): Latest day included (YYYY-MM-DD).
+            name (str, optional): Case-insensitive file name substring.
+            status (str, optional): Exact status, e.g. "success".
+
+        Returns:
+            tuple: (records, next_cursor); next_cursor is None on the last page.
+
+        Raises:
+            ValueError: On an unknown sort/order, a bad date or a cursor that
+                does not belong to this sort.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort field: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"Unknown sort order: {order}")
+        key = SORT_COLUMNS[sort]
+        where, params = [], []
+        if date_from:
+            where.append("created_at >= ?")
+            params.append(datetime.date.fromisoformat(date_from).isoformat())
+        if date_to:
+            day_after = datetime.date.fromisoformat(date_to) + datetime.timedelta(days=1)
+            where.append("created_at < ?")
+            params.append(day_after.isoformat())
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where.append("file_name LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        if cursor:
+            last_key, last_seq = _decode_cursor(cursor, sort, order)
+            op = "<" if order == "desc" else ">"
+            where.append(f"({key} {op} ? OR ({key} = ? AND seq {op} ?))")
+            params += [last_key, last_key, last_seq]
+
+        direction = order.upper()
+        sql = f"SELECT record, {key}, seq FROM history"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        # One extra row tells whether another page follows
+        sql += f" ORDER BY {key} {direction}, seq {direction} LIMIT ?"
+        params.append(limit + 1)
+
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = _encode_cursor(rows[-1][1], rows[-1][2], sort, order)
+        return [json.loads(row[0]) for row in rows], next_cursor
+
+    def version(self):
+        """
+        Token that changes whenever a record is added, replaced, updated or
+        removed; used to build ETags without running the page query.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM history_meta WHERE key = 'revision'").fetchone()
+        return str(row[0] if row else 0)
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM history").fetchone()[0]
+
+    def _connect(self):
+        # A short-lived connection per call keeps the store usable from any
+        # thread or process; SQLite serializes the writers.
+        self._ensure_ready()
+        return _Connection(self.db_path)
+
+    def _ensure_ready(self):
+        if self.ready:
+            return
+        with self.lock:
+            if self.ready:
+                return
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            with _Connection(self.db_path) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS history (
+                        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                        id TEXT NOT NULL UNIQUE,
+                        created_at TEXT NOT NULL,
+                        file_name TEXT,
+                        status TEXT,
+                        file_size_bytes INTEGER,
+                        record TEXT NOT NULL
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS history_created ON history (created_at, seq)")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS history_size "
+                    "ON history (COALESCE(file_size_bytes, -1), seq)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS history_status ON history (status)")
+                # Revision counter behind version(), bumped by every write to history
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS history_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+                )
+                conn.execute("INSERT OR IGNORE INTO history_meta (key, value) VALUES ('revision', 0)")
+                for event in ("INSERT", "UPDATE", "DELETE"):
+                    conn.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS history_revision_{event.lower()}
+                        AFTER {event} ON history
+                        BEGIN
+                            UPDATE history_meta SET value = value + 1 WHERE key = 'revision';
+                        END
+                    """)
+                self._migrate_legacy_json(conn)
+            self.ready = True
+
+    def _migrate_legacy_json(self, conn):
+        path = self.legacy_json_path
+        if not path or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            records = []
+        # The JSON list is newest first; insert oldest first so seq keeps the order
+        for record in reversed(records):
+            if isinstance(record, dict) and record.get("id"):
+                self._insert(conn, record)
+        conn.commit()
+        try:
+            os.replace(path, path + ".migrated")
+        except OSError:
+            # Another process migrated it first; the inserts above were idempotent
+            pass
+
+    def _insert(self, conn, record, file_size_bytes=None, created_at=None):
+        if file_size_bytes is None:
+            file_size_bytes = parse_file_size(record.get("fileSize"))
+        if created_at is None:
+            created_at = _record_time(record)
+        conn.execute(
+            "INSERT OR REPLACE INTO history "
+            "(id, created_at, file_name, status, file_size_bytes, record) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                record["id"],
+                created_at,
+                record.get("fileName"),
+                record.get("status"),
+                file_size_bytes,
+                json.dumps(record)
+            )
+        )
+
+class _Connection:
+    """sqlite3 connection context that commits (or rolls back) and closes."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, timeout=30)
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+def _encode_cursor(last_key, last_seq, sort, order):
+    raw = json.dumps([sort, order, last_key, last_seq]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor, sort, order):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, c_order, last_key, last_seq = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if (c_sort, c_order) != (sort, order):
+        raise ValueError("Cursor belongs to a different sort")
+    return last_key, last_seq
+
+def parse_file_size(text):
+    """Bytes from a display size such as "1.2 MB"; None if it cannot be parsed."""
+    match = _SIZE_RE.match(text or "")
+    if not match:
+        return None
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+def _record_time(record):
+    try:
+        return datetime.datetime.strptime(
+            f"{record['date']} {record['time']}", "%Y-%m-%d %H:%M"
+        ).isoformat()
+    except (KeyError, TypeError, ValueError):
+        return datetime.datetime.now().isoformat()
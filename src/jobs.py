@@ -0,0 +1,92 @@
+import os
+import json
+import uuid
+import time
+import datetime
+
+from src.sessions import MemoryBackend
+
+FINISHED_STATES = ("complete", "failed")
+
+class JobStore:
+    """
+    Registry of background generation jobs.
+
+    A job moves through status "queued" -> "running" -> "complete" | "failed";
+    while running, "stage" names the current step ("strategy", "build",
+    "explanation") and "progress" holds {"stage", "done", "total", "message"}.
+    Stages that run in a worker process report progress through a JSON file
+    (see progress_path), which get() merges into the job it returns.
+
+    Jobs live in a session backend (src/sessions.py; MemoryBackend by
+    default). With a shared one any API process can answer for a job that
+    another one runs. Only the newest max_jobs jobs are kept: an unfinished
+    job holds its entry, so only finished ones are dropped, least recently
+    used first.
+    """
+
+    def __init__(self, root, max_jobs=1000, backend=None):
+        self.root = root
+        self.max_jobs = max_jobs
+        self.backend = backend if backend is not None else MemoryBackend()
+        os.makedirs(root, exist_ok=True)
+
+    def create(self, session_id, trace_id=None):
+        now = datetime.datetime.now().isoformat()
+        job = {
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "trace_id": trace_id,
+            "status": "queued",
+            "stage": None,
+            "progress": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        self.backend.put(job["id"], job, time.time())
+        self.backend.acquire(job["id"], time.time())
+        self.backend.pop_excess(self.max_jobs)
+        return dict(job)
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = datetime.datetime.now().isoformat()
+        self.backend.update(job_id, fields, time.time())
+        if fields.get("status") in FINISHED_STATES:
+            self.backend.release(job_id, time.time())
+            self._clear_progress_file(job_id)
+
+    def get(self, job_id):
+        """
+        Returns:
+            dict: A copy of the job with the latest worker progress, or None.
+        """
+        job = self.backend.get(job_id, time.time())
+        if job is None:
+            return None
+        if job["status"] == "running":
+            progress = self._read_progress_file(job_id)
+            if progress:
+                job["progress"] = progress
+        return job
+
+    def snapshot(self):
+        """Copies of all kept jobs, as {job_id: job}."""
+        return self.backend.snapshot()
+
+    def progress_path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.progress.json")
+
+    def _read_progress_file(self, job_id):
+        try:
+            with open(self.progress_path(job_id), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _clear_progress_file(self, job_id):
+        try:
+            os.remove(self.progress_path(job_id))
+        except OSError:
+            pass
@@ -1,55 +1,269 @@
 import os
 import json
+import time
+import random
+import asyncio
+import hashlib
 import logging
-from openai import OpenAI
+import threading
+import openai
+from openai import OpenAI, AsyncOpenAI
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from src import config
+from src import config, metrics
+
+# Errors worth another attempt; anything else (bad key, bad request) is final
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# Process-wide clients, so every call reuses one HTTP connection pool
+_client = None
+_client_key = None
+_async_client = None
+_async_client_key = None
+_client_lock = threading.Lock()
+
+class ResponseCache:
+    """
+    On-disk cache of parsed LLM responses keyed by SHA-256 of model + prompt.
+    
+    Entries are JSON files under <root>/<key[:2]>/ and expire ttl seconds
+    after they were written; ttl <= 0 disables the cache.
+    """
+
+    def __init__(self, root, ttl):
+        self.root = root
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model_name, prompt):
+        return hashlib.sha256(f"{model_name}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, model_name, prompt):
+        """
+        Returns:
+            dict: The cached response, or None if missing or expired.
+        """
+        if self.ttl <= 0:
+            return None
+        path = self._path(self.key(model_name, prompt))
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "r") as f:
+                response = json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return response
+
+    def put(self, model_name, prompt, response):
+        if self.ttl <= 0:
+            return
+        path = self._path(self.key(model_name, prompt))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"model": model_name, "created": time.time(), "response": response}, f)
+        os.replace(tmp_path, path)
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+RESPONSE_CACHE = ResponseCache(config.get_llm_cache_dir(), config.get_llm_cache_ttl())
+
+def get_client():
+    """
+    Returns:
+        OpenAI: The shared synchronous client for the configured key/base URL.
+    """
+    global _client, _client_key
+    key = (config.get_api_key(), config.get_base_url())
+    with _client_lock:
+        if _client is None or _client_key != key:
+            _client = OpenAI(
+                api_key=key[0],
+                base_url=key[1] if key[1] else None,
+                timeout=config.get_llm_timeout(),
+                max_retries=0  # retried here, with jitter
+            )
+            _client_key = key
+        return _client
+
+def get_async_client():
+    """
+    Returns:
+        AsyncOpenAI: The shared async client for the configured key/base URL.
+    """
+    global _async_client, _async_client_key
+    # An httpx async pool belongs to the event loop that created it
+    key = (config.get_api_key(), config.get_base_url(), id(asyncio.get_running_loop()))
+    if _async_client is None or _async_client_key != key:
+        _async_client = AsyncOpenAI(
+            api_key=key[0],
+            base_url=key[1] if key[1] else None,
+            timeout=config.get_llm_timeout(),
+            max_retries=0
+        )
+        _async_client_key = key
+    return _async_client
+
+async def close_clients():
+    """Close the shared clients' connection pools (on app shutdown)."""
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+def retry_delay(attempt):
+    """Exponential backoff with full jitter for retry number attempt (0-based)."""
+    base = config.get_llm_retry_base_delay()
+    return random.uniform(0, min(config.get_llm_retry_max_delay(), base * (2 ** attempt)))
+
+def _request_args(model_name, prompt):
+    return {
+        "model": model_name,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.2
+    }
+
+def _has_api_key():
+    api_key = config.get_api_key()
+    return bool(api_key) and "sk-..." not in api_key
+
+def _record_attempt(start, error=None):
+    """Observe one API request in the LLM metrics."""
+    metrics.LLM_SECONDS.observe(time.perf_counter() - start, outcome="ok" if error is None else "error")
+    if error is None:
+        metrics.LLM_CALLS.inc(result="api")
+    else:
+        metrics.LLM_ERRORS.inc(error=type(error).__name__)
+
+def _call_steps(prompt):
+    """
+    Everything call_llm and call_llm_async share: the fallback, the response
+    cache, retries with backoff and metrics. A generator, so each caller only
+    supplies the transport: it yields ("request", kwargs) for every API
+    attempt, expecting the response (or the raised error, via throw) back,
+    and ("sleep", seconds) before a retry.
+    
+    Returns:
+        tuple: (strategy, from_api), as the StopIteration value.
+    """
+    model_name = config.get_model_name()
+    
+    if not _has_api_key():
+        logger.warning("No valid API key found. Using FALLBACK mode.")
+        metrics.LLM_CALLS.inc(result="fallback")
+        return get_fallback_strategy(), False
+    
+    cached = RESPONSE_CACHE.get(model_name, prompt)
+    if cached is not None:
+        logger.info("LLM response served from cache.")
+        metrics.LLM_CALLS.inc(result="cached")
+        return cached, True
+    
+    max_retries = config.get_llm_max_retries()
+    for attempt in range(max_retries + 1):
+        start = time.perf_counter()
+        try:
+            response = yield "request", _request_args(model_name, prompt)
+            result = json.loads(response.choices[0].message.content)
+            _record_attempt(start)
+            RESPONSE_CACHE.put(model_name, prompt, result)
+            return result, True
+        except RETRYABLE_ERRORS as e:
+            _record_attempt(start, e)
+            if attempt == max_retries:
+                logger.error(f"LLM Call failed after {attempt + 1} attempts: {e}")
+                break
+            delay = retry_delay(attempt)
+            logger.warning(f"LLM Call failed ({e}); retrying in {delay:.2f}s")
+        except Exception as e:
+            _record_attempt(start, e)
+            logger.error(f"LLM Call failed: {e}")
+            break
+        yield "sleep", delay
+    metrics.LLM_CALLS.inc(result="failed")
+    return get_fallback_strategy(), False
 
 def call_llm(prompt):
     """
     Call the LLM with the provided prompt.
     Uses OpenAI API if key is present, otherwise falls back to a deterministic mock.
+    Responses are cached on disk by model + prompt, and transient API errors
+    are retried with jittered backoff.
     
     Args:
         prompt (str): The prompt text.
         
     Returns:
-        dict: The parsed JSON response from the LLM (or mock).
+        tuple: (strategy, from_api). strategy is the parsed JSON response
+        from the LLM, or get_fallback_strategy() when there is no API key or
+        every attempt failed; from_api is False for the fallback, which
+        callers must not cache as the answer for this prompt.
     """
-    api_key = config.get_api_key()
-    base_url = config.get_base_url()
-    model_name = config.get_model_name()
+    steps = _call_steps(prompt)
+    try:
+        action, arg = next(steps)
+        while True:
+            if action == "sleep":
+                time.sleep(arg)
+                action, arg = steps.send(None)
+                continue
+            try:
+                response = get_client().chat.completions.create(**arg)
+            except Exception as e:
+                action, arg = steps.throw(e)
+            else:
+                action, arg = steps.send(response)
+    except StopIteration as done:
+        return done.value
+
+async def call_llm_async(prompt):
+    """
+    Async variant of call_llm for the FastAPI handlers, using the shared
+    AsyncOpenAI client.
     
-    if not api_key or "sk-..." in api_key:
-        logger.warning("No valid API key found. Using FALLBACK mode.")
-        return get_fallback_strategy()
+    Args:
+        prompt (str): The prompt text.
         
-    # Initialize client with optional custom base_url
-    client = OpenAI(
-        api_key=api_key,
-        base_url=base_url if base_url else None
-    )
-    
+    Returns:
+        tuple: (strategy, from_api), as in call_llm.
+    """
+    steps = _call_steps(prompt)
     try:
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.2
-        )
-        
-        content = response.choices[0].message.content
-        return json.loads(content)
-        
-    except Exception as e:
-        logger.error(f"LLM Call failed: {e}")
-        return get_fallback_strategy()
+        action, arg = next(steps)
+        while True:
+            if action == "sleep":
+                await asyncio.sleep(arg)
+                action, arg = steps.send(None)
+                continue
+            try:
+                response = await get_async_client().chat.completions.create(**arg)
+            except Exception as e:
+                action, arg = steps.throw(e)
+            else:
+                action, arg = steps.send(response)
+    except StopIteration as done:
+        return done.value
 
 def get_fallback_strategy():
     """
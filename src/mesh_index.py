@@ -0,0 +1,243 @@
+import os
+import json
+
+import numpy as np
+import trimesh
+from scipy.spatial import cKDTree
+
+# Normal-sphere bins: 10 degree polar x 10 degree azimuth cells
+NORMAL_BINS_POLAR = 18
+NORMAL_BINS_AZIMUTH = 36
+
+# Arrays saved by MeshIndex.save; vertices/faces are also read alone (load_arrays)
+_ARRAY_FILES = {
+    "vertices": "mesh_vertices.npy",
+    "faces": "mesh_faces.npy",
+    "face_normals": "index_face_normals.npy",
+    "face_areas": "index_face_areas.npy",
+    "face_centers": "index_face_centers.npy",
+    "face_adjacency": "index_face_adjacency.npy",
+    "face_adjacency_edges": "index_face_adjacency_edges.npy",
+    "facet_faces": "index_facet_faces.npy",
+    "facet_starts": "index_facet_starts.npy",
+    "facet_labels": "index_facet_labels.npy",
+    "normal_bin": "index_normal_bin.npy",
+    "normal_bin_order": "index_normal_bin_order.npy",
+    "normal_bin_starts": "index_normal_bin_starts.npy",
+    "normal_bin_centers": "index_normal_bin_centers.npy",
+    "normal_bin_radius": "index_normal_bin_radius.npy",
+}
+_META_FILE = "index_meta.json"
+
+class MeshIndex:
+    """
+    Derived geometry of one mesh, computed once and shared by every stage.
+
+    Holds plain NumPy arrays only, so an index pickles cheaply and can be
+    saved as .npy files that later stages memory-map (see save/load):
+    - vertices, faces: the mesh itself
+    - face_normals, face_areas, face_centers: per face; degenerate faces
+      have a zero normal
+    - face_adjacency, face_adjacency_edges: (E, 2) pairs of faces sharing an
+      edge and the two vertices of that edge
+    - facet_faces, facet_starts: coplanar facets (as trimesh.facets) in CSR
+      form, facet i is facet_faces[facet_starts[i]:facet_starts[i + 1]];
+      facet_labels gives each face's facet, -1 outside any facet
+    - normal_bin, normal_bin_order, normal_bin_starts: each face's cell on a
+      latitude/longitude grid over the normal sphere, and the faces grouped
+      by cell; normal_bin_centers/normal_bin_radius bound each cell's normals
+    - area, bounds, is_watertight, volume, center_mass: scalar properties
+
+    The KD-tree over face centers is built on first use and not saved.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in _ARRAY_FILES:
+            setattr(self, name, arrays[name])
+        self.area = meta["area"]
+        self.bounds = np.asarray(meta["bounds"], dtype=np.float64)
+        self.is_watertight = meta["is_watertight"]
+        self.volume = meta["volume"]
+        self.center_mass = np.asarray(meta["center_mass"], dtype=np.float64)
+        self._center_tree = None
+
+    @classmethod
+    def build(cls, mesh):
+        """
+        Compute the index of a mesh.
+
+        Args:
+            mesh (trimesh.Trimesh): The mesh; its trimesh caches are reused.
+
+        Returns:
+            MeshIndex: The index.
+        """
+        faces = np.ascontiguousarray(mesh.faces, dtype=np.int64)
+        n_faces = len(faces)
+        normals = np.ascontiguousarray(mesh.face_normals, dtype=np.float64)
+
+        facets = mesh.facets
+        lengths = np.fromiter((len(f) for f in facets), dtype=np.int64, count=len(facets))
+        facet_starts = np.concatenate([[0], np.cumsum(lengths)])
+        facet_faces = np.concatenate(facets).astype(np.int32) if len(facets) else np.zeros(0, dtype=np.int32)
+        facet_labels = np.full(n_faces, -1, dtype=np.int32)
+        facet_labels[facet_faces] = np.repeat(np.arange(len(facets), dtype=np.int32), lengths)
+
+        watertight = bool(mesh.is_watertight)
+        arrays = {
+            "vertices": np.ascontiguousarray(mesh.vertices, dtype=np.float64),
+            "faces": faces,
+            "face_normals": normals,
+            "face_areas": np.ascontiguousarray(mesh.area_faces, dtype=np.float64),
+            "face_centers": np.ascontiguousarray(mesh.triangles_center, dtype=np.float64),
+            "face_adjacency": np.asarray(mesh.face_adjacency, dtype=np.int32).reshape(-1, 2),
+            "face_adjacency_edges": np.asarray(mesh.face_adjacency_edges, dtype=np.int32).reshape(-1, 2),
+            "facet_faces": facet_faces,
+            "facet_starts": facet_starts,
+            "facet_labels": facet_labels,
+            **_normal_bins(normals),
+        }
+        meta = {
+            "area": float(mesh.area),
+            "bounds": np.asarray(mesh.bounds, dtype=np.float64).tolist() if n_faces else [[0.0] * 3] * 2,
+            "is_watertight": watertight,
+            "volume": float(mesh.volume) if watertight else None,
+            "center_mass": (mesh.center_mass if watertight else mesh.centroid).tolist(),
+        }
+        return cls(arrays, meta)
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        """
+        Load an index saved by save, memory-mapping its arrays by default.
+
+        Raises:
+            OSError: If the index files are missing.
+        """
+        mode = "r" if mmap else None
+        arrays = {
+            name: np.load(os.path.join(index_dir, file_name), mmap_mode=mode)
+            for name, file_name in _ARRAY_FILES.items()
+        }
+        with open(os.path.join(index_dir, _META_FILE), "r") as f:
+            meta = json.load(f)
+        return cls(arrays, meta)
+
+    def save(self, index_dir):
+        """Write the arrays as .npy files plus a small JSON of the scalars."""
+        os.makedirs(index_dir, exist_ok=True)
+        for name, file_name in _ARRAY_FILES.items():
+            np.save(os.path.join(index_dir, file_name), np.asarray(getattr(self, name)))
+        meta = {
+            "area": self.area,
+            "bounds": self.bounds.tolist(),
+            "is_watertight": self.is_watertight,
+            "volume": self.volume,
+            "center_mass": self.center_mass.tolist(),
+        }
+        # Written last: its presence marks a complete index
+        tmp_path = os.path.join(index_dir, _META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(index_dir, _META_FILE))
+
+    @property
+    def extents(self):
+        return self.bounds[1] - self.bounds[0]
+
+    @property
+    def num_facets(self):
+        return len(self.facet_starts) - 1
+
+    @property
+    def center_tree(self):
+        """cKDTree over face centers, built on first use."""
+        if self._center_tree is None:
+            self._center_tree = cKDTree(self.face_centers)
+        return self._center_tree
+
+    def to_trimesh(self):
+        """Unprocessed Trimesh over the index's vertex/face arrays."""
+        return trimesh.Trimesh(vertices=self.vertices, faces=self.faces, process=False)
+
+    def faces_in_normal_band(self, axis, max_sin):
+        """
+        Faces whose normal is within asin(max_sin) of perpendicular to axis,
+        i.e. |normal . axis| < max_sin, in ascending order. Only the normal
+        bins that can intersect the band are scanned.
+        """
+        axis = np.asarray(axis, dtype=np.float64)
+        # Angle of each bin center from the band's great circle
+        off = np.abs(np.arcsin(np.clip(self.normal_bin_centers @ axis, -1.0, 1.0)))
+        hit = np.flatnonzero(off <= np.arcsin(min(max_sin, 1.0)) + self.normal_bin_radius)
+        starts, ends = self.normal_bin_starts[hit], self.normal_bin_starts[hit + 1]
+        keep = ends > starts
+        if not keep.any():
+            return np.zeros(0, dtype=np.int64)
+        faces = np.concatenate([self.normal_bin_order[s:e] for s, e in zip(starts[keep], ends[keep])])
+        faces = np.sort(faces)
+        return faces[np.abs(self.face_normals[faces] @ axis) < max_sin]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # The tree is cheap to rebuild and much larger than the centers
+        state["_center_tree"] = None
+        return state
+
+def as_index(mesh):
+    """The MeshIndex itself, or a new one built from a trimesh.Trimesh."""
+    if isinstance(mesh, MeshIndex):
+        return mesh
+    return MeshIndex.build(mesh)
+
+def has_index(index_dir):
+    return os.path.exists(os.path.join(index_dir, _META_FILE))
+
+def load_arrays(index_dir):
+    """
+    Returns:
+        tuple: Memory-mapped (vertices, faces) arrays saved by MeshIndex.save.
+    """
+    vertices = np.load(os.path.join(index_dir, _ARRAY_FILES["vertices"]), mmap_mode="r")
+    faces = np.load(os.path.join(index_dir, _ARRAY_FILES["faces"]), mmap_mode="r")
+    return vertices, faces
+
+def has_arrays(index_dir):
+    return all(os.path.exists(os.path.join(index_dir, _ARRAY_FILES[name])) for name in ("vertices", "faces"))
+
+def _normal_bins(normals):
+    n_bins = NORMAL_BINS_POLAR * NORMAL_BINS_AZIMUTH
+    valid = np.einsum("ij,ij->i", normals, normals) > 0.5
+    theta = np.arccos(np.clip(normals[:, 2], -1.0, 1.0))
+    phi = np.arctan2(normals[:, 1], normals[:, 0])
+    polar = np.minimum((theta / np.pi * NORMAL_BINS_POLAR).astype(np.int32), NORMAL_BINS_POLAR - 1)
+    azimuth = (np.floor((phi + np.pi) / (2 * np.pi) * NORMAL_BINS_AZIMUTH).astype(np.int32)
+               % NORMAL_BINS_AZIMUTH)
+    # Degenerate faces (zero normal) belong to no bin
+    bins = np.where(valid, polar * NORMAL_BINS_AZIMUTH + azimuth, -1).astype(np.int32)
+
+    order = np.argsort(bins, kind="stable").astype(np.int32)
+    starts = np.searchsorted(bins[order], np.arange(n_bins + 1)).astype(np.int64)
+
+    # Bounding cap of each bin: mean direction and largest angle from it
+    member_faces = order[starts[0]:]
+    member_bins = bins[member_faces]
+    member_normals = normals[member_faces]
+    sums = np.column_stack([
+        np.bincount(member_bins, weights=member_normals[:, k], minlength=n_bins) for k in range(3)
+    ])
+    lengths = np.linalg.norm(sums, axis=1)
+    centers = np.divide(sums, lengths[:, None], out=np.zeros_like(sums), where=lengths[:, None] > 0)
+    angles = np.arccos(np.clip(np.einsum("ij,ij->i", member_normals, centers[member_bins]), -1.0, 1.0))
+    radius = np.zeros(n_bins)
+    filled = np.flatnonzero(starts[1:] > starts[:-1])
+    if len(filled):
+        # Members are sorted by bin, so each filled bin is one contiguous run
+        radius[filled] = np.maximum.reduceat(angles, starts[filled] - starts[0])
+    return {
+        "normal_bin": bins,
+        "normal_bin_order": order,
+        "normal_bin_starts": starts,
+        "normal_bin_centers": centers,
+        "normal_bin_radius": radius,
+    }
@@ -0,0 +1,228 @@
+"""
+Boundary topology of coplanar mesh regions, for ADVANCED_FACE export
+(see StepBuilder.add_region_solid).
+
+Every facet (coplanar group of triangles) becomes one region, every other
+triangle a region of its own. A region's boundary is the set of its
+half-edges whose twin lies in another region; chained head to tail they
+form its loops. Boundary vertices where exactly two boundary edges meet
+in a straight line are dropped, so a tessellated straight border between
+two regions becomes a single edge shared by both.
+"""
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+COLLINEAR_TOL = 1e-9  # |sin| of the turn at a vertex dropped from a border
+
+def build_regions(vertices, faces, facet_faces, facet_starts):
+    """
+    Compute the shared edges and loops of the coplanar regions of a mesh.
+
+    Args:
+        vertices (np.ndarray): (V, 3) vertex positions.
+        faces (np.ndarray): (F, 3) triangles, consistently wound.
+        facet_faces (np.ndarray): Faces of all facets, concatenated.
+        facet_starts (np.ndarray): CSR offsets into facet_faces (n_facets + 1).
+
+    Returns:
+        dict: {
+            "closed": every edge has two faces,
+            "vertices": (K,) mesh vertex indices used by the edges,
+            "edges": (E, 2) start/end positions in "vertices",
+            "region_facets": (R,) facet of each merged region,
+            "loop_region": (L,) region of each loop; loops are grouped by
+                region, the outer loop first,
+            "loop_starts": (L + 1,) CSR offsets of the loops' edges,
+            "loop_edges": edge indices of all loops, concatenated in order,
+            "loop_senses": True where the loop runs along the edge,
+            "triangles": (T,) faces exported as single triangles,
+            "triangle_edges": (T, 3) edge indices of their sides,
+            "triangle_senses": (T, 3) True where a side runs along its edge,
+        }
+        or None if the mesh is not an oriented manifold (an edge used twice
+        in the same direction), which needs the faceted export instead.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    n_verts, n_faces = len(vertices), len(faces)
+
+    # Half-edge h = 3 * face + k runs from corner k to corner k + 1
+    he_u = faces.ravel()
+    he_v = faces[:, [1, 2, 0]].ravel()
+    key = he_u * n_verts + he_v
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    if len(sorted_key) and (sorted_key[1:] == sorted_key[:-1]).any():
+        return None
+    pos = np.minimum(np.searchsorted(sorted_key, he_v * n_verts + he_u), len(key) - 1)
+    twin = np.where(sorted_key[pos] == he_v * n_verts + he_u, order[pos], -1)
+
+    # Region per face: facet id, or a fresh id per leftover triangle
+    lengths = np.diff(facet_starts)
+    region = np.full(n_faces, -1, dtype=np.int64)
+    region[np.asarray(facet_faces, dtype=np.int64)] = np.repeat(np.arange(len(lengths)), lengths)
+    is_boundary, merged = _region_boundary(region, twin, he_u, n_verts, len(lengths))
+    if not merged.all():
+        # A facet touching itself at a vertex has no unique loops; split it up
+        region[np.isin(region, np.flatnonzero(~merged))] = -1
+        is_boundary, merged = _region_boundary(region, twin, he_u, n_verts, len(lengths))
+
+    # One undirected edge per boundary half-edge pair, named by the lower half-edge
+    bnd = np.flatnonzero(is_boundary)
+    canon = np.where(twin[bnd] >= 0, np.minimum(bnd, twin[bnd]), bnd)
+    edge_names, he_edge = np.unique(canon, return_inverse=True)
+    edge_of = np.full(len(he_u), -1, dtype=np.int64)
+    edge_of[bnd] = he_edge
+    edge_u, edge_v = he_u[edge_names], he_v[edge_names]
+
+    removable = _removable_vertices(vertices, edge_u, edge_v)
+    # Corners of single triangles always stay (matters only for degenerate ones)
+    removable[faces[region < 0].ravel()] = False
+
+    # Walk the loops of the merged facets, collapsing chains through removable vertices
+    he_region = region[np.arange(len(he_u)) // 3]
+    in_facet = bnd[he_region[bnd] >= 0]
+    walk_key = he_region[in_facet] * n_verts + he_u[in_facet]
+    walk_order = np.argsort(walk_key)
+    nxt_pos = np.minimum(np.searchsorted(walk_key[walk_order], he_region[in_facet] * n_verts + he_v[in_facet]),
+                         max(len(in_facet) - 1, 0))
+    nxt = walk_order[nxt_pos]
+    if len(in_facet) and (np.bincount(nxt, minlength=len(in_facet)) != 1).any():
+        # Not a permutation: the boundary is not a set of closed loops
+        return None
+    cycle, position = _loop_positions(nxt, ~removable[he_u[in_facet]])
+
+    # Half-edges in loop order; a chain starts at each kept vertex
+    walk = np.lexsort((position, cycle))
+    hs = in_facet[walk]
+    n_cycles = int(cycle.max()) + 1 if len(cycle) else 0
+    cycle_first = np.searchsorted(cycle[walk], np.arange(n_cycles))
+    chain_head = ~removable[he_u[hs]]
+    # A loop with no kept vertex (a degenerate sliver) keeps its first one
+    chain_head[cycle_first] = True
+    chain_first = np.flatnonzero(chain_head)
+    chain_last = np.append(chain_first[1:], len(hs))[:len(chain_first)] - 1
+    chain_name = np.minimum.reduceat(edge_of[hs], chain_first) if len(hs) else np.zeros(0, dtype=np.int64)
+    chain_u, chain_v = he_u[hs[chain_first]], he_v[hs[chain_last]]
+    covered = np.zeros(len(edge_names), dtype=bool)
+    covered[edge_of[hs]] = True
+
+    # Edge table: merged chains (named by their lowest underlying edge, in the
+    # direction first walked) plus every edge not on a facet loop
+    names, first_use = np.unique(chain_name, return_index=True)
+    loose = np.flatnonzero(~covered)
+    all_names = np.concatenate([names, loose])
+    starts = np.concatenate([chain_u[first_use], edge_u[loose]])
+    ends = np.concatenate([chain_v[first_use], edge_v[loose]])
+    name_order = np.argsort(all_names)
+    lookup = np.full(len(edge_names), -1, dtype=np.int64)
+    lookup[all_names[name_order]] = name_order
+
+    used, inverse = np.unique(np.concatenate([starts, ends]), return_inverse=True)
+    edges = inverse.reshape(2, -1).T
+
+    # Loops grouped by region, the outer one (largest area about the facet
+    # normal) first
+    facet_of_cycle = he_region[hs[cycle_first]]
+    p_u, p_v = vertices[he_u[hs]], vertices[he_v[hs]]
+    moment = np.cross(p_u, p_v)
+    first_faces = np.asarray(facet_faces, dtype=np.int64)[facet_starts[facet_of_cycle]]
+    tri = vertices[faces[first_faces]]
+    normal = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+    area = sum(
+        np.bincount(cycle[walk], weights=moment[:, k], minlength=n_cycles) * normal[:, k] for k in range(3)
+    )
+    loop_order = np.lexsort((-area, facet_of_cycle))
+    region_facets, loop_region = np.unique(facet_of_cycle[loop_order], return_inverse=True)
+
+    # Chains of each loop in that order, CSR
+    chain_cycle_first = np.searchsorted(chain_first, cycle_first)
+    chain_count = np.diff(np.append(chain_cycle_first, len(chain_first)))[loop_order]
+    loop_starts = np.concatenate([[0], np.cumsum(chain_count)])
+    items = (np.repeat(chain_cycle_first[loop_order] - loop_starts[:-1], chain_count)
+             + np.arange(loop_starts[-1]))
+    loop_edges = lookup[chain_name[items]]
+
+    triangles = np.flatnonzero(region < 0)
+    tri_he = 3 * triangles[:, None] + np.arange(3)
+    tri_edges = lookup[edge_of[tri_he]]
+    return {
+        "closed": bool((twin >= 0).all()),
+        "vertices": used,
+        "edges": edges,
+        "region_facets": region_facets,
+        "loop_region": loop_region,
+        "loop_starts": loop_starts,
+        "loop_edges": loop_edges,
+        "loop_senses": starts[loop_edges] == chain_u[items],
+        "triangles": triangles,
+        "triangle_edges": tri_edges,
+        "triangle_senses": starts[tri_edges] == he_u[tri_he],
+    }
+
+def _region_boundary(region, twin, he_u, n_verts, n_facets):
+    """Boundary half-edge mask, and per facet whether its loops are unambiguous."""
+    n_he = len(he_u)
+    he_region = region[np.arange(n_he) // 3]
+    twin_region = np.where(twin >= 0, region[np.maximum(twin, 0) // 3], -2)
+    # Leftover triangles (region -1) never share a region with a neighbor
+    is_boundary = (twin < 0) | (twin_region != he_region) | (he_region < 0)
+
+    in_facet = np.flatnonzero(is_boundary & (he_region >= 0))
+    key = np.sort(he_region[in_facet] * n_verts + he_u[in_facet])
+    pinched = key[1:][key[1:] == key[:-1]] // n_verts
+    merged = np.ones(n_facets, dtype=bool)
+    merged[pinched] = False
+    return is_boundary, merged
+
+def _removable_vertices(vertices, edge_u, edge_v):
+    """Vertices on exactly two boundary edges that continue in a straight line."""
+    n_verts = len(vertices)
+    ends = np.concatenate([edge_u, edge_v])
+    others = np.concatenate([edge_v, edge_u])
+    degree = np.bincount(ends, minlength=n_verts)
+    removable = np.zeros(n_verts, dtype=bool)
+
+    two = degree[ends] == 2
+    order = np.argsort(ends[two], kind="stable")
+    pair_v = ends[two][order].reshape(-1, 2)[:, 0]
+    pair_o = others[two][order].reshape(-1, 2)
+    p = vertices[pair_v]
+    a = vertices[pair_o[:, 0]] - p
+    b = vertices[pair_o[:, 1]] - p
+    la, lb = np.linalg.norm(a, axis=1), np.linalg.norm(b, axis=1)
+    cross = np.linalg.norm(np.cross(a, b), axis=1)
+    straight = (cross <= COLLINEAR_TOL * la * lb) & (np.einsum("ij,ij->i", a, b) < 0)
+    removable[pair_v[straight]] = True
+    return removable
+
+def _loop_positions(nxt, kept):
+    """
+    Split the permutation nxt into its cycles. Returns each element's cycle
+    label and its position counted from the cycle's start: the lowest kept
+    element, or the lowest element if none is kept.
+    """
+    n = len(nxt)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    idx = np.arange(n)
+    graph = sparse.csr_matrix((np.ones(n, dtype=np.int8), (idx, nxt)), shape=(n, n))
+    _, cycle = csgraph.connected_components(graph, directed=True, connection="weak")
+    cycle = cycle.astype(np.int64)
+    n_cycles = int(cycle.max()) + 1
+    by_cycle = np.argsort(cycle, kind="stable")
+    size = np.bincount(cycle, minlength=n_cycles)
+    first = np.concatenate([[0], np.cumsum(size)[:-1]])
+    rank = np.where(kept, idx, idx + n)[by_cycle]
+    start = np.minimum.reduceat(rank, first) % n
+
+    # Pointer jumping: steps from each element forward to its cycle's start
+    is_start = np.zeros(n, dtype=bool)
+    is_start[start] = True
+    jump = np.where(is_start, idx, nxt)
+    steps = (~is_start).astype(np.int64)
+    while not is_start[jump].all():
+        steps = steps + steps[jump]
+        jump = jump[jump]
+    return cycle, (size[cycle] - steps) % size[cycle]
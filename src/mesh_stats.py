@@ -1,28 +1,31 @@
 import numpy as np
 
+from src.mesh_index import as_index
+
 def compute_mesh_stats(mesh):
     """
     Compute basic statistics for a given mesh.
     
     Args:
-        mesh (trimesh.Trimesh): The mesh object.
+        mesh (trimesh.Trimesh or MeshIndex): The mesh object.
         
     Returns:
         dict: A dictionary containing mesh statistics.
     """
     if mesh is None:
         return {}
+    index = as_index(mesh)
 
     stats = {
-        "num_faces": len(mesh.faces),
-        "num_vertices": len(mesh.vertices),
-        "bbox_min": mesh.bounds[0].tolist(),
-        "bbox_max": mesh.bounds[1].tolist(),
-        "bbox_dimensions": mesh.extents.tolist(),
-        "is_watertight": mesh.is_watertight,
-        "volume": mesh.volume if mesh.is_watertight else None,
-        "surface_area": mesh.area,
-        "center_mass": mesh.center_mass.tolist() if mesh.is_watertight else mesh.centroid.tolist()
+        "num_faces": len(index.faces),
+        "num_vertices": len(index.vertices),
+        "bbox_min": index.bounds[0].tolist(),
+        "bbox_max": index.bounds[1].tolist(),
+        "bbox_dimensions": index.extents.tolist(),
+        "is_watertight": index.is_watertight,
+        "volume": index.volume,
+        "surface_area": index.area,
+        "center_mass": index.center_mass.tolist()
     }
     
     return stats
@@ -0,0 +1,190 @@
+"""
+Process-wide metrics, rendered in the Prometheus text exposition format by
+/api/metrics.
+
+Counters, gauges and histograms are updated where things happen; sampled
+metrics read a value (a cache's hit count, the number of sessions) through
+a callback when the page is rendered. Metrics recorded inside stage worker
+processes do not reach the API process; stage timings come back as trace
+spans instead (see src.tracing).
+"""
+import math
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Powers of about 2.5 from 5 ms to 10 min
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60, 120, 300, 600)
+FACE_BUCKETS = (1e3, 5e3, 1e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+BYTE_BUCKETS = (1e5, 1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9, 2.5e9, 5e9)
+
+_registry = []
+_lock = threading.Lock()
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self):
+        """Yields (suffix, label names, label values, value)."""
+        with _lock:
+            items = list(self.values.items())
+        for key, value in items:
+            yield "", self.labelnames, key, value
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with _lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self.values.items()]
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_bucket", names, key + ("+Inf",), count
+            yield "_sum", self.labelnames, key, total
+            yield "_count", self.labelnames, key, count
+
+class Sampled(_Metric):
+    """
+    A counter or gauge read through fn() at render time. fn returns a number,
+    or a dict of label-value tuples to numbers when labelnames are given.
+    """
+
+    def __init__(self, name, help_text, kind, fn, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        values = self.fn()
+        if not self.labelnames:
+            values = {(): values}
+        for key, value in values.items():
+            yield "", self.labelnames, tuple(str(v) for v in key), value
+
+def render():
+    """The current value of every metric, in Prometheus text format."""
+    with _lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        try:
+            samples = list(metric.samples())
+        except Exception:
+            # A failing callback must not take the whole page down
+            continue
+        lines.append(f"# HELP {metric.name} {_escape(metric.help, quote=False)}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, names, values, value in samples:
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+            lines.append(f"{metric.name}{suffix}{{{labels}}} {_format_value(value)}" if labels
+                         else f"{metric.name}{suffix} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+def _escape(text, quote=True):
+    text = str(text).replace("\\", "\\\\").replace("\n", "\\n")
+    return text.replace('"', '\\"') if quote else text
+
+def _format_value(value):
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+# Pipeline
+STAGE_SECONDS = Histogram(
+    "stl2step_stage_seconds", "Duration of pipeline stages (trace spans), by stage name", ("stage",)
+)
+MESH_FACES = Histogram(
+    "stl2step_mesh_faces", "Triangle count of uploaded meshes", buckets=FACE_BUCKETS
+)
+STEP_BYTES = Histogram(
+    "stl2step_step_bytes", "Uncompressed size of generated STEP files, by format", ("format",),
+    buckets=BYTE_BUCKETS
+)
+STEP_STORED_BYTES = Counter(
+    "stl2step_step_stored_bytes_total", "Bytes of STEP artifacts written to disk, by compression",
+    ("compression",)
+)
+
+# LLM
+LLM_SECONDS = Histogram(
+    "stl2step_llm_request_seconds", "Duration of LLM API requests, by outcome (ok or error)", ("outcome",)
+)
+LLM_CALLS = Counter(
+    "stl2step_llm_calls_total", "Strategy lookups, by result (api, cached, fallback, failed)", ("result",)
+)
+LLM_ERRORS = Counter(
+    "stl2step_llm_errors_total", "Failed LLM API requests, by exception type", ("error",)
+)
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "stl2step_http_requests_total", "HTTP requests, by method, route and status", ("method", "route", "status")
+)
+HTTP_SECONDS = Histogram(
+    "stl2step_http_request_seconds", "HTTP request duration until the response starts, by route", ("route",)
+)
+
+# Sessions and disk
+SESSIONS_REMOVED = Counter(
+    "stl2step_sessions_removed_total", "Upload sessions dropped, by reason (ttl, max_count)", ("reason",)
+)
+RECLAIMED_BYTES = Counter(
+    "stl2step_reclaimed_bytes_total",
+    "Disk space freed by the sweeper, by reason (session, orphan_temp, quota)", ("reason",)
+)
+OUTPUT_BYTES = Gauge(
+    "stl2step_output_bytes", "Size of the output directory at the last quota check"
+)
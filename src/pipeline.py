@@ -0,0 +1,202 @@
+"""
+Heavy conversion stages, run in worker processes by src.workers.
+
+Every function here is a picklable top-level function that takes file paths
+rather than meshes, so only paths and small JSON-able results cross the
+process boundary. analyze_mesh builds the MeshIndex of the upload once and
+saves it as .npy files, which the later stages memory-map.
+"""
+import json
+import os
+
+import trimesh
+
+from src import config, stl_io, mesh_stats, feature_hints, step_builder, compression, tracing
+from src.mesh_index import MeshIndex, has_index, has_arrays, load_arrays
+
+# Bumped when analyze_mesh output changes, so cached analyses are recomputed
+ANALYSIS_VERSION = 2
+
+# STEP face modes of build_step, with the assumption each adds to the report
+FACE_MODE_ASSUMPTIONS = {
+    "faceted": "Geometry reconstructed using full-fidelity Faceted B-Rep (Mesh).",
+    "merged": "Geometry reconstructed as an Advanced B-Rep, coplanar mesh regions merged into planar faces.",
+    "tessellated": "Geometry exported as AP242 tessellated triangles (TESSELLATED_SHELL), not as a B-Rep.",
+}
+
+def generation_variant(face_mode, intern, compression="none"):
+    """Result-cache key for the builder settings that change the STEP artifact."""
+    return f"{face_mode}-intern{int(intern)}-{compression}"
+
+def load_mesh(mesh_path, arrays_dir=None):
+    """
+    Load a mesh, preferring arrays saved by analyze_mesh over re-parsing the STL.
+    
+    Returns:
+        trimesh.Trimesh: The mesh (unprocessed), or None if it cannot be read.
+    """
+    if arrays_dir and has_arrays(arrays_dir):
+        try:
+            vertices, faces = load_arrays(arrays_dir)
+            return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+        except OSError:
+            pass
+    if not mesh_path:
+        return None
+    return stl_io.load_stl(mesh_path)
+
+def load_index(arrays_dir):
+    """
+    Returns:
+        MeshIndex: The index saved by analyze_mesh (memory-mapped), or None.
+    """
+    if arrays_dir and has_index(arrays_dir):
+        try:
+            return MeshIndex.load(arrays_dir)
+        except (OSError, ValueError):
+            pass
+    return None
+
+def analyze_mesh(mesh_path, arrays_dir):
+    """
+    Parse an uploaded STL and compute its statistics and feature hints.
+    
+    Args:
+        mesh_path (str): Path to the STL file.
+        arrays_dir (str): Directory to save the MeshIndex (including the
+            parsed vertex/face arrays) in.
+        
+    Returns:
+        dict: {"version", "stats", "planar_hints", "cylindrical_hints"}, or
+        None if the file is not a readable STL.
+    """
+    with tracing.span("load") as attrs:
+        mesh = stl_io.load_stl(mesh_path)
+        attrs["faces"] = 0 if mesh is None else len(mesh.faces)
+    if mesh is None:
+        return None
+    with tracing.span("index"):
+        index = MeshIndex.build(mesh)
+        index.save(arrays_dir)
+    
+    with tracing.span("stats"):
+        stats = mesh_stats.compute_mesh_stats(index)
+    with tracing.span("planar_hints") as attrs:
+        planar_hints = feature_hints.extract_planar_hints(index)
+        attrs["hints"] = len(planar_hints)
+    with tracing.span("cylinder_hints") as attrs:
+        cylindrical_hints = feature_hints.extract_cylindrical_hints(
+            index, time_budget=config.get_cylinder_time_budget()
+        )
+        attrs["hints"] = len(cylindrical_hints)
+    return {
+        "version": ANALYSIS_VERSION,
+        "stats": stats,
+        "planar_hints": planar_hints,
+        "cylindrical_hints": cylindrical_hints
+    }
+
+def format_count(n):
+    """Short human count: 950, 65.5K, 1.2M."""
+    for div, suffix in ((1e6, "M"), (1e3, "K")):
+        if n >= div:
+            return f"{n / div:.1f}".rstrip("0").rstrip(".") + suffix
+    return str(n)
+
+def write_progress(progress_path, stage, done, total, message):
+    """Atomically replace the JSON progress file a job's status is read from."""
+    tmp_path = f"{progress_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"stage": stage, "done": done, "total": total, "message": message}, f)
+    os.replace(tmp_path, progress_path)
+
+def _step_progress(progress_path):
+    if not progress_path:
+        return None
+    def report(stage, done, total):
+        noun = "points" if stage == "points" else "faces"
+        write_progress(progress_path, stage, done, total,
+                       f"{noun} emitted {format_count(done)}/{format_count(total)}")
+    return report
+
+def build_step(step_path, strategy_json, mesh_path, arrays_dir=None,
+               intern=False, intern_max_entries=step_builder.DEFAULT_INTERN_MAX_ENTRIES,
+               progress_path=None, face_mode="faceted", emit_workers=0, compression_level=None):
+    """
+    Stream the B-Rep STEP file for a mesh to step_path.
+    
+    Args:
+        step_path (str): Output STEP path; a .gz/.zst/.stpz name is
+            compressed while it is written (see compression.open_writer).
+        strategy_json (dict): Strategy from the LLM (its entities are dropped).
+        mesh_path (str): Path to the uploaded STL.
+        arrays_dir (str, optional): Directory with arrays saved by analyze_mesh.
+        intern (bool): Reuse identical geometric entities.
+        intern_max_entries (int): Bound on the intern table.
+        progress_path (str, optional): JSON file updated with the emitted
+            point/face counts while the solid is built.
+        face_mode (str): "faceted" for a FACETED_BREP with one face per
+            triangle, "merged" for ADVANCED_FACEs that merge coplanar regions,
+            "tessellated" for an AP242 TESSELLATED_SHELL.
+        emit_workers (int): Processes the faceted export is formatted in
+            when interning is off (see StepBuilder).
+        compression_level (int, optional): Level for a compressed step_path.
+        
+    Returns:
+        dict: {"strategy", "step_bytes", "stored_bytes", "intern_stats",
+        "num_faces"}; step_bytes counts the uncompressed STEP text.
+        
+    Raises:
+        ValueError: On an unknown face_mode.
+    """
+    if face_mode not in FACE_MODE_ASSUMPTIONS:
+        raise ValueError(f"Unknown STEP face mode: {face_mode}")
+    # FORCE MESH GEOMETRY ONLY - Remove AI hallucinations
+    strategy_json["entities"] = []
+    strategy_json.setdefault("assumptions", [])
+    
+    # Prefer the saved index; a cached analysis of an earlier upload left none,
+    # and the builder then computes the normals itself
+    with tracing.span("load_mesh") as attrs:
+        index = load_index(arrays_dir)
+        mesh = index if index is not None else load_mesh(mesh_path, arrays_dir)
+        normals = None if index is None else index.face_normals
+        if face_mode == "merged" and index is None and mesh is not None:
+            # Merging needs the facets
+            index = MeshIndex.build(mesh)
+            mesh, normals = index, index.face_normals
+        attrs["saved_index"] = normals is not None
+    
+    with compression.open_writer(step_path, compression_level) as step_file:
+        builder = step_builder.StepBuilder(
+            stream=step_file,
+            intern=intern,
+            intern_max_entries=intern_max_entries,
+            progress=_step_progress(progress_path),
+            schema="AP242" if face_mode == "tessellated" else "AP214",
+            emit_workers=emit_workers
+        )
+        if mesh is not None:
+            with tracing.span("step_build", format=face_mode, faces=len(mesh.faces)):
+                if face_mode == "merged":
+                    builder.add_region_solid(mesh.vertices, mesh.faces, mesh.facet_faces, mesh.facet_starts,
+                                             normals=normals)
+                elif face_mode == "tessellated":
+                    builder.add_tessellated_solid(mesh.vertices, mesh.faces)
+                else:
+                    builder.add_mesh_solid(mesh.vertices, mesh.faces, normals=normals)
+            strategy_json["assumptions"].append(FACE_MODE_ASSUMPTIONS[face_mode])
+        
+        # Note: strategy_json['entities'] is now empty, so generate_step_from_strategy 
+        # will ONLY write the solid_breps (and boilerplate).
+        with tracing.span("step_write") as attrs:
+            step_bytes = builder.generate_step_from_strategy(strategy_json)
+            attrs["bytes"] = step_bytes
+    
+    return {
+        "strategy": strategy_json,
+        "step_bytes": step_bytes,
+        "stored_bytes": os.path.getsize(step_path),
+        "intern_stats": builder.intern_stats(),
+        "num_faces": 0 if mesh is None else len(mesh.faces)
+    }
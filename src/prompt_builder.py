@@ -1,4 +1,44 @@
 import json
+import math
+
+from src import config
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts are estimated without it
+    tiktoken = None
+
+# Columns of the compact planar-hint table; x/y axes are omitted because the
+# consumer can rebuild them from the normal the same way feature_hints does
+PLANE_COLUMNS = ("area", "normal", "center", "size_uv", "faces")
+
+COMPACT_FORMAT_NOTE = (
+    "Data is compact JSON. 'planes' lists the largest planar hints column-wise: "
+    "entry i of every column (area, normal, center, size_uv=[width,height], faces=face count) "
+    "describes plane i. 'planes_tail' summarizes the remaining smaller planes, "
+    "with their dominant normals as [nx,ny,nz,count,area]. 'cylinders' gives each "
+    "detected cylinder's axis, origin (axis point at mid-height), r=radius, h=height "
+    "and hole=true for bores."
+)
+
+_encoders = {}
+
+def count_tokens(text, model_name=None):
+    """
+    Number of tokens in text for model_name.
+    Uses tiktoken when installed, otherwise estimates 4 characters per token.
+    """
+    if tiktoken is None:
+        return math.ceil(len(text) / 4)
+    model_name = model_name or config.get_model_name()
+    encoder = _encoders.get(model_name)
+    if encoder is None:
+        try:
+            encoder = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            encoder = tiktoken.get_encoding("cl100k_base")
+        _encoders[model_name] = encoder
+    return len(encoder.encode(text))
 
 def build_structured_prompt(mesh_stats, features, options=None):
     """
@@ -7,11 +47,21 @@ def build_structured_prompt(mesh_stats, features, options=None):
     Args:
         mesh_stats (dict): Statistics from mesh_stats.py
         features (dict): Feature hints from feature_hints.py
-        options (dict): User options (e.g. detail level)
+        options (dict): User options (e.g. detail level). Recognized keys:
+            "mode" ("compact" or "full"), "token_budget" and "top_k"; they
+            default to PROMPT_MODE, PROMPT_TOKEN_BUDGET and PROMPT_TOP_K.
         
     Returns:
         str: The full prompt string.
     """
+    options = options or {}
+    if options.get("mode", config.get_prompt_mode()) == "compact":
+        return build_compact_prompt(
+            mesh_stats,
+            features,
+            token_budget=options.get("token_budget", config.get_prompt_token_budget()),
+            top_k=options.get("top_k", config.get_prompt_top_k())
+        )
     
     system_context = (
         "You are an expert CAD engineer specialized in Reverse Engineering. "
@@ -45,3 +95,162 @@ def build_structured_prompt(mesh_stats, features, options=None):
     prompt = f"{system_context}\n\nDATA:\n{json.dumps(data_context, indent=2)}\n\nINSTRUCTIONS:\n{task_instructions}"
     
     return prompt
+
+def build_compact_prompt(mesh_stats, features, token_budget=2000, top_k=20, model_name=None):
+    """
+    Construct the strategy prompt in compact form: rounded floats, planar
+    hints as columns, only the top_k largest planes listed and the rest
+    aggregated. top_k is lowered until the prompt fits token_budget.
+    
+    Args:
+        mesh_stats (dict): Statistics from mesh_stats.py
+        features (dict): Feature hints ({"planar", "cylindrical"})
+        token_budget (int): Hard upper bound on prompt tokens.
+        top_k (int): Most planes to list individually.
+        model_name (str, optional): Model whose tokenizer counts the budget.
+        
+    Returns:
+        str: The prompt string.
+        
+    Raises:
+        ValueError: If even the prompt without any listed plane exceeds the budget.
+    """
+    planes = sorted(features.get("planar", []), key=lambda h: h["area"], reverse=True)
+    cylinders = features.get("cylindrical", [])
+    quantum = _quantum(mesh_stats)
+    
+    def render(k, tail_normals=5, cylinder_reasons=True):
+        data = {
+            "stats": _compact_stats(mesh_stats, quantum),
+            "planes": _plane_columns(planes[:k], quantum),
+            "planes_tail": _plane_tail(planes[k:], tail_normals),
+            "cylinders": [_cylinder_entry(c, quantum, cylinder_reasons) for c in cylinders]
+        }
+        if not data["planes_tail"]["count"]:
+            del data["planes_tail"]
+        text = json.dumps(data, separators=(",", ":"))
+        return _compose_prompt(text, COMPACT_FORMAT_NOTE)
+    
+    def fits(prompt):
+        return count_tokens(prompt, model_name) <= token_budget
+    
+    # Largest k that fits; token count grows with k
+    lo, hi = 0, min(top_k, len(planes))
+    if fits(render(hi)):
+        return render(hi)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if fits(render(mid)):
+            lo = mid
+        else:
+            hi = mid - 1
+    prompt = render(lo)
+    if fits(prompt):
+        return prompt
+    
+    # Still over budget with no plane listed: shed the optional detail
+    prompt = render(0, tail_normals=0, cylinder_reasons=False)
+    if fits(prompt):
+        return prompt
+    raise ValueError(
+        f"Prompt needs {count_tokens(prompt, model_name)} tokens, over the budget of {token_budget}"
+    )
+
+def _compose_prompt(data_text, format_note):
+    system_context = (
+        "You are an expert CAD engineer specialized in Reverse Engineering. "
+        "Your task is to analyze mesh statistics and geometric hints to propose a "
+        "strategy for representing this object in ISO 10303-21 (STEP) format using "
+        "feature-based approximations (Planes, Cylinders)."
+    )
+    task_instructions = (
+        "Based on the provided data:\n"
+        "1. Identify the most likely geometric primitives (e.g., is the object a box, a cylinder, or a plate?).\n"
+        "2. Propose a simplified B-Rep structure. Group coplanar faces into single planes.\n"
+        "3. Output a JSON object with 'detected_shape' (short phrase), 'assumptions' (list of strings) and "
+        "'entities' (list of {'type': 'PLANE'|'CYLINDER', 'params': {'origin', 'normal'} for PLANE or "
+        "{'origin', 'axis', 'radius'} for CYLINDER, optional 'dimensions': {'width', 'height'}}).\n"
+        "Use large planar hints as faces; fit a cylinder where an axis is hinted."
+    )
+    return f"{system_context}\n\n{format_note}\n\nDATA:\n{data_text}\n\nINSTRUCTIONS:\n{task_instructions}"
+
+def _round(value, digits=4):
+    """Round floats to `digits` significant digits, recursing into lists."""
+    if isinstance(value, (list, tuple)):
+        return [_round(v, digits) for v in value]
+    if isinstance(value, float):
+        if value == 0 or not math.isfinite(value):
+            return 0 if value == 0 else None
+        rounded = float(f"{value:.{digits}g}")
+        return int(rounded) if rounded.is_integer() else rounded
+    return value
+
+def _quantum(mesh_stats):
+    """Coordinate resolution: 4 significant digits of the largest bbox dimension."""
+    dims = mesh_stats.get("bbox_dimensions") or [1.0]
+    scale = max(float(d) for d in dims) or 1.0
+    return 10.0 ** (math.floor(math.log10(scale)) - 3)
+
+def _round_coords(values, quantum):
+    """Snap lengths to the part's resolution so noise like 1e-16 prints as 0."""
+    if values is None:
+        return None
+    if isinstance(values, (list, tuple)):
+        return [_round_coords(v, quantum) for v in values]
+    return _round(round(float(values) / quantum) * quantum)
+
+def _round_unit(vector):
+    # Unit vectors: 3 decimals, so axis-aligned normals print as 0/1/-1
+    return [_round(round(float(c), 3), 4) for c in vector]
+
+def _cylinder_entry(cylinder, quantum, with_reason=True):
+    if "origin" not in cylinder:
+        entry = {"axis": cylinder.get("axis_hint")}
+        if with_reason and "reason" in cylinder:
+            entry["reason"] = cylinder["reason"]
+        return entry
+    entry = {
+        "axis": _round_unit(cylinder["axis"]),
+        "origin": _round_coords(cylinder["origin"], quantum),
+        "r": _round_coords(cylinder["radius"], quantum),
+        "h": _round_coords(cylinder["height"], quantum),
+    }
+    if not cylinder.get("convex", True):
+        entry["hole"] = True
+    return entry
+
+def _compact_stats(mesh_stats, quantum):
+    return {
+        "faces": mesh_stats.get("num_faces"),
+        "vertices": mesh_stats.get("num_vertices"),
+        "bbox_min": _round_coords(mesh_stats.get("bbox_min"), quantum),
+        "bbox_max": _round_coords(mesh_stats.get("bbox_max"), quantum),
+        "watertight": mesh_stats.get("is_watertight"),
+        "volume": _round(mesh_stats.get("volume")),
+        "area": _round(mesh_stats.get("surface_area")),
+        "center_mass": _round_coords(mesh_stats.get("center_mass"), quantum)
+    }
+
+def _plane_columns(planes, quantum):
+    return {
+        "area": [_round(p["area"]) for p in planes],
+        "normal": [_round_unit(p["normal"]) for p in planes],
+        "center": [_round_coords(p["center"], quantum) for p in planes],
+        "size_uv": [_round_coords([p["param_u"], p["param_v"]], quantum) for p in planes],
+        "faces": [p.get("face_count") for p in planes]
+    }
+
+def _plane_tail(planes, max_normals):
+    """Aggregate of the planes not listed individually."""
+    groups = {}
+    for p in planes:
+        key = tuple(_round_unit(p["normal"]))
+        count, area = groups.get(key, (0, 0.0))
+        groups[key] = (count + 1, area + p["area"])
+    dominant = sorted(groups.items(), key=lambda item: item[1][1], reverse=True)[:max_normals]
+    return {
+        "count": len(planes),
+        "area": _round(float(sum(p["area"] for p in planes))),
+        "faces": sum(p.get("face_count", 0) for p in planes),
+        "normals": [[*normal, count, _round(area)] for normal, (count, area) in dominant]
+    }
@@ -0,0 +1,169 @@
+import os
+import json
+import shutil
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    Content-addressed store of pipeline results, keyed by the SHA-256 of the
+    uploaded STL, so a repeated upload can skip analysis, the LLM call and the
+    STEP build.
+    
+    Each entry is a folder <root>/<hash> holding:
+    - analysis.json: mesh stats and feature hints
+    - strategy.json: the LLM strategy
+    - generation_<variant>.json: paths of the generated artifacts under
+      outputs/runs (one per builder configuration)
+    
+    Entries are evicted least-recently-used first once there are more than
+    max_entries of them or they take more than max_bytes on disk. Eviction
+    never deletes the run artifacts themselves; history still points at them.
+    The LRU order and entry sizes are kept in memory after one scan of root
+    (ordered by directory mtime), so a put does not walk the cache; entries
+    written by another process join the index when this one reads them.
+    Reads and writes touch the disk: call them off the event loop.
+    """
+
+    def __init__(self, root, max_entries=1000, max_bytes=64 * 1024 * 1024):
+        self.root = root
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # file_hash -> bytes on disk, least recently used first (see _ensure_index)
+        self.index = None
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get_analysis(self, file_hash):
+        """
+        Returns:
+            dict: {"version", "stats", "planar_hints", "cylindrical_hints"} or None.
+        """
+        return self._count(self._read(file_hash, "analysis.json"))
+
+    def put_analysis(self, file_hash, analysis):
+        self._write(file_hash, "analysis.json", analysis)
+
+    def get_strategy(self, file_hash):
+        return self._count(self._read(file_hash, "strategy.json"))
+
+    def put_strategy(self, file_hash, strategy):
+        self._write(file_hash, "strategy.json", strategy)
+
+    def get_generation(self, file_hash, variant):
+        """
+        Returns:
+            dict: {"step_path", "explanation_path", "report", ...} or None if
+            missing or if the STEP file no longer exists. "report" is None
+            while the explanation has not been written yet.
+        """
+        generation = self._read(file_hash, f"generation_{variant}.json")
+        if generation is not None:
+            if not os.path.exists(generation["step_path"]):
+                generation = None
+            else:
+                # The explanation is written after the STEP file and may still be pending
+                try:
+                    with open(generation["explanation_path"], "r") as f:
+                        generation["report"] = f.read()
+                except OSError:
+                    generation["report"] = None
+        return self._count(generation)
+
+    def put_generation(self, file_hash, variant, generation):
+        self._write(file_hash, f"generation_{variant}.json", generation)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _entry_dir(self, file_hash):
+        return os.path.join(self.root, file_hash)
+
+    def _count(self, value):
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def _read(self, file_hash, name):
+        if not file_hash:
+            return None
+        entry_dir = self._entry_dir(file_hash)
+        try:
+            with open(os.path.join(entry_dir, name), "r") as f:
+                value = json.load(f)
+            # Directory mtime marks recency for LRU eviction after a restart
+            os.utime(entry_dir)
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self._ensure_index()
+            if file_hash in self.index:
+                self.index.move_to_end(file_hash)
+            else:
+                try:
+                    self._track(file_hash, _dir_size(entry_dir))
+                except OSError:
+                    pass
+        return value
+
+    def _write(self, file_hash, name, value):
+        entry_dir = self._entry_dir(file_hash)
+        os.makedirs(entry_dir, exist_ok=True)
+        path = os.path.join(entry_dir, name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, path)
+        os.utime(entry_dir)
+        size = _dir_size(entry_dir)
+        with self.lock:
+            self._ensure_index()
+            self._track(file_hash, size)
+            self._evict()
+
+    def _track(self, file_hash, size):
+        """Record an entry's size as most recently used (lock held)."""
+        self.total_bytes += size - self.index.pop(file_hash, 0)
+        self.index[file_hash] = size
+
+    def _ensure_index(self):
+        """Build the LRU index from the entry folders on disk, once (lock held)."""
+        if self.index is not None:
+            return
+        entries = []
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            names = []
+        for name in names:
+            entry_dir = os.path.join(self.root, name)
+            try:
+                entries.append((os.stat(entry_dir).st_mtime, name, _dir_size(entry_dir)))
+            except OSError:
+                continue
+        entries.sort()
+        self.index = OrderedDict((name, size) for _, name, size in entries)
+        self.total_bytes = sum(self.index.values())
+
+    def _evict(self):
+        while self.index and (len(self.index) > self.max_entries or self.total_bytes > self.max_bytes):
+            file_hash, size = self.index.popitem(last=False)
+            shutil.rmtree(self._entry_dir(file_hash), ignore_errors=True)
+            self.total_bytes -= size
+            self.evictions += 1
+
+def _dir_size(path):
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
@@ -1,17 +1,25 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import shutil
 import os
 import json
 import uuid
 import logging
 import datetime
+import asyncio
+import hashlib
+import time
+from collections import deque
 from typing import List, Optional
 
 # Import existing modules
-from src import stl_io, mesh_stats, feature_hints, prompt_builder, llm_client, step_builder, explain, storage, config
+from src import prompt_builder, llm_client, explain, storage, config, pipeline, compression, metrics, tracing
+from src.result_cache import ResultCache
+from src.workers import StageExecutor, ExecutorSaturated
+from src.jobs import JobStore
+from src.history_store import HistoryStore
+from src.sessions import SessionStore, open_backend
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,31 +34,191 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients resume downloads
+    expose_headers=["ETag", "Content-Range", "Accept-Ranges", "Content-Encoding", tracing.TRACE_HEADER],
 )
 
-# In-memory storage for session state (simulation of DB)
-# In production, use a real DB or Redis
-SESSIONS = {}
+# Folders of dropped sessions, deleted by the next sweep (off the event loop)
+PENDING_DELETES = deque()
 
-# Persistent History
+def _session_temp_dir(session_id):
+    return os.path.join(config.get_output_dir(), "temp", session_id)
+
+def _discard_session(session_id, data, reason):
+    PENDING_DELETES.append(_session_temp_dir(session_id))
+    metrics.SESSIONS_REMOVED.inc(reason=reason)
+    logger.info(f"Dropped session {session_id} ({reason})")
+
+# Upload sessions, expired after SESSION_TTL and bounded by SESSION_MAX_COUNT;
+# SESSION_BACKEND=sqlite or redis shares them between workers and nodes
+SESSIONS = SessionStore(
+    config.get_session_ttl(),
+    config.get_session_max_count(),
+    on_remove=_discard_session,
+    backend=open_backend(config.get_session_backend(), config.get_session_db_path(), config.get_session_redis_url())
+)
+SWEEPER_TASKS = set()
+
+# Analysis, strategy and artifacts of earlier runs, keyed by upload content hash
+RESULT_CACHE = ResultCache(
+    config.get_result_cache_dir(),
+    max_entries=config.get_result_cache_max_entries(),
+    max_bytes=config.get_result_cache_max_bytes()
+)
+
+# Process pool for the CPU-heavy stages (parse, analysis, STEP build)
+STAGES = StageExecutor(config.get_worker_processes(), config.get_worker_max_pending())
+
+# Background generate jobs and the tasks running them; the jobs are kept in
+# the session backend's file or server, so any worker can report on them
+JOBS = JobStore(
+    os.path.join(config.get_output_dir(), "jobs"),
+    backend=open_backend(config.get_session_backend(), config.get_session_db_path(),
+                         config.get_session_redis_url(), kind="job")
+)
+JOB_TASKS = set()
+JOB_EVENT_INTERVAL = 0.5  # seconds between job polls of an SSE stream
+JOB_EVENT_KEEPALIVE = 15.0
+
+# Persistent History (history.json from older versions is imported once)
 HISTORY_FILE = os.path.join(config.get_output_dir(), "history.json")
+HISTORY = HistoryStore(config.get_history_db_path(), legacy_json_path=HISTORY_FILE)
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 500
+
+# Metrics read from the live objects when /api/metrics is rendered
+def _cache_counts(attr):
+    return {
+        ("result",): getattr(RESULT_CACHE, attr),
+        ("llm_response",): getattr(llm_client.RESPONSE_CACHE, attr),
+    }
+
+def _cache_hit_ratios():
+    hits, misses = _cache_counts("hits"), _cache_counts("misses")
+    return {key: hits[key] / (hits[key] + misses[key]) if hits[key] + misses[key] else 0.0 for key in hits}
+
+def _job_counts():
+    counts = {(status,): 0 for status in ("queued", "running", "complete", "failed")}
+    for job in JOBS.snapshot().values():
+        counts[(job["status"],)] = counts.get((job["status"],), 0) + 1
+    return counts
+
+metrics.Sampled("stl2step_active_sessions", "Upload sessions in the session store", "gauge", lambda: len(SESSIONS))
+metrics.Sampled("stl2step_jobs", "Generate jobs kept in the job store, by status", "gauge", _job_counts, ("status",))
+metrics.Sampled("stl2step_stage_slots_in_flight", "Pipeline stages running or queued", "gauge",
+                lambda: STAGES.in_flight)
+metrics.Sampled("stl2step_stage_rejected_total", "Stages rejected because the queue was full", "counter",
+                lambda: STAGES.rejected)
+metrics.Sampled("stl2step_cache_hits_total", "Cache lookups that found an entry, by cache", "counter",
+                lambda: _cache_counts("hits"), ("cache",))
+metrics.Sampled("stl2step_cache_misses_total", "Cache lookups that found nothing, by cache", "counter",
+                lambda: _cache_counts("misses"), ("cache",))
+metrics.Sampled("stl2step_cache_hit_ratio", "Hits / lookups since start, by cache", "gauge",
+                _cache_hit_ratios, ("cache",))
 
 def load_history():
-    if os.path.exists(HISTORY_FILE):
+    return HISTORY.list()
+
+def save_history_record(record, file_size_bytes=None, created_at=None):
+    HISTORY.add(record, file_size_bytes=file_size_bytes, created_at=created_at)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """
+    Give every request a trace ID (the client's X-Trace-Id, or a new one),
+    echo it in the response and count the request in the HTTP metrics.
+    Background tasks started by the handler inherit the ID.
+    """
+    trace_id = tracing.clean_trace_id(request.headers.get(tracing.TRACE_HEADER)) or tracing.new_trace_id()
+    token = tracing.set_trace_id(trace_id)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        tracing.reset_trace_id(token)
+        # The route template, not the path, keeps session IDs out of the labels
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=route, status=status)
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - start, route=route)
+    response.headers[tracing.TRACE_HEADER] = trace_id
+    return response
+
+@app.on_event("startup")
+async def start_sweeper():
+    task = asyncio.create_task(_sweep_loop())
+    SWEEPER_TASKS.add(task)
+    task.add_done_callback(SWEEPER_TASKS.discard)
+
+async def _sweep_loop():
+    while True:
+        await asyncio.sleep(config.get_session_sweep_interval())
         try:
-            with open(HISTORY_FILE, "r") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_history_record(record):
-    history = load_history()
-    # Prepend new record
-    history.insert(0, record)
-    os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
-    with open(HISTORY_FILE, "w") as f:
-        json.dump(history, f, indent=2)
+            await sweep()
+        except Exception as e:
+            logger.error(f"Sweep failed: {e}")
+
+async def sweep():
+    """
+    Drop expired sessions, then (in a thread) delete their temp folders,
+    temp folders no session owns, and old run folders beyond the disk quota.
+    """
+    SESSIONS.expire()
+    live = SESSIONS.snapshot()
+    await asyncio.to_thread(_sweep_disk, live)
+
+def _sweep_disk(live):
+    while PENDING_DELETES:
+        metrics.RECLAIMED_BYTES.inc(storage.remove_tree(PENDING_DELETES.popleft()), reason="session")
+    
+    # Left by a restart or a failed upload; the grace period covers uploads
+    # still being analyzed, whose session does not exist yet
+    temp_root = os.path.join(config.get_output_dir(), "temp")
+    cutoff = time.time() - config.get_session_ttl()
+    try:
+        entries = list(os.scandir(temp_root))
+    except OSError:
+        entries = []
+    for entry in entries:
+        if entry.name not in live and entry.is_dir(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+            freed = storage.remove_tree(entry.path)
+            metrics.RECLAIMED_BYTES.inc(freed, reason="orphan_temp")
+            logger.info(f"Removed orphaned temp folder {entry.path} ({freed} bytes)")
+    
+    quota = config.get_output_quota_bytes()
+    if quota <= 0:
+        return
+    # Live sessions and the newest history records keep their artifacts
+    protected = [os.path.join(storage.OUTPUT_DIR, sid + storage.RUN_SUFFIX) for sid in live]
+    protected += [os.path.dirname(data["step_path"]) for data in live.values() if data.get("step_path")]
+    protected += [os.path.dirname(record["step_path"])
+                  for record in HISTORY.list(limit=config.get_history_retain_artifacts())
+                  if record.get("step_path")]
+    usage, removed = storage.reclaim_space(quota, protected)
+    metrics.OUTPUT_BYTES.set(usage)
+    for path, freed in removed:
+        metrics.RECLAIMED_BYTES.inc(freed, reason="quota")
+        logger.info(f"Quota: removed {path} ({freed} bytes)")
+    if usage > quota:
+        logger.warning(f"Output directory uses {usage} bytes, over the {quota} byte quota, "
+                       f"with nothing left to delete")
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    for task in list(SWEEPER_TASKS):
+        task.cancel()
+    STAGES.shutdown()
+    await llm_client.close_clients()
+
+def _busy_response(err):
+    logger.warning(f"Rejecting request, workers saturated: {err} {STAGES.stats()}")
+    return HTTPException(
+        status_code=503,
+        detail="Server is busy with other conversions, retry shortly",
+        headers={"Retry-After": "5"}
+    )
 
 class AnalysisResult(BaseModel):
     stats: dict
@@ -63,8 +231,51 @@ class GenerationResponse(BaseModel):
     explanation: str
 
 @app.get("/api/history")
-async def get_history():
-    return load_history()
+async def get_history(
+    request: Request,
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "date",
+    order: str = "desc",
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    q: Optional[str] = None,
+    status: Optional[str] = None
+):
+    """
+    One page of conversion history, newest first by default.
+    
+    Filters: date_from/date_to (YYYY-MM-DD, inclusive), q (file name
+    substring) and status; sort is "date" or "fileSize". Pass the returned
+    next_cursor back as cursor for the following page. Responses carry an
+    ETag, and If-None-Match answers 304 while the history is unchanged.
+    """
+    query = [limit, cursor, sort, order, date_from, date_to, q, status]
+    # SQLite calls run in a thread: a busy writer must not stall the event loop
+    version = await asyncio.to_thread(HISTORY.version)
+    etag = '"' + hashlib.sha1(json.dumps([version, query]).encode("utf-8")).hexdigest() + '"'
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    try:
+        items, next_cursor = await asyncio.to_thread(
+            HISTORY.page,
+            limit=limit,
+            cursor=cursor,
+            sort=sort,
+            order=order,
+            date_from=date_from,
+            date_to=date_to,
+            name=q,
+            status=status
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return JSONResponse(
+        {"items": items, "next_cursor": next_cursor},
+        headers={"ETag": etag, "Cache-Control": "no-cache"}
+    )
 
 @app.post("/api/upload")
 async def upload_file(file: UploadFile = File(...)):
@@ -74,127 +285,276 @@ async def upload_file(file: UploadFile = File(...)):
     session_id = str(uuid.uuid4())
     
     # Save temp file
-    temp_dir = os.path.join(config.get_output_dir(), "temp", session_id)
+    temp_dir = _session_temp_dir(session_id)
     os.makedirs(temp_dir, exist_ok=True)
     file_path = os.path.join(temp_dir, file.filename)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    with tracing.span("save_upload") as attrs:
+        file_hash = await asyncio.to_thread(storage.save_upload, file.file, file_path)
+        attrs["bytes"] = os.path.getsize(file_path)
         
-    # Parse and Analyze
-    logger.info(f"Analyzing {file.filename}...")
+    # Parse and Analyze (unless this exact file was analyzed before)
     try:
-        mesh = stl_io.load_stl(file_path)
-        if mesh is None:
-            raise HTTPException(status_code=400, detail="Failed to parse STL file")
-            
-        stats = mesh_stats.compute_mesh_stats(mesh)
-        planar_hints = feature_hints.extract_planar_hints(mesh)
-        cyl_hints = feature_hints.extract_cylindrical_hints(mesh)
+        cached = await asyncio.to_thread(RESULT_CACHE.get_analysis, file_hash)
+        if cached and cached.get("version") != pipeline.ANALYSIS_VERSION:
+            cached = None
+        if cached:
+            logger.info(f"Reusing cached analysis for {file.filename} ({file_hash})")
+            stats = cached["stats"]
+            planar_hints = cached["planar_hints"]
+            cyl_hints = cached["cylindrical_hints"]
+            arrays_dir = None
+        else:
+            logger.info(f"Analyzing {file.filename}...")
+            # Parsed arrays are saved to temp_dir for the generate stage
+            analysis = await STAGES.run(pipeline.analyze_mesh, file_path, temp_dir)
+            if analysis is None:
+                raise HTTPException(status_code=400, detail="Failed to parse STL file")
+            arrays_dir = temp_dir
+                
+            stats = analysis["stats"]
+            planar_hints = analysis["planar_hints"]
+            cyl_hints = analysis["cylindrical_hints"]
+            await asyncio.to_thread(RESULT_CACHE.put_analysis, file_hash, analysis)
+        
+        metrics.MESH_FACES.observe(stats.get("num_faces", 0))
         
         # Store in session
-        SESSIONS[session_id] = {
+        SESSIONS.create(session_id, {
             "mesh_path": file_path,
+            "file_hash": file_hash,
             "filename": file.filename,
             "stats": stats,
             "planar_hints": planar_hints,
             "cylindrical_hints": cyl_hints,
+            "arrays_dir": arrays_dir,
             "created_at": datetime.datetime.now().isoformat()
-        }
+        })
         
         return {
             "session_id": session_id,
             "stats": stats,
             "planar_hints_count": len(planar_hints),
-            "cylindrical_hints_count": len(cyl_hints)
+            "cylindrical_hints_count": len(cyl_hints),
+            "cached": bool(cached),
+            "trace_id": tracing.current_trace_id()
         }
         
+    except ExecutorSaturated as e:
+        raise _busy_response(e)
     except Exception as e:
         logger.error(f"Error processing upload: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/generate/{session_id}")
-async def generate_step(session_id: str):
+async def _build_geometry(session_id, data, job_id, face_mode):
     """
-    Generate STEP file based on session data.
+    Stream the STEP file for a session, recording progress on the job.
+    The LLM is not involved; see _explain_in_background.
+    
+    Returns:
+        tuple: (step_path, num_faces)
     """
-    if session_id not in SESSIONS:
-        raise HTTPException(status_code=404, detail="Session not found")
+    file_hash = data.get("file_hash")
+    # The product name comes from an earlier strategy when one is cached
+    strategy_json = await asyncio.to_thread(RESULT_CACHE.get_strategy, file_hash) or {}
+    
+    # Build STEP, streaming entities straight into the run folder
+    run_id = session_id + storage.RUN_SUFFIX
+    step_path = storage.get_step_path(run_id, config.get_step_compression())
     
-    data = SESSIONS[session_id]
+    # Robust Geometry Generation: memory-map the arrays parsed at upload,
+    # falling back to re-reading the STL from the session's mesh path
+    mesh_path = data.get("mesh_path")
+    arrays_dir = data.get("arrays_dir")
+    if arrays_dir is None and not (mesh_path and os.path.exists(mesh_path)):
+        logger.error("Mesh path missing from session.")
+        mesh_path = None
     
+    JOBS.update(job_id, stage="build", progress={
+        "stage": "build", "done": 0, "total": 0, "message": "waiting for a worker"
+    })
     try:
-        # Build prompt
-        prompt = prompt_builder.build_structured_prompt(
-            data['stats'],
-            {
-                "planar": data['planar_hints'],
-                "cylindrical": data['cylindrical_hints']
-            }
+        result = await STAGES.run(
+            pipeline.build_step,
+            step_path,
+            strategy_json,
+            mesh_path,
+            arrays_dir,
+            config.get_step_intern_enabled(),
+            config.get_step_intern_max_entries(),
+            JOBS.progress_path(job_id),
+            face_mode,
+            config.get_step_emit_workers(),
+            config.get_step_compression_level()
         )
-        
+    except ExecutorSaturated:
+        raise
+    except Exception as build_err:
+        logger.error(f"Error in add_mesh_solid: {build_err}")
+        raise
+    logger.info(f"Wrote {result['step_bytes']} bytes ({result['num_faces']} faces) to {step_path}, "
+                f"{result['stored_bytes']} bytes stored")
+    logger.info(f"Entity interning: {result['intern_stats']}")
+    metrics.STEP_BYTES.observe(result["step_bytes"], format=face_mode)
+    metrics.STEP_STORED_BYTES.inc(result["stored_bytes"], compression=config.get_step_compression())
+    
+    return step_path, result["num_faces"]
+
+async def _explain_in_background(job_id, session_id, data, step_path, assumption):
+    """
+    Fetch the LLM strategy and write the explanation report for a run whose
+    STEP file is already downloadable, then attach it to the session, the
+    job result and the history record.
+    """
+    file_hash = data.get("file_hash")
+    try:
         # Call LLM (We still call it for 'Explanation' and feature hints, but NOT for geometry generation)
-        strategy_json = llm_client.call_llm(prompt)
+        with tracing.span("strategy") as attrs:
+            strategy_json = await asyncio.to_thread(RESULT_CACHE.get_strategy, file_hash)
+            attrs["cached"] = strategy_json is not None
+            if strategy_json is None:
+                # Build prompt
+                prompt = prompt_builder.build_structured_prompt(
+                    data['stats'],
+                    {
+                        "planar": data['planar_hints'],
+                        "cylindrical": data['cylindrical_hints']
+                    }
+                )
+                strategy_json, from_api = await llm_client.call_llm_async(prompt)
+                # A fallback is a placeholder: the next run asks the LLM again
+                if file_hash and from_api:
+                    await asyncio.to_thread(RESULT_CACHE.put_strategy, file_hash, strategy_json)
+                attrs["fallback"] = not from_api
         
+        strategy_json = dict(strategy_json)
+        strategy_json["entities"] = []
+        strategy_json["assumptions"] = list(strategy_json.get("assumptions", []))
+        if assumption:
+            strategy_json["assumptions"].append(assumption)
+        
+        with tracing.span("explanation"):
+            # Build Explanation
+            report = explain.build_explanation(
+                data['stats'],
+                {
+                    "planar_features": data['planar_hints'],
+                    "cylindrical_hints": data['cylindrical_hints']
+                },
+                strategy_json
+            )
+            
+            # Save the report next to the already streamed STEP file
+            storage.save_temp_artifacts(
+                os.path.basename(os.path.dirname(step_path)),
+                data['filename'],
+                None,
+                report
+            )
+    except Exception as e:
+        logger.error(f"Error building explanation for {session_id}: {e}")
+        await asyncio.to_thread(_attach_explanation, job_id, session_id, None, "failed")
+        return
+    
+    await asyncio.to_thread(
+        _attach_explanation, job_id, session_id, report, "ready", strategy_json.get("edge_count", 0)
+    )
+
+def _attach_explanation(job_id, session_id, report, status, edge_count=None):
+    SESSIONS.update(session_id, report=report, explanation_status=status)
+    job = JOBS.get(job_id)
+    if job and job["result"]:
+        JOBS.update(job_id, result=dict(job["result"], explanation=report, explanation_status=status))
+    fields = {"explanationStatus": status}
+    if edge_count is not None:
+        fields["edgeFeatures"] = edge_count
+    HISTORY.update(session_id, fields)
+
+@app.post("/api/generate/{session_id}", status_code=202)
+async def generate_step(session_id: str, format: Optional[str] = None):
+    """
+    Start generating the STEP file for a session as a background job.
+    Poll /api/jobs/{job_id} or follow /api/jobs/{job_id}/events for progress;
+    the finished job's "result" holds the download URL, and the explanation
+    once its "explanation_status" is "ready".
+    
+    The optional "format" query parameter picks the geometry: "faceted"
+    (FACETED_BREP), "merged" (ADVANCED_FACEs per coplanar region) or
+    "tessellated" (AP242 TESSELLATED_SHELL); STEP_FACE_MODE sets the default.
+    """
+    face_mode = (format or config.get_step_face_mode()).lower()
+    if face_mode not in pipeline.FACE_MODE_ASSUMPTIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown format: {face_mode}")
+    if session_id not in SESSIONS:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if STAGES.is_saturated():
+        raise _busy_response("no free worker slot for a new job")
+    # Held until the job (explanation included) is done, so the sweeper
+    # cannot delete the upload it reads
+    if not SESSIONS.acquire(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    
+    job = JOBS.create(session_id, trace_id=tracing.current_trace_id())
+    task = asyncio.create_task(_run_generation_job(job["id"], session_id, face_mode))
+    # Keep a reference so the task is not garbage collected mid-run
+    JOB_TASKS.add(task)
+    task.add_done_callback(JOB_TASKS.discard)
+    task.add_done_callback(lambda _: SESSIONS.release(session_id))
+    
+    return {
+        "job_id": job["id"],
+        "session_id": session_id,
+        "status": job["status"],
+        "status_url": f"/api/jobs/{job['id']}",
+        "events_url": f"/api/jobs/{job['id']}/events",
+        "trace_id": job["trace_id"]
+    }
+
+async def _run_generation_job(job_id, session_id, face_mode):
+    """
+    Background body of a generate job.
+    
+    The job completes as soon as the STEP file is written; the LLM strategy
+    and explanation follow in _explain_in_background and are reported
+    through result["explanation_status"] ("pending", "ready", "failed").
+    Identical uploads reuse the artifacts of an earlier run.
+    """
+    data = SESSIONS.get(session_id)
+    file_hash = data.get("file_hash")
+    variant = pipeline.generation_variant(
+        face_mode, config.get_step_intern_enabled(), config.get_step_compression()
+    )
+    JOBS.update(job_id, status="running")
+    
+    try:
         # Determine Status
         generation_source = "Hybrid (Mesh + AI Explanation)"
         
-        # Build STEP
-        builder = step_builder.StepBuilder()
-        
-        # Robust Geometry Generation: Load the original mesh
-        # We access the file path from session data
-        mesh_path = data.get("mesh_path")
-        
-        # FORCE MESH GEOMETRY ONLY - Remove AI hallucinations
-        strategy_json["entities"] = [] 
-        
-        if mesh_path and os.path.exists(mesh_path):
-             logger.info(f"Loading mesh for robust conversion: {mesh_path}")
-             mesh = stl_io.load_stl(mesh_path)
-             if mesh:
-                 logger.info(f"Mesh loaded. Vertices: {len(mesh.vertices)}, Faces: {len(mesh.faces)}")
-                 try:
-                     builder.add_mesh_solid(mesh.vertices.tolist(), mesh.faces.tolist())
-                     logger.info("Successfully added Faceted B-Rep to builder.")
-                     strategy_json["assumptions"].append("Geometry reconstructed using full-fidelity Faceted B-Rep (Mesh).")
-                 except Exception as build_err:
-                     logger.error(f"Error in add_mesh_solid: {build_err}")
-                     raise
-             else:
-                 logger.error("Failed to parse mesh for conversion.")
+        cached = await asyncio.to_thread(RESULT_CACHE.get_generation, file_hash, variant)
+        if cached:
+            logger.info(f"Reusing cached artifacts for {file_hash}: {cached['step_path']}")
+            step_path = cached["step_path"]
+            storage.touch_run(step_path)
+            report = cached["report"]
+            num_faces = cached.get("num_faces", 1)
         else:
-             logger.error("Mesh path missing from session.")
-
-        # Note: strategy_json['entities'] is now empty, so generate_step_from_strategy 
-        # will ONLY write the solid_breps (and boilerplate).
-        step_content = builder.generate_step_from_strategy(strategy_json)
-        
-        # Build Explanation
-        report = explain.build_explanation(
-            data['stats'],
-            {
-                "planar_features": data['planar_hints'],
-                "cylindrical_hints": data['cylindrical_hints']
-            },
-            strategy_json
-        )
-        
-        # Save artifacts
-        run_id = f"{session_id}_run"
-        saved_dir, step_path = storage.save_temp_artifacts(
-            run_id,
-            data['filename'],
-            step_content,
-            report
-        )
+            step_path, num_faces = await _build_geometry(session_id, data, job_id, face_mode)
+            report = None
+            if file_hash:
+                await asyncio.to_thread(RESULT_CACHE.put_generation, file_hash, variant, {
+                    "step_path": step_path,
+                    "explanation_path": os.path.join(os.path.dirname(step_path), "explanation.md"),
+                    "num_faces": num_faces,
+                    "source_session": session_id
+                })
+        explanation_status = "ready" if report is not None else "pending"
         
         # Update session with result paths
-        SESSIONS[session_id]['step_path'] = step_path
-        SESSIONS[session_id]['report'] = report
+        SESSIONS.update(session_id, step_path=step_path, report=report, explanation_status=explanation_status)
         
         # Save to History
         now = datetime.datetime.now()
+        strategy_json = await asyncio.to_thread(RESULT_CACHE.get_strategy, file_hash) or {}
         history_record = {
             "id": session_id,
             "fileName": data['filename'],
@@ -205,38 +565,179 @@ async def generate_step(session_id: str):
             "cylindricalFeatures": len(data['cylindrical_hints']),
             "edgeFeatures": strategy_json.get("edge_count", 0),
             "fileSize": f"{os.path.getsize(data['mesh_path']) / 1024 / 1024:.1f} MB",
+            "explanationStatus": explanation_status,
             "step_path": step_path
         }
-        save_history_record(history_record)
+        await asyncio.to_thread(
+            save_history_record,
+            history_record,
+            file_size_bytes=os.path.getsize(data['mesh_path']),
+            created_at=now.isoformat()
+        )
         
-        return {
+        JOBS.update(job_id, status="complete", stage=None, progress=None, result={
             "download_url": f"/api/download/{session_id}",
             "explanation": report,
-            "status": generation_source
-        }
+            "explanation_status": explanation_status,
+            "status": generation_source,
+            "format": face_mode,
+            "cached": bool(cached)
+        })
         
+    except ExecutorSaturated as e:
+        logger.warning(f"Job {job_id} rejected, workers saturated: {e}")
+        JOBS.update(job_id, status="failed", error="Server is busy with other conversions, retry shortly")
+        return
     except Exception as e:
         logger.error(f"Error generating STEP: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        JOBS.update(job_id, status="failed", error=str(e))
+        return
+    
+    if report is None:
+        assumption = pipeline.FACE_MODE_ASSUMPTIONS[face_mode] if num_faces > 0 else None
+        await _explain_in_background(job_id, session_id, data, step_path, assumption)
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Prometheus metrics of this API process (text exposition format)."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """
+    The timing spans recorded under a trace ID (the X-Trace-Id of a request,
+    also returned by upload and generate): one per pipeline stage, with the
+    stages run by a worker reported from inside that process.
+    """
+    trace = tracing.TRACES.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events stream of a job: a "progress" event whenever its state
+    changes, then one "complete" or "failed" event. After "complete" the
+    stream stays open for one "explanation" event once the explanation is
+    ready or has failed.
+    """
+    if JOBS.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def stream():
+        last_payload = None
+        sent_complete = False
+        idle = 0.0
+        while True:
+            job = JOBS.get(job_id)
+            if job is None:
+                return
+            payload = json.dumps(job)
+            if job["status"] == "complete":
+                explained = job["result"]["explanation_status"] != "pending"
+                event = "explanation" if sent_complete else "complete"
+                finished = explained
+            else:
+                event = "failed" if job["status"] == "failed" else "progress"
+                finished = job["status"] == "failed"
+            if payload != last_payload:
+                # A job cached with its explanation finishes in a single "complete"
+                yield f"event: {event}\ndata: {payload}\n\n"
+                sent_complete = sent_complete or event == "complete"
+                last_payload = payload
+                idle = 0.0
+            elif idle >= JOB_EVENT_KEEPALIVE:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                idle = 0.0
+            if finished:
+                return
+            await asyncio.sleep(JOB_EVENT_INTERVAL)
+            idle += JOB_EVENT_INTERVAL
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/download/{session_id}")
-async def download_result(session_id: str):
+async def download_result(session_id: str, request: Request, variant: Optional[str] = None):
+    """
+    Download the STEP file of a session.
+    
+    A compressed artifact (STEP_COMPRESSION) is sent as stored, with its
+    Content-Encoding, when Accept-Encoding allows it; otherwise it is
+    decompressed on the fly. ?variant=stpz sends a gzip artifact as a .stpz
+    file instead. Every response has an ETag (If-None-Match gives 304), and
+    all but the decompressed one honor Range / If-Range, so an interrupted
+    download can resume.
+    """
+    path = None
     # Try SESSIONS first
-    if session_id in SESSIONS and 'step_path' in SESSIONS[session_id]:
-        path = SESSIONS[session_id]['step_path']
-        filename = os.path.basename(path)
-        return FileResponse(path, filename=filename, media_type='application/step')
+    data = SESSIONS.get(session_id)
+    if data and 'step_path' in data:
+        path = data['step_path']
+    else:
+        # Try History
+        record = await asyncio.to_thread(HISTORY.get, session_id)
+        if record and 'step_path' in record and os.path.exists(record['step_path']):
+            path = record['step_path']
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    # Recently downloaded runs are the last the disk quota deletes
+    storage.touch_run(path)
+    
+    encoding = compression.encoding_of(path)
+    if variant not in (None, "stpz"):
+        raise HTTPException(status_code=400, detail=f"Unknown variant: {variant}")
+    if variant == "stpz" and encoding != "gzip":
+        raise HTTPException(status_code=404, detail="No .stpz variant stored for this file")
     
-    # Try History
-    history = load_history()
-    record = next((r for r in history if r['id'] == session_id), None)
-    if record and 'step_path' in record:
-        path = record['step_path']
-        if os.path.exists(path):
-             filename = os.path.basename(path)
-             return FileResponse(path, filename=filename, media_type='application/step')
-             
-    raise HTTPException(status_code=404, detail="File not found")
+    stat = os.stat(path)
+    base_tag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}"
+    filename = compression.decoded_name(path)
+    if variant == "stpz":
+        etag = f'"{base_tag}-stpz"'
+        filename = filename.rsplit(".", 1)[0] + ".stpz"
+        media_type, headers = "application/gzip", {}
+    elif encoding == "identity" or compression.accepts(request.headers.get("accept-encoding"), encoding):
+        etag = f'"{base_tag}-{encoding}"'
+        media_type, headers = "application/step", {"Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+    else:
+        etag = f'"{base_tag}-decoded"'
+        headers = {
+            "ETag": etag,
+            "Vary": "Accept-Encoding",
+            "Accept-Ranges": "none",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+        if _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers={"ETag": etag})
+        return StreamingResponse(compression.iter_decoded(path), media_type="application/step", headers=headers)
+    
+    headers["ETag"] = etag
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    # FileResponse serves Range requests (If-Range is checked against the ETag)
+    return FileResponse(path, filename=filename, media_type=media_type, headers=headers)
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as If-None-Match uses
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
 
 @app.get("/api/session/{session_id}")
 async def get_session_details(session_id: str):
@@ -244,9 +745,9 @@ async def get_session_details(session_id: str):
     Retrieve full details for a session (active or historical).
     """
     # 1. Try Active Session
-    if session_id in SESSIONS:
-        data = SESSIONS[session_id]
-        if 'report' in data: # Completed session
+    data = SESSIONS.get(session_id)
+    if data:
+        if 'step_path' in data: # Completed session (explanation may still be pending)
              return {
                  "status": "complete",
                  "analysis": {
@@ -256,13 +757,13 @@ async def get_session_details(session_id: str):
                  },
                  "generation": {
                      "download_url": f"/api/download/{session_id}",
-                     "explanation": data['report']
+                     "explanation": data['report'],
+                     "explanation_status": data.get('explanation_status', 'ready')
                  }
              }
 
     # 2. Try History (Disk)
-    history = load_history()
-    record = next((r for r in history if r['id'] == session_id), None)
+    record = await asyncio.to_thread(HISTORY.get, session_id)
     
     if record:
         # Reconstruct paths
@@ -293,7 +794,8 @@ async def get_session_details(session_id: str):
                 "analysis": analysis_summary,
                 "generation": {
                     "download_url": f"/api/download/{session_id}",
-                    "explanation": explanation_text
+                    "explanation": explanation_text,
+                    "explanation_status": record.get('explanationStatus', 'ready')
                 }
             }
             
@@ -0,0 +1,577 @@
+"""
+Upload sessions (analysis results and paths of one upload) and the
+backends that hold them.
+
+SessionStore applies the time-to-live, the size bound and the holds of
+running jobs; a backend stores the sessions. MemoryBackend keeps them in
+the process (a single API process); SQLiteBackend and KeyValueBackend share
+them between uvicorn workers or nodes, so an upload handled by one process
+can be generated by another. KeyValueBackend takes a Redis client, or
+LocalKeyValue, an in-process stand-in with the same commands. The job store
+(src/jobs.py) keeps its jobs in a second backend of the same kind.
+
+Session data must be JSON-serializable for the shared backends (stats,
+hint lists, paths). Access times are wall-clock seconds so that every
+process compares them alike.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+try:
+    import redis
+except ImportError:  # optional; only SESSION_BACKEND=redis needs it
+    redis = None
+
+class SessionStore:
+    """
+    Upload sessions with a time-to-live and a size bound, kept in a backend
+    (MemoryBackend by default).
+
+    A session expires ttl seconds after it was last read or written (see
+    expire, called by the server's sweeper). Creating a session beyond
+    max_sessions drops the least recently used ones. Sessions held by a
+    running job (acquire/release) are not dropped; their TTL restarts when
+    the job releases them. A hold left behind by a process that died lapses
+    once the session has been unused for another ttl.
+
+    on_remove(session_id, data, reason) is called for every dropped session,
+    with reason "ttl" or "max_count", so the caller can free its files. With
+    a shared backend it runs in the one process that dropped the session.
+    get returns a copy; changes go through update.
+    """
+
+    def __init__(self, ttl, max_sessions, on_remove=None, backend=None):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.on_remove = on_remove
+        self.backend = backend if backend is not None else MemoryBackend()
+
+    def create(self, session_id, data):
+        self.backend.put(session_id, dict(data), time.time())
+        self._notify(self.backend.pop_excess(self.max_sessions), "max_count")
+
+    def get(self, session_id):
+        """
+        Returns:
+            dict: A copy of the session's data, or None.
+        """
+        return self.backend.get(session_id, time.time())
+
+    def update(self, session_id, **fields):
+        """Merge fields into a session; does nothing if it is gone."""
+        self.backend.update(session_id, fields, time.time())
+
+    def __contains__(self, session_id):
+        return self.backend.contains(session_id)
+
+    def __len__(self):
+        return self.backend.count()
+
+    def ids(self):
+        return self.backend.ids()
+
+    def snapshot(self):
+        """Copies of all sessions, as {session_id: data}, without touching them."""
+        return self.backend.snapshot()
+
+    def acquire(self, session_id):
+        """
+        Keep a session from being dropped until release.
+
+        Returns:
+            bool: False if the session no longer exists.
+        """
+        return self.backend.acquire(session_id, time.time())
+
+    def release(self, session_id):
+        self.backend.release(session_id, time.time())
+
+    def expire(self):
+        """
+        Drop the sessions unused for more than ttl seconds.
+
+        Returns:
+            int: Number of sessions dropped.
+        """
+        now = time.time()
+        removed = self.backend.pop_expired(now - self.ttl, now - 2 * self.ttl)
+        self._notify(removed, "ttl")
+        return len(removed)
+
+    def _notify(self, removed, reason):
+        if self.on_remove is None:
+            return
+        for session_id, data in removed:
+            self.on_remove(session_id, data, reason)
+
+def open_backend(name, db_path=None, redis_url=None, kind="session"):
+    """
+    Build the session backend named by SESSION_BACKEND.
+
+    Args:
+        name (str): "memory", "sqlite" or "redis".
+        db_path (str, optional): SQLite database file of the "sqlite" backend.
+        redis_url (str, optional): Server of the "redis" backend.
+        kind (str): What the backend holds ("session" or "job"); names its
+            SQLite table and Redis keys, so both kinds can share a file or server.
+
+    Raises:
+        ValueError: On an unknown name, or "redis" without the redis package.
+    """
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(db_path, table=kind + "s")
+    if name == "redis":
+        if redis is None:
+            raise ValueError("SESSION_BACKEND=redis needs the redis package")
+        return KeyValueBackend(redis.Redis.from_url(redis_url, decode_responses=True), name=kind)
+    raise ValueError(f"Unknown session backend: {name}")
+
+# Backends. Each method is atomic on its own; now and the cutoffs are
+# time.time() values. pop_expired and pop_excess return the dropped
+# (session_id, data) pairs, each to only one caller.
+
+class MemoryBackend:
+    """Sessions in a dict of this process, least recently used first."""
+
+    def __init__(self):
+        # session_id -> [data, last access]
+        self.entries = OrderedDict()
+        self.holds = {}
+        self.lock = threading.Lock()
+
+    def put(self, session_id, data, now):
+        with self.lock:
+            self.entries[session_id] = [data, now]
+            self.entries.move_to_end(session_id)
+
+    def get(self, session_id, now):
+        with self.lock:
+            entry = self._touch(session_id, now)
+            return None if entry is None else dict(entry[0])
+
+    def update(self, session_id, fields, now):
+        with self.lock:
+            entry = self._touch(session_id, now)
+            if entry is not None:
+                entry[0].update(fields)
+
+    def contains(self, session_id):
+        with self.lock:
+            return session_id in self.entries
+
+    def count(self):
+        with self.lock:
+            return len(self.entries)
+
+    def ids(self):
+        with self.lock:
+            return list(self.entries)
+
+    def snapshot(self):
+        with self.lock:
+            return {sid: dict(entry[0]) for sid, entry in self.entries.items()}
+
+    def acquire(self, session_id, now):
+        with self.lock:
+            if self._touch(session_id, now) is None:
+                return False
+            self.holds[session_id] = self.holds.get(session_id, 0) + 1
+            return True
+
+    def release(self, session_id, now):
+        with self.lock:
+            count = self.holds.get(session_id, 0) - 1
+            if count > 0:
+                self.holds[session_id] = count
+            else:
+                self.holds.pop(session_id, None)
+            self._touch(session_id, now)
+
+    def pop_expired(self, cutoff, held_cutoff):
+        with self.lock:
+            removed = []
+            # Entries are in access order, so the expired ones come first
+            for session_id, (data, last_access) in list(self.entries.items()):
+                if last_access > cutoff:
+                    break
+                if session_id not in self.holds or last_access <= held_cutoff:
+                    del self.entries[session_id]
+                    self.holds.pop(session_id, None)
+                    removed.append((session_id, data))
+            return removed
+
+    def pop_excess(self, max_sessions):
+        with self.lock:
+            removed = []
+            excess = len(self.entries) - max_sessions
+            for session_id in list(self.entries):
+                if excess <= 0:
+                    break
+                if session_id not in self.holds:
+                    removed.append((session_id, self.entries.pop(session_id)[0]))
+                    excess -= 1
+            return removed
+
+    def _touch(self, session_id, now):
+        entry = self.entries.get(session_id)
+        if entry is not None:
+            entry[1] = now
+            self.entries.move_to_end(session_id)
+        return entry
+
+class SQLiteBackend:
+    """
+    Sessions in a SQLite table, shared by every process on the host that
+    opens the same file (uvicorn --workers N). Each row keeps the session
+    as JSON with its last access time and hold count.
+    """
+
+    def __init__(self, db_path, table="sessions"):
+        self.db_path = db_path
+        self.table = table
+        self.lock = threading.Lock()
+        self.ready = False
+
+    def put(self, session_id, data, now):
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (id, data, last_access, holds) VALUES (?, ?, ?, 0)",
+                (session_id, json.dumps(data), now)
+            )
+
+    def get(self, session_id, now):
+        with self._connect() as conn:
+            conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE id = ?", (now, session_id))
+            row = conn.execute(f"SELECT data FROM {self.table} WHERE id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, session_id, fields, now):
+        with self._connect() as conn:
+            # Take the write lock before reading so concurrent updates serialize
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(f"SELECT data FROM {self.table} WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return
+            data = json.loads(row[0])
+            data.update(fields)
+            conn.execute(
+                f"UPDATE {self.table} SET data = ?, last_access = ? WHERE id = ?",
+                (json.dumps(data), now, session_id)
+            )
+
+    def contains(self, session_id):
+        with self._connect() as conn:
+            return conn.execute(f"SELECT 1 FROM {self.table} WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def ids(self):
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute(f"SELECT id FROM {self.table} ORDER BY last_access")]
+
+    def snapshot(self):
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT id, data FROM {self.table} ORDER BY last_access").fetchall()
+        return {sid: json.loads(data) for sid, data in rows}
+
+    def acquire(self, session_id, now):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE {self.table} SET holds = holds + 1, last_access = ? WHERE id = ?", (now, session_id)
+            )
+            return cursor.rowcount > 0
+
+    def release(self, session_id, now):
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE {self.table} SET holds = MAX(holds - 1, 0), last_access = ? WHERE id = ?",
+                (now, session_id)
+            )
+
+    def pop_expired(self, cutoff, held_cutoff):
+        return self._pop(
+            f"SELECT id, data FROM {self.table} WHERE last_access <= ? AND (holds = 0 OR last_access <= ?)",
+            (cutoff, held_cutoff)
+        )
+
+    def pop_excess(self, max_sessions):
+        return self._pop(
+            f"SELECT id, data FROM {self.table} WHERE holds = 0 ORDER BY last_access "
+            f"LIMIT MAX((SELECT COUNT(*) FROM {self.table}) - ?, 0)",
+            (max_sessions,)
+        )
+
+    def _pop(self, select, params):
+        with self._connect() as conn:
+            # Select and delete in one write transaction: no other process
+            # can drop (and report) the same sessions
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(select, params).fetchall()
+            conn.executemany(f"DELETE FROM {self.table} WHERE id = ?", [(sid,) for sid, _ in rows])
+        return [(sid, json.loads(data)) for sid, data in rows]
+
+    def _connect(self):
+        # A short-lived connection per call, as in HistoryStore, keeps the
+        # store usable from any thread or process
+        self._ensure_ready()
+        return _Transaction(self.db_path)
+
+    def _ensure_ready(self):
+        if self.ready:
+            return
+        with self.lock:
+            if self.ready:
+                return
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            with _Transaction(self.db_path) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        id TEXT PRIMARY KEY,
+                        data TEXT NOT NULL,
+                        last_access REAL NOT NULL,
+                        holds INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_access ON {self.table} (last_access)")
+            self.ready = True
+
+class _Transaction:
+    """sqlite3 connection context that commits (or rolls back) and closes."""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, timeout=30)
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        with closing(self.conn):
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+
+class KeyValueBackend:
+    """
+    Sessions in a Redis-like key-value server, shared by every process and
+    node that connects to it.
+
+    Uses only the client commands hset/hgetall/hget/hincrby/hdel/delete and
+    zadd (with xx and ch)/zscore/zrem/zcard/zrange/zrangebyscore, with str
+    replies (redis-py with decode_responses=True, or LocalKeyValue). Each
+    session is a hash of JSON-encoded fields, so update writes its fields
+    without a read; a sorted set orders the sessions by last access and a
+    hash counts holds. zrem decides which process drops a session. name
+    ("session" by default) prefixes the keys of each kind of entry.
+    """
+
+    def __init__(self, client, prefix="stl2step:", name="session"):
+        self.client = client
+        self.prefix = prefix
+        self.name = name
+        self.index_key = f"{prefix}{name}s"
+        self.holds_key = f"{prefix}{name}_holds"
+
+    def put(self, session_id, data, now):
+        key = self._key(session_id)
+        self.client.delete(key)
+        if data:
+            self.client.hset(key, mapping={k: json.dumps(v) for k, v in data.items()})
+        self.client.zadd(self.index_key, {session_id: now})
+
+    def get(self, session_id, now):
+        if not self._touch(session_id, now):
+            return None
+        return self._read(session_id)
+
+    def update(self, session_id, fields, now):
+        if fields and self._touch(session_id, now):
+            self.client.hset(self._key(session_id), mapping={k: json.dumps(v) for k, v in fields.items()})
+
+    def contains(self, session_id):
+        return self.client.zscore(self.index_key, session_id) is not None
+
+    def count(self):
+        return self.client.zcard(self.index_key)
+
+    def ids(self):
+        return list(self.client.zrange(self.index_key, 0, -1))
+
+    def snapshot(self):
+        sessions = {}
+        for session_id in self.ids():
+            data = self._read(session_id)
+            if data is not None:
+                sessions[session_id] = data
+        return sessions
+
+    def acquire(self, session_id, now):
+        if not self._touch(session_id, now):
+            return False
+        self.client.hincrby(self.holds_key, session_id, 1)
+        return True
+
+    def release(self, session_id, now):
+        if self.client.hincrby(self.holds_key, session_id, -1) <= 0:
+            self.client.hdel(self.holds_key, session_id)
+        self._touch(session_id, now)
+
+    def pop_expired(self, cutoff, held_cutoff):
+        removed = []
+        for session_id, last_access in self.client.zrangebyscore(self.index_key, "-inf", cutoff, withscores=True):
+            if last_access > held_cutoff and self._held(session_id):
+                continue
+            entry = self._pop(session_id)
+            if entry is not None:
+                removed.append(entry)
+        return removed
+
+    def pop_excess(self, max_sessions):
+        removed = []
+        excess = self.client.zcard(self.index_key) - max_sessions
+        if excess <= 0:
+            return removed
+        for session_id in self.ids():
+            if len(removed) >= excess:
+                break
+            if not self._held(session_id):
+                entry = self._pop(session_id)
+                if entry is not None:
+                    removed.append(entry)
+        return removed
+
+    def _key(self, session_id):
+        return f"{self.prefix}{self.name}:{session_id}"
+
+    def _touch(self, session_id, now):
+        # xx: a session dropped by another process is not added back. With ch
+        # the reply counts changed scores, so 0 may also mean an unchanged one
+        if self.client.zadd(self.index_key, {session_id: now}, xx=True, ch=True):
+            return True
+        return self.client.zscore(self.index_key, session_id) is not None
+
+    def _held(self, session_id):
+        return int(self.client.hget(self.holds_key, session_id) or 0) > 0
+
+    def _read(self, session_id):
+        fields = self.client.hgetall(self._key(session_id))
+        if not fields:
+            return None
+        return {k: json.loads(v) for k, v in fields.items()}
+
+    def _pop(self, session_id):
+        # Only the process whose zrem removed the entry reports the session
+        if not self.client.zrem(self.index_key, session_id):
+            return None
+        data = self._read(session_id) or {}
+        self.client.delete(self._key(session_id))
+        self.client.hdel(self.holds_key, session_id)
+        return session_id, data
+
+class LocalKeyValue:
+    """
+    In-process stand-in for a Redis client: the commands KeyValueBackend
+    uses, with redis-py's signatures and decoded (str) replies. For
+    development and checks without a Redis server; nothing is shared
+    between processes.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.zsets = {}
+        self.lock = threading.Lock()
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(1 for name in names
+                       if self.hashes.pop(name, None) is not None or self.zsets.pop(name, None) is not None)
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+        with self.lock:
+            fields = self.hashes.setdefault(name, {})
+            added = sum(1 for k in items if k not in fields)
+            fields.update({k: str(v) for k, v in items.items()})
+            return added
+
+    def hget(self, name, key):
+        with self.lock:
+            return self.hashes.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        with self.lock:
+            return dict(self.hashes.get(name, {}))
+
+    def hincrby(self, name, key, amount=1):
+        with self.lock:
+            fields = self.hashes.setdefault(name, {})
+            value = int(fields.get(key, 0)) + amount
+            fields[key] = str(value)
+            return value
+
+    def hdel(self, name, *keys):
+        with self.lock:
+            fields = self.hashes.get(name, {})
+            removed = sum(1 for k in keys if fields.pop(k, None) is not None)
+            if not fields:
+                self.hashes.pop(name, None)
+            return removed
+
+    def zadd(self, name, mapping, xx=False, ch=False):
+        with self.lock:
+            zset = self.zsets.get(name, {})
+            added = changed = 0
+            for member, score in mapping.items():
+                if member not in zset:
+                    if xx:
+                        continue
+                    added += 1
+                elif zset[member] != float(score):
+                    changed += 1
+                zset[member] = float(score)
+            if zset:
+                self.zsets[name] = zset
+            # Like Redis: new members, or with ch also the updated ones
+            return added + changed if ch else added
+
+    def zscore(self, name, member):
+        with self.lock:
+            return self.zsets.get(name, {}).get(member)
+
+    def zrem(self, name, *members):
+        with self.lock:
+            zset = self.zsets.get(name, {})
+            removed = sum(1 for m in members if zset.pop(m, None) is not None)
+            if not zset:
+                self.zsets.pop(name, None)
+            return removed
+
+    def zcard(self, name):
+        with self.lock:
+            return len(self.zsets.get(name, {}))
+
+    def zrange(self, name, start, end):
+        members = [member for member, _ in self._sorted(name)]
+        # Inclusive end, negative indexes from the back, as in Redis
+        return members[start:end + 1 or None]
+
+    def zrangebyscore(self, name, min, max, withscores=False):
+        low, high = float(min), float(max)
+        items = [(member, score) for member, score in self._sorted(name) if low <= score <= high]
+        return items if withscores else [member for member, _ in items]
+
+    def _sorted(self, name):
+        with self.lock:
+            return sorted(self.zsets.get(name, {}).items(), key=lambda item: (item[1], item[0]))
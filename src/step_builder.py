@@ -1,23 +1,458 @@
+import io
+import os
 import datetime
-import uuid
+import shutil
+import tempfile
+import logging
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src.mesh_regions import build_regions
+
+logger = logging.getLogger(__name__)
+
+# Batched FACETED_BREP emission (see StepBuilder.add_mesh_solid).
+# Entity text is assembled as NUL-padded uint8 matrices (one row per entity
+# block) and compacted into a single string per chunk, so no Python object is
+# created per face.
+MESH_FACE_ENTITIES = 8  # POLY_LOOP .. FACE_SURFACE per mesh face
+MESH_CHUNK_FACES = 65536  # faces formatted per batch, bounds temporary memory
+# Parallel emission (emit_workers > 1): chunks are formatted in worker processes
+PARALLEL_MIN_FACES = 200000   # smaller meshes are not worth starting the pool
+PARALLEL_MIN_CHUNK_FACES = 4096
+
+# Merged-region ADVANCED_FACE emission (see StepBuilder.add_region_solid)
+REGION_VERTEX_ENTITIES = 2    # CARTESIAN_POINT, VERTEX_POINT
+REGION_EDGE_ENTITIES = 4      # DIRECTION, VECTOR, LINE, EDGE_CURVE
+REGION_TRIANGLE_ENTITIES = 9  # 3 ORIENTED_EDGE .. ADVANCED_FACE per leftover triangle
+
+# Entity interning (see StepBuilder.add). Only pure geometry is shared between
+# references; topological entities (vertices, edges, loops, faces) are always
+# created fresh.
+INTERNED_ENTITIES = (
+    "CARTESIAN_POINT(", "DIRECTION(", "VECTOR(", "AXIS2_PLACEMENT_3D(", "PLANE(", "LINE(",
+)
+DEFAULT_INTERN_MAX_ENTRIES = 500000
+
+# AP242 tessellated emission (see StepBuilder.add_tessellated_solid)
+TESSELLATED_CHUNK_ROWS = 262144  # points / triangles formatted per batch
+
+# Header and application context of each supported schema
+STEP_SCHEMAS = {
+    "AP214": {
+        "description": "STEP AP214",
+        "schema": "AUTOMOTIVE_DESIGN",
+        "context": "core data for automotive mechanical design processes",
+    },
+    "AP242": {
+        "description": "STEP AP242",
+        "schema": "AP242_MANAGED_MODEL_BASED_3D_ENGINEERING_MIM_LF { 1 0 10303 442 1 1 4 }",
+        "context": "managed model based 3d engineering",
+    },
+}
+
+XREF_X = "1.0000,0.0000,0.0000"
+XREF_Z = "0.0000,0.0000,1.0000"
+
+_DIGITS4 = np.array([list(b"%04d" % i) for i in range(10000)], dtype=np.uint8)
+_POW10 = 10 ** np.arange(1, 19, dtype=np.int64)
+
+
+def _digit_text(values):
+    """Non-negative integers -> right-aligned decimal text matrix."""
+    top = int(values.max()) if len(values) else 0
+    n_groups = max(1, (len(str(top)) + 3) // 4)
+    width = 4 * n_groups
+    text = np.empty((len(values), width), dtype=np.uint8)
+    rest = values
+    for g in range(n_groups):
+        rest, group = np.divmod(rest, 10000)
+        text[:, width - 4 * (g + 1):width - 4 * g] = _DIGITS4[group]
+    # Blank the leading zeros, keeping at least one digit
+    n_digits = 1 + np.searchsorted(_POW10, values, side="right")
+    text[np.arange(width, 0, -1) > n_digits[:, None]] = 0
+    return text
+
+
+def _int_text(values):
+    return _digit_text(np.asarray(values, dtype=np.int64))
+
+
+def _float_text(values):
+    """
+    Floats -> text matrix, each value formatted like '%.4f'.
+    Values whose rounding cannot be decided exactly from x * 1e4 (near ties,
+    non-finite or huge values) are formatted by Python instead.
+    """
+    flat = np.asarray(values, dtype=np.float64).ravel()
+    scaled = flat * 10000.0
+    finite = np.isfinite(scaled) & (np.abs(scaled) < 2.0 ** 52)
+    scaled = np.where(finite, scaled, 0.0)
+    exact = finite & (np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) > np.abs(scaled) * 1e-15)
+
+    int_part, frac_part = np.divmod(np.abs(np.rint(scaled)).astype(np.int64), 10000)
+    sign = np.where(np.signbit(flat), ord("-"), 0).astype(np.uint8)[:, None]
+    text = np.hstack([sign, _digit_text(int_part), _literal(".", len(flat)), _DIGITS4[frac_part]])
+
+    for i in np.flatnonzero(~exact).tolist():
+        fixed = np.frombuffer(("%.4f" % flat[i]).encode(), dtype=np.uint8)
+        if len(fixed) > text.shape[1]:
+            text = np.pad(text, ((0, 0), (0, len(fixed) - text.shape[1])))
+        text[i] = 0
+        text[i, :len(fixed)] = fixed
+    return text
+
+
+def _triple_text(values):
+    """(N, 3) floats -> 'x,y,z' text matrix, each value formatted like '%.4f'."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    text = _float_text(values).reshape(n, 3, -1)
+    return _concat_text([text[:, 0], ",", text[:, 1], ",", text[:, 2]], n)
+
+
+def _literal(s, n):
+    return np.broadcast_to(np.frombuffer(s.encode(), dtype=np.uint8), (n, len(s)))
+
+
+def _concat_text(parts, n):
+    """Join literal strings and text matrices column-wise into one matrix."""
+    widths = [len(p) if isinstance(p, str) else p.shape[1] for p in parts]
+    row = np.zeros(sum(widths), dtype=np.uint8)
+    offsets = np.concatenate([[0], np.cumsum(widths)]).tolist()
+    for part, lo, hi in zip(parts, offsets, offsets[1:]):
+        if isinstance(part, str):
+            row[lo:hi] = np.frombuffer(part.encode(), dtype=np.uint8)
+    text = np.empty((n, len(row)), dtype=np.uint8)
+    text[:] = row
+    for part, lo, hi in zip(parts, offsets, offsets[1:]):
+        if not isinstance(part, str):
+            text[:, lo:hi] = part
+    return text
+
+
+def _compact_text(text):
+    """Drop the NUL padding and decode the matrix rows as one string."""
+    return text[text != 0].tobytes().decode("ascii")
+
+
+def _text_block(parts, n):
+    """Concatenate parts column-wise and return the rows as newline-separated text."""
+    return _compact_text(_concat_text([*parts, "\n"], n))[:-1]
+
+
+def _text_lines(parts, n):
+    """Like _text_block, but returns one string per row."""
+    return _text_block(parts, n).split("\n") if n else []
+
+
+def _ref_list_text(ids):
+    """Entity IDs -> '#a,#b,...'"""
+    return _compact_text(_concat_text(["#", _int_text(ids), ","], len(ids)))[:-1]
+
+
+def _list_lines(ids, head, refs, starts, tail):
+    """
+    One '#id=head#a,#b,...tail;' line per group of refs, the groups given as
+    CSR offsets (none empty). tail is a list of parts like _concat_text
+    takes, with one row per group.
+    """
+    n = len(refs)
+    group = np.repeat(np.arange(len(ids)), np.diff(starts))
+    first = np.zeros(n, dtype=bool)
+    first[starts[:-1]] = True
+    last = np.zeros(n, dtype=bool)
+    last[starts[1:] - 1] = True
+    # Every row carries its group's head and tail; NUL them out except at the ends
+    prefix = _concat_text(["#", _int_text(ids)[group], "=" + head], n)
+    prefix[~first] = 0
+    suffix = _concat_text([p if isinstance(p, str) else p[group] for p in [*tail, ";\n"]], n)
+    suffix[~last] = 0
+    comma = np.where(first, 0, ord(",")).astype(np.uint8)[:, None]
+    return _compact_text(_concat_text([prefix, comma, "#", refs, suffix], n))[:-1]
+
+
+def _tuple_list_text(text):
+    """Text matrix rows -> '(row),(row),...'"""
+    return _compact_text(_concat_text(["(", text, "),"], len(text)))[:-1]
+
+
+def _face_normals(vertices, faces):
+    """
+    Unit normals from the first three corners of each face, using the same
+    operation order as the scalar code so results are bit-identical.
+    Degenerate faces get (0, 0, 1).
+    """
+    p0 = vertices[faces[:, 0]]
+    v1 = vertices[faces[:, 1]] - p0
+    v2 = vertices[faces[:, 2]] - p0
+
+    nx = v1[:, 1] * v2[:, 2] - v1[:, 2] * v2[:, 1]
+    ny = v1[:, 2] * v2[:, 0] - v1[:, 0] * v2[:, 2]
+    nz = v1[:, 0] * v2[:, 1] - v1[:, 1] * v2[:, 0]
+    mag = np.sqrt(nx * nx + ny * ny + nz * nz)
+
+    degenerate = mag < 1e-9
+    safe_mag = np.where(degenerate, 1.0, mag)
+    n = np.column_stack([nx / safe_mag, ny / safe_mag, nz / safe_mag])
+    n[degenerate] = (0.0, 0.0, 1.0)
+    return n
+
+
+def _face_block_text(faces, normals, v_refs, v_coords, id_base):
+    """
+    Format the 8-entity blocks for a chunk of faces as one string.
+    v_refs / v_coords are the text matrices of each vertex's entity ID and
+    coordinates; the plane origin p0 reuses the first corner's coordinates.
+    """
+    n_faces, n_corners = faces.shape
+    ids = _int_text(np.arange(id_base, id_base + MESH_FACE_ENTITIES * n_faces))
+    ids = ids.reshape(n_faces, MESH_FACE_ENTITIES, -1)
+    loop, bound, pt, dir_n, dir_x, ax2, plane, face = (ids[:, k] for k in range(MESH_FACE_ENTITIES))
+
+    corners = []
+    for k in range(n_corners):
+        corners += [",#" if k else "#", v_refs[faces[:, k]]]
+
+    # Arbitrary X-axis: (1,0,0) for near-Z normals, else (0,0,1)
+    xref = np.zeros_like(normals)
+    near_z = np.abs(normals[:, 2]) > 0.9
+    xref[near_z, 0] = 1.0
+    xref[~near_z, 2] = 1.0
+
+    return _text_block([
+        "#", loop, "=POLY_LOOP('',(", *corners, "));\n",
+        "#", bound, "=FACE_OUTER_BOUND('',#", loop, ",.T.);\n",
+        "#", pt, "=CARTESIAN_POINT('',(", v_coords[faces[:, 0]], "));\n",
+        "#", dir_n, "=DIRECTION('',(", _triple_text(normals), "));\n",
+        "#", dir_x, "=DIRECTION('',(", _triple_text(xref), "));\n",
+        "#", ax2, "=AXIS2_PLACEMENT_3D('',#", pt, ",#", dir_n, ",#", dir_x, ");\n",
+        "#", plane, "=PLANE('',#", ax2, ");\n",
+        "#", face, "=FACE_SURFACE('',(#", bound, "),#", plane, ",.T.);",
+    ], n_faces)
+
+
+# Arrays a parallel emission worker memory-maps (see _init_emit_worker)
+_EMIT_ARRAYS = {}
+
+
+def _init_emit_worker(paths):
+    for name, path in paths.items():
+        _EMIT_ARRAYS[name] = np.load(path, mmap_mode="r")
+
+
+def _emit_chunk_job(kind, lo, hi, v_base, id_base, out_path):
+    """
+    Worker job: format points [lo, hi) or the face blocks of faces [lo, hi)
+    and write them, newline-terminated, to out_path. A face chunk is
+    formatted from just the vertices it uses, so it needs no point text.
+    Returns out_path.
+    """
+    vertices = _EMIT_ARRAYS["vertices"]
+    if kind == "points":
+        chunk = np.asarray(vertices[lo:hi], dtype=np.float64)
+        text = _text_block(["#", _int_text(np.arange(id_base, id_base + len(chunk))), "=CARTESIAN_POINT('',(",
+                            _triple_text(chunk), "));"], len(chunk))
+    else:
+        faces = np.asarray(_EMIT_ARRAYS["faces"][lo:hi], dtype=np.int64)
+        used, local = np.unique(faces, return_inverse=True)
+        local = local.reshape(faces.shape)
+        chunk_vertices = np.asarray(vertices[used], dtype=np.float64)
+        if "normals" in _EMIT_ARRAYS:
+            normals = np.array(_EMIT_ARRAYS["normals"][lo:hi], dtype=np.float64)
+            normals[~normals.any(axis=1)] = (0.0, 0.0, 1.0)
+        else:
+            normals = _face_normals(chunk_vertices, local)
+        text = _face_block_text(local, normals, _int_text(v_base + used), _triple_text(chunk_vertices), id_base)
+    with open(out_path, "wb") as f:
+        f.write((text + "\n").encode("ascii"))
+    return out_path
+
+
+def _shared_array_path(arr, dtype, spill_dir, name):
+    """
+    Path of a .npy file holding arr, for workers to memory-map: the file arr
+    was loaded from when it is a whole memory-mapped .npy (as a saved
+    MeshIndex is), otherwise a copy saved in spill_dir.
+    """
+    filename = getattr(arr, "filename", None)
+    if isinstance(arr, np.memmap) and filename and str(filename).endswith(".npy") and arr.dtype == dtype:
+        try:
+            on_disk = np.load(filename, mmap_mode="r")
+        except (OSError, ValueError):
+            on_disk = None
+        # A view of part of the file has another shape, offset or layout
+        if (on_disk is not None and on_disk.shape == arr.shape and on_disk.offset == arr.offset
+                and arr.flags.c_contiguous):
+            return str(filename)
+    path = os.path.join(spill_dir, f"{name}.npy")
+    np.save(path, np.asarray(arr, dtype=dtype))
+    return path
+
+
+def _ordered_results(pool, jobs, window):
+    """Submit (fn, args, tag) jobs, at most window ahead, yielding (result, tag) in job order."""
+    pending = deque()
+    for fn, args, tag in jobs:
+        pending.append((pool.submit(fn, *args), tag))
+        if len(pending) >= window:
+            future, tag = pending.popleft()
+            yield future.result(), tag
+    while pending:
+        future, tag = pending.popleft()
+        yield future.result(), tag
+
 
 class StepBuilder:
-    def __init__(self):
+    def __init__(self, stream=None, intern=False, intern_max_entries=DEFAULT_INTERN_MAX_ENTRIES,
+                 progress=None, schema="AP214", emit_workers=0):
+        """
+        Args:
+            stream (binary file-like, optional): If given, the header and every
+                entity are written to it as soon as they are created instead of
+                being kept in self.entities, and generate_step_from_strategy
+                writes the footer and returns the number of bytes written.
+            intern (bool): Reuse the existing #id when an identical geometric
+                entity (see INTERNED_ENTITIES) is added again.
+            intern_max_entries (int): Size bound of the interning table; the
+                least recently used definitions are evicted first.
+            progress (callable, optional): Called as progress(stage, done, total)
+                while add_mesh_solid emits entities, with stage "points" once
+                the vertices are written and "faces" after every chunk of faces.
+            schema (str): Key of STEP_SCHEMAS written to the header; tessellated
+                geometry (add_tessellated_solid) needs "AP242".
+            emit_workers (int): Processes add_mesh_solid formats face chunks
+                in (0 or 1: in this process). Only used with interning
+                disabled, where every entity ID is known up front.
+        """
+        if schema not in STEP_SCHEMAS:
+            raise ValueError(f"Unknown STEP schema: {schema}")
+        self.schema = schema
         self.entities = []
         self.next_id = 1
-        
+        self.stream = stream
+        self.bytes_written = 0
+        self.intern_table = OrderedDict() if intern else None
+        self.intern_max_entries = intern_max_entries
+        self.intern_hits = 0
+        self.intern_misses = 0
+        self.intern_evictions = 0
+        # References to existing entities that skip the table (plane origins, x-references)
+        self.reused_refs = 0
+        self.progress = progress
+        self.emit_workers = emit_workers
+        if stream is not None:
+            self._write(self.build_header() + "\n")
+
+    def _write(self, text):
+        data = text.encode("utf-8")
+        self.stream.write(data)
+        self.bytes_written += len(data)
+
+    def _emit(self, text):
+        """Store or stream one or more complete entity lines."""
+        if self.stream is not None:
+            self._write(text + "\n")
+        else:
+            self.entities.append(text)
+
     def add(self, string_def):
         """Adds a raw entity string and returns its (id, ref_string)."""
+        interned = self.intern_table is not None and string_def.startswith(INTERNED_ENTITIES)
+        if interned:
+            eid = self._intern_lookup(string_def)
+            if eid is not None:
+                return eid, f"#{eid}"
+
+        eid = self.next_id
+        self.next_id += 1
+        ref = f"#{eid}"
+        self._emit(f"{ref}={string_def};")
+        if interned:
+            self._intern_store(string_def, eid)
+        return eid, ref
+
+    def _intern_lookup(self, string_def):
+        eid = self.intern_table.get(string_def)
+        if eid is None:
+            self.intern_misses += 1
+        else:
+            self.intern_hits += 1
+            self.intern_table.move_to_end(string_def)
+        return eid
+
+    def _intern_store(self, string_def, eid):
+        self.intern_table[string_def] = eid
+        if len(self.intern_table) > self.intern_max_entries:
+            self.intern_table.popitem(last=False)
+            self.intern_evictions += 1
+
+    def _intern_many(self, defs):
+        """
+        Bulk add() for a list of interned definitions.
+        Returns their entity IDs as an int64 array; new entities are emitted
+        as one block.
+        """
+        table = self.intern_table
+        ids = []
+        new_lines = []
+        hits = 0
+        for string_def in defs:
+            eid = table.get(string_def)
+            if eid is None:
+                eid = self.next_id
+                self.next_id += 1
+                new_lines.append(f"#{eid}={string_def};")
+                self._intern_store(string_def, eid)
+            else:
+                hits += 1
+                table.move_to_end(string_def)
+            ids.append(eid)
+        self.intern_hits += hits
+        self.intern_misses += len(new_lines)
+        if new_lines:
+            self._emit("\n".join(new_lines))
+        return np.array(ids, dtype=np.int64)
+
+    def intern_stats(self):
+        """Hit-rate statistics of the entity interning table, plus the structural reuse."""
+        lookups = self.intern_hits + self.intern_misses
+        return {
+            "enabled": self.intern_table is not None,
+            "hits": self.intern_hits,
+            "misses": self.intern_misses,
+            "evictions": self.intern_evictions,
+            "entries": len(self.intern_table) if self.intern_table is not None else 0,
+            "hit_rate": self.intern_hits / lookups if lookups else 0.0,
+            "reused_refs": self.reused_refs,
+        }
+
+    def add_list(self, head, chunks, tail=""):
+        """
+        Adds an entity whose definition ends in a (possibly huge) reference list,
+        e.g. CLOSED_SHELL('',(#1,#2,...)). `chunks` are comma-joined fragments of
+        the list; in streaming mode they are written one at a time.
+        """
         eid = self.next_id
         self.next_id += 1
         ref = f"#{eid}"
-        self.entities.append(f"{ref}={string_def};")
+        if self.stream is not None:
+            self._write(f"{ref}={head}(")
+            for i, chunk in enumerate(chunks):
+                self._write("," + chunk if i else chunk)
+            self._write(f"){tail};\n")
+        else:
+            self.entities.append(f"{ref}={head}({','.join(chunks)}){tail};")
         return eid, ref
 
     def generate_step_from_strategy(self, strategy_json):
         """
-        Generates a valid AP214 STEP file with a Product -> Shape Representation -> Geometric Set hierarchy.
+        Generates a valid STEP file (in the builder's schema) with a Product -> Shape Representation -> Geometric Set hierarchy.
         This ensures the file is not "empty" in viewers.
+        Tessellated shells get a TESSELLATED_SHAPE_REPRESENTATION of their own.
         """
         # Reset only if empty?
         # Actually, we want to SUPPORT appending to existing entities (from add_mesh_solid)
@@ -25,7 +460,7 @@ class StepBuilder:
         pass
         
         # 1. Product & Context Definitions (Boilerplate)
-        _, app_context = self.add("APPLICATION_CONTEXT('core data for automotive mechanical design processes')")
+        _, app_context = self.add(f"APPLICATION_CONTEXT('{STEP_SCHEMAS[self.schema]['context']}')")
         _, p_context = self.add(f"PRODUCT_CONTEXT('',{app_context},'mechanical')")
         _, p_def_context = self.add(f"PRODUCT_DEFINITION_CONTEXT('part definition',{app_context},'design')")
         
@@ -60,7 +495,7 @@ class StepBuilder:
         # Generate items from strategy
         entities = strategy_json.get("entities", [])
         if not entities:
-            print("Warning: No entities in strategy.")
+            logger.debug("No entities in strategy.")
             
         for item in entities:
              try:
@@ -322,7 +757,7 @@ class StepBuilder:
                     self.solid_breps.append(brep)
 
              except Exception as e:
-                 print(f"Error building entity {item}: {e}")
+                 logger.error(f"Error building entity {item}: {e}")
 
         # 3. Shape Representation
         
@@ -354,31 +789,456 @@ class StepBuilder:
         if solids:
              top_repr_items.extend(solids)
              
-        if not top_repr_items:
+        tessellated = getattr(self, 'tessellated_items', [])
+        if not top_repr_items and not tessellated:
              # Fallback if absolutely nothing
              _, geo_set = self.add(f"GEOMETRIC_SET('',({axis2}))")
              top_repr_items.append(geo_set)
              
         # Representation takes a list of items
-        repr_items_str = ",".join(top_repr_items)
-        _, shape_repr = self.add(f"SHAPE_REPRESENTATION('transferred geometry',({repr_items_str}),{context_repr})")
+        representations = []
+        if top_repr_items:
+             repr_items_str = ",".join(top_repr_items)
+             _, shape_repr = self.add(f"SHAPE_REPRESENTATION('transferred geometry',({repr_items_str}),{context_repr})")
+             representations.append(shape_repr)
+        if tessellated:
+             tess_items_str = ",".join(tessellated)
+             _, tess_repr = self.add(
+                 f"TESSELLATED_SHAPE_REPRESENTATION('transferred geometry',({tess_items_str}),{context_repr})"
+             )
+             representations.append(tess_repr)
         
         # PRODUCT_DEFINITION_SHAPE
         _, prod_def_shape = self.add(f"PRODUCT_DEFINITION_SHAPE('','',{p_def})")
         
         # SHAPE_DEFINITION_REPRESENTATION
-        self.add(f"SHAPE_DEFINITION_REPRESENTATION({prod_def_shape},{shape_repr})")
+        for shape_repr in representations:
+             self.add(f"SHAPE_DEFINITION_REPRESENTATION({prod_def_shape},{shape_repr})")
 
         # 4. Generate Output
+        if self.stream is not None:
+            self._write(self.build_footer())
+            return self.bytes_written
         return self.build_final_string()
 
-    def add_mesh_solid(self, vertices, faces):
+    def add_mesh_solid(self, vertices, faces, normals=None):
         """
         Convert a raw mesh (vertices, faces) into a FACETED_BREP STEP entity.
         This uses POLY_LOOPs and implies planar faces.
         It is the simplest and most robust way to represent arbitrary geometry in STEP.
+
+        Normals, x-references and entity IDs are computed for all faces at once with
+        NumPy, and the per-face entity blocks are formatted in chunks. With interning
+        disabled and normals=None the output is byte-identical to the per-face loop in
+        _add_mesh_solid_python, which is still used for ragged polygon lists that
+        cannot be batched. With interning enabled, identical CARTESIAN_POINT and
+        DIRECTION entities are written once, plane origins reuse the vertex points
+        and the x-references are two shared DIRECTIONs; each face still gets its
+        own AXIS2_PLACEMENT_3D and PLANE.
+
+        normals, when given (e.g. MeshIndex.face_normals), are used instead of
+        recomputing them per chunk; zero normals of degenerate faces become
+        (0, 0, 1) as in the computed ones.
+        """
+        logger.debug(f"add_mesh_solid called with {len(vertices)} verts and {len(faces)} faces.")
+        try:
+            v_arr = np.asarray(vertices, dtype=np.float64)
+            f_arr = np.asarray(faces, dtype=np.int64)
+        except ValueError:
+            return self._add_mesh_solid_python(vertices, faces)
+
+        if v_arr.ndim != 2 or v_arr.shape[1] != 3 or f_arr.ndim != 2 or f_arr.shape[1] < 3:
+            return self._add_mesh_solid_python(vertices, faces)
+        if self.emit_workers > 1 and self.intern_table is None and len(f_arr) >= PARALLEL_MIN_FACES:
+            return self._add_mesh_solid_parallel(vertices, faces, normals, len(v_arr), len(f_arr))
+
+        # 1. Create Cartesian Points
+        n_verts = len(v_arr)
+        v_coords = _triple_text(v_arr)
+        if self.intern_table is not None:
+            v_ids = self._intern_many(_text_lines(["CARTESIAN_POINT('',(", v_coords, "))"], n_verts))
+        else:
+            # vertex i -> #(v_base + i)
+            v_base = self.next_id
+            v_ids = np.arange(v_base, v_base + n_verts)
+            if n_verts:
+                self._emit(_text_block(["#", _int_text(v_ids), "=CARTESIAN_POINT('',(", v_coords, "));"], n_verts))
+            self.next_id += n_verts
+        v_refs = _int_text(v_ids)
+        self._report("points", n_verts, n_verts)
+
+        # 2. Create Faces
+        face_ids = []
+        for lo in range(0, len(f_arr), MESH_CHUNK_FACES):
+            chunk = f_arr[lo:lo + MESH_CHUNK_FACES]
+            if normals is None:
+                chunk_normals = _face_normals(v_arr, chunk)
+            else:
+                chunk_normals = np.array(normals[lo:lo + MESH_CHUNK_FACES], dtype=np.float64)
+                chunk_normals[~chunk_normals.any(axis=1)] = (0.0, 0.0, 1.0)
+            if self.intern_table is not None:
+                face_ids.append(self._add_interned_face_blocks(chunk, chunk_normals, v_ids, v_refs))
+            else:
+                face_ids.append(self._add_face_blocks(chunk, chunk_normals, v_refs, v_coords))
+            self._report("faces", lo + len(chunk), len(f_arr))
+
+        self._close_mesh_shell(_ref_list_text(ids) for ids in face_ids)
+
+    def _add_mesh_solid_parallel(self, vertices, faces, normals, n_verts, n_faces):
+        """
+        add_mesh_solid with the text formatted in emit_workers processes.
+
+        Without interning every ID follows from the counts alone: vertex i is
+        #(v_base + i) and face j's block starts at face_base + 8 * j. Workers
+        memory-map the vertex/face/normal arrays (the saved .npy files when
+        they come from a memory-mapped MeshIndex, otherwise a copy in a
+        temporary directory), format one chunk of points or faces each into
+        a part file, and the parts are spliced into the output in order,
+        followed by the CLOSED_SHELL over all faces. The output is
+        byte-identical to the single-process path.
+        """
+        v_base = self.next_id
+        face_base = v_base + n_verts
+        chunk_faces = int(np.clip(-(-n_faces // (4 * self.emit_workers)), PARALLEL_MIN_CHUNK_FACES, MESH_CHUNK_FACES))
+
+        # Part files go next to the output file when there is one
+        out_name = getattr(self.stream, "name", None)
+        spill_root = os.path.dirname(os.path.abspath(out_name)) if isinstance(out_name, str) else None
+        with tempfile.TemporaryDirectory(prefix="step_emit_", dir=spill_root) as spill_dir:
+            paths = {
+                "vertices": _shared_array_path(vertices, np.float64, spill_dir, "vertices"),
+                "faces": _shared_array_path(faces, np.int64, spill_dir, "faces"),
+            }
+            if normals is not None:
+                paths["normals"] = _shared_array_path(normals, np.float64, spill_dir, "normals")
+
+            def jobs():
+                for k, lo in enumerate(range(0, n_verts, MESH_CHUNK_FACES)):
+                    hi = min(lo + MESH_CHUNK_FACES, n_verts)
+                    args = ("points", lo, hi, v_base, v_base + lo, os.path.join(spill_dir, f"points_{k}.part"))
+                    yield _emit_chunk_job, args, ("points", hi, n_verts)
+                for k, lo in enumerate(range(0, n_faces, chunk_faces)):
+                    hi = min(lo + chunk_faces, n_faces)
+                    args = ("faces", lo, hi, v_base, face_base + MESH_FACE_ENTITIES * lo,
+                            os.path.join(spill_dir, f"faces_{k}.part"))
+                    yield _emit_chunk_job, args, ("faces", hi, n_faces)
+
+            # spawn: the builder may run in a process with threads or an event loop
+            with ProcessPoolExecutor(max_workers=self.emit_workers,
+                                     mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_init_emit_worker, initargs=(paths,)) as pool:
+                for part_path, (stage, done, total) in _ordered_results(pool, jobs(), 2 * self.emit_workers):
+                    self._splice(part_path)
+                    os.remove(part_path)
+                    self._report(stage, done, total)
+        self.next_id = face_base + MESH_FACE_ENTITIES * n_faces
+
+        def shell_chunks():
+            for lo in range(0, n_faces, MESH_CHUNK_FACES):
+                hi = min(lo + MESH_CHUNK_FACES, n_faces)
+                yield _ref_list_text(face_base + MESH_FACE_ENTITIES * np.arange(lo, hi) + (MESH_FACE_ENTITIES - 1))
+
+        self._close_mesh_shell(shell_chunks())
+
+    def _splice(self, part_path):
+        """Append a file of complete, newline-terminated entity lines."""
+        size = os.path.getsize(part_path)
+        if size == 0:
+            return
+        if self.stream is None:
+            with open(part_path, "rb") as f:
+                self.entities.append(f.read().decode("ascii")[:-1])
+            return
+        with open(part_path, "rb") as f:
+            out_fd = None
+            # Only a plain file can take raw bytes; a compressing stream must see them
+            if isinstance(self.stream, io.BufferedWriter):
+                try:
+                    out_fd = self.stream.fileno()
+                    self.stream.flush()
+                except (OSError, ValueError):
+                    out_fd = None
+            if out_fd is None:
+                shutil.copyfileobj(f, self.stream, 1 << 20)
+            else:
+                # Kernel-side copy, then move the file object to the new end
+                offset = 0
+                while offset < size:
+                    offset += os.sendfile(out_fd, f.fileno(), offset, size - offset)
+                self.stream.seek(0, os.SEEK_END)
+        self.bytes_written += size
+
+    def _add_face_blocks(self, faces, normals, v_refs, v_coords):
+        """Emit MESH_FACE_ENTITIES consecutive entities per face; returns the FACE_SURFACE IDs."""
+        id_base = self.next_id
+        self._emit(_face_block_text(faces, normals, v_refs, v_coords, id_base))
+        self.next_id += MESH_FACE_ENTITIES * len(faces)
+        # FACE_SURFACE is the last entity of each block
+        return id_base + MESH_FACE_ENTITIES * np.arange(len(faces)) + (MESH_FACE_ENTITIES - 1)
+
+    def _add_interned_face_blocks(self, faces, normals, v_ids, v_refs):
+        """
+        Interned variant of _add_face_blocks: the plane origin reuses the vertex
+        point, the x-reference is one of two shared directions and the normal
+        DIRECTION goes through the interning table, leaving 5 entities per face.
+        Returns the FACE_SURFACE IDs.
+        """
+        n_faces = len(faces)
+        pt = _int_text(v_ids[faces[:, 0]])
+        dir_n = _int_text(self._intern_many(
+            _text_lines(["DIRECTION('',(", _triple_text(normals), "))"], n_faces)
+        ))
+
+        # Arbitrary X-axis: (1,0,0) for near-Z normals, else (0,0,1)
+        x_id, _ = self.add(f"DIRECTION('',({XREF_X}))")
+        z_id, _ = self.add(f"DIRECTION('',({XREF_Z}))")
+        dir_x = _int_text(np.where(np.abs(normals[:, 2]) > 0.9, x_id, z_id))
+        # Each face reuses its first vertex point and one of the shared x-references
+        self.reused_refs += 2 * n_faces
+
+        id_base = self.next_id
+        ids = _int_text(np.arange(id_base, id_base + 5 * n_faces)).reshape(n_faces, 5, -1)
+        loop, bound, ax2, plane, face = (ids[:, k] for k in range(5))
+        corners = []
+        for k in range(faces.shape[1]):
+            corners += [",#" if k else "#", v_refs[faces[:, k]]]
+        self._emit(_text_block([
+            "#", loop, "=POLY_LOOP('',(", *corners, "));\n",
+            "#", bound, "=FACE_OUTER_BOUND('',#", loop, ",.T.);\n",
+            "#", ax2, "=AXIS2_PLACEMENT_3D('',#", pt, ",#", dir_n, ",#", dir_x, ");\n",
+            "#", plane, "=PLANE('',#", ax2, ");\n",
+            "#", face, "=FACE_SURFACE('',(#", bound, "),#", plane, ",.T.);",
+        ], n_faces))
+        self.next_id += 5 * n_faces
+        return id_base + 5 * np.arange(n_faces) + 4
+
+    def add_region_solid(self, vertices, faces, facet_faces, facet_starts, normals=None):
+        """
+        Convert a triangle mesh into a B-Rep of ADVANCED_FACEs, merging each
+        coplanar facet into one planar face.
+
+        Facets (as computed by trimesh, e.g. MeshIndex.facet_faces /
+        facet_starts) become one PLANE face bounded by EDGE_LOOPs: the outer
+        loop plus one inner loop per hole. Edges, vertices and their points
+        are shared by the faces on both sides, and straight tessellated
+        borders collapse into single LINE edges. Triangles outside any facet
+        are emitted as triangular ADVANCED_FACEs in the same shell, so the
+        topology stays connected. A closed mesh gives a MANIFOLD_SOLID_BREP,
+        an open one a SHELL_BASED_SURFACE_MODEL.
+
+        Meshes that are not oriented manifolds fall back to add_mesh_solid.
+        """
+        logger.debug(f"add_region_solid called with {len(vertices)} verts and {len(faces)} faces.")
+        v_arr = np.asarray(vertices, dtype=np.float64)
+        f_arr = np.asarray(faces, dtype=np.int64)
+        topo = None
+        if f_arr.ndim == 2 and f_arr.shape[1] == 3:
+            topo = build_regions(v_arr, f_arr, np.asarray(facet_faces), np.asarray(facet_starts))
+        if topo is None:
+            return self.add_mesh_solid(vertices, faces, normals)
+
+        if normals is None:
+            face_normals = _face_normals(v_arr, f_arr)
+        else:
+            face_normals = np.array(normals, dtype=np.float64)
+            face_normals[~face_normals.any(axis=1)] = (0.0, 0.0, 1.0)
+
+        # 1. Vertices: CARTESIAN_POINT i -> #(p_base + i), VERTEX_POINT -> #(vp_base + i)
+        used = topo["vertices"]
+        n_used = len(used)
+        p_base = self.next_id
+        vp_base = p_base + n_used
+        p_ids = np.arange(p_base, vp_base)
+        if n_used:
+            p_refs = _int_text(p_ids)
+            self._emit(_text_block(["#", p_refs, "=CARTESIAN_POINT('',(", _triple_text(v_arr[used]), "));"], n_used))
+            self._emit(_text_block(["#", _int_text(p_ids + n_used), "=VERTEX_POINT('',#", p_refs, ");"], n_used))
+        self.next_id += REGION_VERTEX_ENTITIES * n_used
+        self._report("points", len(v_arr), len(v_arr))
+
+        # 2. Edges: straight lines between their two vertices
+        edges = topo["edges"]
+        n_edges = len(edges)
+        edge_base = self.next_id
+        if n_edges:
+            span = v_arr[used[edges[:, 1]]] - v_arr[used[edges[:, 0]]]
+            length = np.linalg.norm(span, axis=1)
+            direction = np.divide(span, length[:, None], out=np.zeros_like(span), where=length[:, None] > 0)
+            direction[length == 0] = (0.0, 0.0, 1.0)
+            ids = _int_text(np.arange(edge_base, edge_base + REGION_EDGE_ENTITIES * n_edges))
+            ids = ids.reshape(n_edges, REGION_EDGE_ENTITIES, -1)
+            dir_id, vec_id, line_id, curve_id = (ids[:, k] for k in range(REGION_EDGE_ENTITIES))
+            self._emit(_text_block([
+                "#", dir_id, "=DIRECTION('',(", _triple_text(direction), "));\n",
+                "#", vec_id, "=VECTOR('',#", dir_id, ",", _float_text(length), ");\n",
+                "#", line_id, "=LINE('',#", _int_text(p_ids[edges[:, 0]]), ",#", vec_id, ");\n",
+                "#", curve_id, "=EDGE_CURVE('',#", _int_text(vp_base + edges[:, 0]), ",#",
+                _int_text(vp_base + edges[:, 1]), ",#", line_id, ",.T.);",
+            ], n_edges))
+        self.next_id += REGION_EDGE_ENTITIES * n_edges
+        # EDGE_CURVE is the last entity of each edge block
+        curve_ids = edge_base + REGION_EDGE_ENTITIES * np.arange(n_edges) + (REGION_EDGE_ENTITIES - 1)
+
+        # 3. Merged facets: one planar face per region, in chunks of regions
+        x_id, _ = self.add(f"DIRECTION('',({XREF_X}))")
+        z_id, _ = self.add(f"DIRECTION('',({XREF_Z}))")
+        region_facets = topo["region_facets"]
+        loop_starts = topo["loop_starts"]
+        # Outer loop of each region, and the vertex its first edge starts at
+        outer = np.searchsorted(topo["loop_region"], np.arange(len(region_facets) + 1))
+        head = loop_starts[outer[:-1]]
+        corners = edges[topo["loop_edges"][head], np.where(topo["loop_senses"][head], 0, 1)]
+        facet_starts = np.asarray(facet_starts)
+        region_normals = face_normals[np.asarray(facet_faces)[facet_starts[region_facets]]]
+        region_sizes = np.diff(facet_starts)[region_facets]
+
+        face_chunks = []
+        done = 0
+        for lo in range(0, len(region_facets), MESH_CHUNK_FACES):
+            hi = min(lo + MESH_CHUNK_FACES, len(region_facets))
+            l_lo, l_hi = outer[lo], outer[hi]
+            e_lo, e_hi = loop_starts[l_lo], loop_starts[l_hi]
+            face_chunks.append(_ref_list_text(self._add_region_faces(
+                curve_ids[topo["loop_edges"][e_lo:e_hi]], topo["loop_senses"][e_lo:e_hi],
+                loop_starts[l_lo:l_hi + 1] - e_lo, outer[lo:hi + 1] - l_lo,
+                region_normals[lo:hi], p_ids[corners[lo:hi]], x_id, z_id
+            )))
+            done += int(region_sizes[lo:hi].sum())
+            self._report("faces", done, len(f_arr))
+
+        # 4. Leftover triangles, in chunks like add_mesh_solid
+        triangles = topo["triangles"]
+        for lo in range(0, len(triangles), MESH_CHUNK_FACES):
+            chunk = slice(lo, lo + MESH_CHUNK_FACES)
+            face_chunks.append(_ref_list_text(self._add_triangle_faces(
+                triangles[chunk], topo["triangle_edges"][chunk], topo["triangle_senses"][chunk],
+                face_normals, curve_ids, p_ids[np.searchsorted(used, f_arr[triangles[chunk], 0])],
+                x_id, z_id
+            )))
+            done += len(triangles[chunk])
+            self._report("faces", done, len(f_arr))
+
+        # 5. Shell and solid
+        if topo["closed"]:
+            _, shell = self.add_list("CLOSED_SHELL('',", face_chunks, ")")
+            _, item = self.add(f"MANIFOLD_SOLID_BREP('',{shell})")
+        else:
+            _, shell = self.add_list("OPEN_SHELL('',", face_chunks, ")")
+            _, item = self.add(f"SHELL_BASED_SURFACE_MODEL('',({shell}))")
+        self.solid_breps = getattr(self, 'solid_breps', [])
+        self.solid_breps.append(item)
+
+    def _add_region_faces(self, loop_curves, loop_senses, loop_starts, region_loops, normals, corner_points,
+                          x_id, z_id):
+        """
+        Emit the planar ADVANCED_FACEs of a chunk of regions; returns their IDs.
+        loop_curves / loop_senses list the EDGE_CURVE IDs of all loops, split
+        by the CSR offsets loop_starts; region_loops splits the loops by region.
+        """
+        n_oe, n_loops, n_regions = len(loop_curves), len(loop_starts) - 1, len(normals)
+        oe_ids = np.arange(self.next_id, self.next_id + n_oe)
+        loop_base = self.next_id + n_oe
+        bound_base = loop_base + n_loops
+        region_base = bound_base + n_loops
+        face_base = region_base + 3 * n_regions
+        loop_ids = np.arange(loop_base, bound_base)
+        bound_ids = np.arange(bound_base, region_base)
+        face_ids = np.arange(face_base, face_base + n_regions)
+
+        oe_refs = _int_text(oe_ids)
+        senses = np.where(loop_senses, ord("T"), ord("F")).astype(np.uint8)[:, None]
+        self._emit(_text_block(["#", oe_refs, "=ORIENTED_EDGE('',*,*,#", _int_text(loop_curves), ",.", senses, ".);"],
+                               n_oe))
+        self._emit(_list_lines(loop_ids, "EDGE_LOOP('',(", oe_refs, loop_starts, ["))"]))
+        # The first loop of each region is its outer bound
+        outer = np.zeros((n_loops, 6), dtype=np.uint8)
+        outer[region_loops[:-1]] = np.frombuffer(b"_OUTER", dtype=np.uint8)
+        bound_refs = _int_text(bound_ids)
+        self._emit(_text_block(["#", bound_refs, "=FACE", outer, "_BOUND('',#", _int_text(loop_ids), ",.T.);"],
+                               n_loops))
+
+        ids = _int_text(np.arange(region_base, face_base)).reshape(n_regions, 3, -1)
+        dir_n, ax2, plane = (ids[:, k] for k in range(3))
+        dir_x = _int_text(np.where(np.abs(normals[:, 2]) > 0.9, x_id, z_id))
+        self._emit(_text_block([
+            "#", dir_n, "=DIRECTION('',(", _triple_text(normals), "));\n",
+            "#", ax2, "=AXIS2_PLACEMENT_3D('',#", _int_text(corner_points), ",#", dir_n, ",#", dir_x, ");\n",
+            "#", plane, "=PLANE('',#", ax2, ");",
+        ], n_regions))
+        self._emit(_list_lines(face_ids, "ADVANCED_FACE('',(", bound_refs, region_loops, ["),#", plane, ",.T.)"]))
+        self.next_id = int(face_base + n_regions)
+        return face_ids
+
+    def _add_triangle_faces(self, triangles, tri_edges, tri_senses, face_normals, curve_ids, corner_points,
+                            x_id, z_id):
+        """Emit one triangular ADVANCED_FACE per triangle; returns their IDs."""
+        n_tris = len(triangles)
+        normals = face_normals[triangles]
+        id_base = self.next_id
+        ids = _int_text(np.arange(id_base, id_base + REGION_TRIANGLE_ENTITIES * n_tris))
+        ids = ids.reshape(n_tris, REGION_TRIANGLE_ENTITIES, -1)
+        oe0, oe1, oe2, loop, bound, dir_n, ax2, plane, face = (ids[:, k] for k in range(REGION_TRIANGLE_ENTITIES))
+        curves = _int_text(curve_ids[tri_edges].ravel()).reshape(n_tris, 3, -1)
+        senses = np.where(tri_senses, ord("T"), ord("F")).astype(np.uint8)[..., None]
+        dir_x = _int_text(np.where(np.abs(normals[:, 2]) > 0.9, x_id, z_id))
+
+        oriented = []
+        for k, oe in enumerate((oe0, oe1, oe2)):
+            oriented += ["#", oe, "=ORIENTED_EDGE('',*,*,#", curves[:, k], ",.", senses[:, k], ".);\n"]
+        self._emit(_text_block([
+            *oriented,
+            "#", loop, "=EDGE_LOOP('',(#", oe0, ",#", oe1, ",#", oe2, "));\n",
+            "#", bound, "=FACE_OUTER_BOUND('',#", loop, ",.T.);\n",
+            "#", dir_n, "=DIRECTION('',(", _triple_text(normals), "));\n",
+            "#", ax2, "=AXIS2_PLACEMENT_3D('',#", _int_text(corner_points), ",#", dir_n, ",#", dir_x, ");\n",
+            "#", plane, "=PLANE('',#", ax2, ");\n",
+            "#", face, "=ADVANCED_FACE('',(#", bound, "),#", plane, ",.T.);",
+        ], n_tris))
+        self.next_id += REGION_TRIANGLE_ENTITIES * n_tris
+        return id_base + REGION_TRIANGLE_ENTITIES * np.arange(n_tris) + (REGION_TRIANGLE_ENTITIES - 1)
+
+    def add_tessellated_solid(self, vertices, faces):
+        """
+        Convert a triangle mesh into an AP242 TESSELLATED_SHELL holding one
+        TRIANGULATED_FACE over a single COORDINATES_LIST.
+
+        Every triangle is stored as a triplet of (1-based) indices into the
+        shared point list rather than as an 8-entity face block. Both lists
+        are formatted from NumPy in chunks of TESSELLATED_CHUNK_ROWS rows and
+        streamed through add_list. The builder must use schema="AP242".
+        """
+        logger.debug(f"add_tessellated_solid called with {len(vertices)} verts and {len(faces)} faces.")
+        v_arr = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        f_arr = np.asarray(faces, dtype=np.int64)
+        if f_arr.ndim != 2 or f_arr.shape[1] != 3:
+            raise ValueError("Tessellated export needs a triangle mesh")
+
+        def point_chunks():
+            for lo in range(0, len(v_arr), TESSELLATED_CHUNK_ROWS):
+                chunk = v_arr[lo:lo + TESSELLATED_CHUNK_ROWS]
+                yield _tuple_list_text(_triple_text(chunk))
+                self._report("points", lo + len(chunk), len(v_arr))
+
+        def triangle_chunks():
+            for lo in range(0, len(f_arr), TESSELLATED_CHUNK_ROWS):
+                chunk = f_arr[lo:lo + TESSELLATED_CHUNK_ROWS]
+                n = len(chunk)
+                corners = _int_text(chunk.ravel() + 1).reshape(n, 3, -1)
+                yield _tuple_list_text(_concat_text([corners[:, 0], ",", corners[:, 1], ",", corners[:, 2]], n))
+                self._report("faces", lo + n, len(f_arr))
+
+        _, coords = self.add_list(f"COORDINATES_LIST('',{len(v_arr)},", point_chunks(), ")")
+        # No normals and an empty pnindex: triangles index the coordinates directly
+        _, face = self.add_list(f"TRIANGULATED_FACE('',{coords},{len(v_arr)},(),$,(),", triangle_chunks(), ")")
+        _, shell = self.add(f"TESSELLATED_SHELL('',({face}),$)")
+        self.tessellated_items = getattr(self, 'tessellated_items', [])
+        self.tessellated_items.append(shell)
+
+    def _add_mesh_solid_python(self, vertices, faces):
+        """
+        Per-face reference implementation of add_mesh_solid.
+        Handles arbitrary (ragged) polygon lists.
         """
-        print(f"DEBUG: add_mesh_solid called with {len(vertices)} verts and {len(faces)} faces.")
         # 1. Create Cartesian Points
         # Map vertex index to STEP point ID to ensure topology sharing
         v_map = {}
@@ -386,6 +1246,7 @@ class StepBuilder:
             # Scale check? STL is usually units. STEP is defined as Millimeter in header.
             _, pid = self.add(f"CARTESIAN_POINT('',({v[0]:.4f},{v[1]:.4f},{v[2]:.4f}))")
             v_map[i] = pid
+        self._report("points", len(vertices), len(vertices))
             
         # 2. Create Faces
         step_faces = []
@@ -434,10 +1295,19 @@ class StepBuilder:
             # Create Face
             _, step_face = self.add(f"FACE_SURFACE('',({bound}),{plane},.T.)")
             step_faces.append(step_face)
+            if len(step_faces) % MESH_CHUNK_FACES == 0:
+                self._report("faces", len(step_faces), len(faces))
+        self._report("faces", len(step_faces), len(faces))
             
+        self._close_mesh_shell([",".join(step_faces)])
+
+    def _report(self, stage, done, total):
+        if self.progress is not None:
+            self.progress(stage, done, total)
+
+    def _close_mesh_shell(self, f_list_chunks):
         # 3. Create Shell
-        f_list = ",".join(step_faces)
-        _, c_shell = self.add(f"CLOSED_SHELL('',({f_list}))")
+        _, c_shell = self.add_list("CLOSED_SHELL('',", f_list_chunks, ")")
         
         # 4. Create Faceted Brep
         _, brep = self.add(f"FACETED_BREP('',{c_shell})")
@@ -445,16 +1315,23 @@ class StepBuilder:
         self.solid_breps = getattr(self, 'solid_breps', [])
         self.solid_breps.append(brep)
 
-    def build_final_string(self):
+    def build_header(self):
         now = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-        header = f"""ISO-10303-21;
+        schema = STEP_SCHEMAS[self.schema]
+        return f"""ISO-10303-21;
 HEADER;
-FILE_DESCRIPTION(('STEP AP214'),'2;1');
+FILE_DESCRIPTION(('{schema["description"]}'),'2;1');
 FILE_NAME('converted.step','{now}',('AI-Converter'),('User'),'Processor','System','');
-FILE_SCHEMA(('AUTOMOTIVE_DESIGN'));
+FILE_SCHEMA(('{schema["schema"]}'));
 ENDSEC;
 DATA;"""
-        footer = "ENDSEC;\nEND-ISO-10303-21;"
+
+    def build_footer(self):
+        return "ENDSEC;\nEND-ISO-10303-21;"
+
+    def build_final_string(self):
+        header = self.build_header()
+        footer = self.build_footer()
         
         body = "\n".join(self.entities)
         return f"{header}\n{body}\n{footer}"
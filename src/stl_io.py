@@ -1,24 +1,50 @@
 import trimesh
+import numpy as np
 import os
 import io
 
-def load_stl(file_input):
+# Binary STL layout: 80-byte header, uint32 triangle count, then one
+# 50-byte record per triangle.
+STL_HEADER_SIZE = 84
+STL_RECORD_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attributes", "<u2"),
+])
+
+# Decimals to which corners are welded: trimesh.tol.merge, as in merge_vertices
+MERGE_DIGITS = int(round(-np.log10(trimesh.tol.merge)))
+
+def load_stl(file_input, weld=True):
     """
     Load an STL file from a path or a file-like object.
     
+    Well-formed binary STLs are read directly with read_binary_stl and wrapped
+    in an unprocessed Trimesh; ASCII or unusual files go through trimesh.load.
+    
     Args:
         file_input (str or file-like): The STL file to load.
+        weld (bool): Merge coincident corners into shared vertices.
         
     Returns:
         trimesh.Trimesh: The loaded mesh object, or None if loading fails.
     """
     try:
+        if not isinstance(file_input, str):
+            # File-like objects (e.g. from Streamlit) can only be read once
+            file_input = io.BytesIO(file_input.read())
+
+        arrays = read_binary_stl(file_input, weld=weld)
+        if arrays is not None:
+            vertices, faces = arrays
+            return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
         if isinstance(file_input, str):
             # If it's a file path
             mesh = trimesh.load(file_input, file_type='stl')
         else:
-            # If it's a file-like object (e.g. from Streamlit)
             # trimesh expects the file object to have a 'read' attribute
+            file_input.seek(0)
             file_type = 'stl'
             mesh = trimesh.load(file_input, file_type=file_type)
 
@@ -36,6 +62,94 @@ def load_stl(file_input):
         print(f"Error loading STL: {e}")
         return None
 
+def read_binary_stl(file_input, weld=True):
+    """
+    Read a binary STL without building intermediate Python objects.
+    Paths are memory-mapped; BytesIO buffers are viewed in place.
+    
+    Args:
+        file_input (str or io.BytesIO): The STL file to read.
+        weld (bool): Merge coincident corners (see weld_vertices) into
+            shared vertices. Otherwise every triangle gets its own three vertices.
+        
+    Returns:
+        tuple: (vertices (N, 3) float64, faces (M, 3) int64), or None if the
+        input is not a well-formed binary STL with finite coordinates.
+    """
+    if isinstance(file_input, str):
+        size = os.path.getsize(file_input)
+        with open(file_input, "rb") as f:
+            header = f.read(STL_HEADER_SIZE)
+    else:
+        buffer = file_input.getbuffer()
+        size = len(buffer)
+        header = bytes(buffer[:STL_HEADER_SIZE])
+
+    if len(header) < STL_HEADER_SIZE:
+        return None
+    count = int(np.frombuffer(header, dtype="<u4", count=1, offset=80)[0])
+    # ASCII files (and binaries with a bogus count) fail the size check
+    if count == 0 or size != STL_HEADER_SIZE + count * STL_RECORD_DTYPE.itemsize:
+        return None
+
+    if isinstance(file_input, str):
+        records = np.memmap(file_input, dtype=STL_RECORD_DTYPE, mode="r",
+                            offset=STL_HEADER_SIZE, shape=(count,))
+    else:
+        records = np.frombuffer(buffer, dtype=STL_RECORD_DTYPE, count=count,
+                                offset=STL_HEADER_SIZE)
+
+    # Stored normals are ignored; trimesh recomputes them from the winding
+    corners = np.ascontiguousarray(records["vertices"]).reshape(-1, 3)
+    del records
+    if not np.isfinite(corners).all():
+        return None
+
+    if not weld:
+        return corners.astype(np.float64), np.arange(len(corners), dtype=np.int64).reshape(-1, 3)
+    return weld_vertices(corners)
+
+def weld_vertices(corners, digits=None):
+    """
+    Merge corners that agree to `digits` decimals, the tolerance of
+    trimesh's merge_vertices (trimesh.tol.merge, 1e-8), so exporters that
+    write a shared corner with a slightly different float still give a
+    closed shell. Corners are bucketed by a 64-bit hash of their rounded
+    coordinates; on a hash collision the exact row-wise unique is used
+    instead. Vertices keep the coordinates and order of their first
+    occurrence.
+    
+    Args:
+        corners (np.ndarray): (3 * M, 3) float32 triangle corners.
+        digits (int, optional): Decimals compared; trimesh's by default.
+        
+    Returns:
+        tuple: (vertices (N, 3) float64, faces (M, 3) int64)
+    """
+    if digits is None:
+        digits = MERGE_DIGITS
+    # Rounded to multiples of 10^-digits (-0.0 -> 0.0); equal inputs stay equal
+    # even where float64 cannot hold the product exactly
+    rounded = np.round(corners.astype(np.float64) * 10.0 ** digits) + 0.0
+    bits = rounded.view(np.uint64)
+    key = (bits[:, 0] * np.uint64(0x9E3779B185EBCA87)) \
+        ^ (bits[:, 1] * np.uint64(0xC2B2AE3D27D4EB4F)) \
+        ^ (bits[:, 2] * np.uint64(0x165667B19E3779F9))
+    
+    _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    if not np.array_equal(rounded[first[inverse]], rounded):
+        rows = rounded.view(np.dtype((np.void, rounded.dtype.itemsize * 3))).ravel()
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    del rounded, bits
+
+    # Renumber vertices by first occurrence
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    faces = rank[inverse.ravel()].reshape(-1, 3)
+    vertices = corners[first[order]].astype(np.float64)
+    return vertices, faces
+
 def save_stl(mesh, path):
     """
     Save a mesh object to an STL file.
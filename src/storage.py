@@ -1,23 +1,73 @@
 import os
 import shutil
-import datetime
+import hashlib
 
-OUTPUT_DIR = "outputs/runs"
+from src import config
+from src.compression import artifact_suffix
+
+OUTPUT_DIR = config.get_output_dir()
+# Run folders are named <session_id><RUN_SUFFIX>
+RUN_SUFFIX = "_run"
 
 def init_storage():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def save_temp_artifacts(run_id, stl_file, step_content, report_content):
+def hash_file(path, chunk_size=1024 * 1024):
+    """
+    Returns:
+        str: SHA-256 hex digest of a file's content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def save_upload(file_obj, path, chunk_size=1024 * 1024):
+    """
+    Copy an uploaded file to disk, hashing the bytes as they stream through.
+    
+    Returns:
+        str: SHA-256 hex digest of the content.
+    """
+    digest = hashlib.sha256()
+    with open(path, "wb") as buffer:
+        while True:
+            chunk = file_obj.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
+
+def get_step_path(run_id, compression="none", root=None):
+    """
+    Path of the STEP artifact for a run, creating the run folder.
+    Used to stream the STEP file straight to disk during generation; with
+    compression (see compression.ARTIFACT_FORMATS) the name carries the
+    codec, e.g. converted.step.gz. Runs live under root (OUTPUT_DIR by default).
+    """
+    run_dir = os.path.join(root or OUTPUT_DIR, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    return os.path.join(run_dir, "converted" + artifact_suffix(compression))
+
+def save_temp_artifacts(run_id, stl_file, step_content, report_content, root=None):
     """
     Save artifacts to a timestamped folder.
+    If step_content is None the STEP file is assumed to have been streamed
+    to get_step_path(run_id) already.
     """
-    run_dir = os.path.join(OUTPUT_DIR, run_id)
+    run_dir = os.path.join(root or OUTPUT_DIR, run_id)
     os.makedirs(run_dir, exist_ok=True)
     
     # Save STEP
     step_path = os.path.join(run_dir, "converted.step")
-    with open(step_path, "w") as f:
-        f.write(step_content)
+    if step_content is not None:
+        with open(step_path, "w") as f:
+            f.write(step_content)
         
     # Save Report
     report_path = os.path.join(run_dir, "explanation.md")
@@ -25,3 +75,63 @@ def save_temp_artifacts(run_id, stl_file, step_content, report_content):
         f.write(report_content)
         
     return run_dir, step_path
+
+def touch_run(step_path):
+    """Mark the run folder of an artifact as recently used, for reclaim_space."""
+    try:
+        os.utime(os.path.dirname(step_path))
+    except OSError:
+        pass
+
+def tree_size(path):
+    """
+    Returns:
+        int: Total size in bytes of the files under path (0 if it is gone).
+    """
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for name in file_names:
+            try:
+                total += os.lstat(os.path.join(dir_path, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def remove_tree(path):
+    """
+    Delete a folder.
+
+    Returns:
+        int: Bytes freed.
+    """
+    size = tree_size(path)
+    shutil.rmtree(path, ignore_errors=True)
+    return size - tree_size(path)
+
+def reclaim_space(quota_bytes, protected=(), root=None):
+    """
+    Delete run folders under root (OUTPUT_DIR by default), least recently
+    used first, until everything under root fits in quota_bytes. Only
+    <id>_run folders are candidates; those in protected are kept.
+
+    Returns:
+        tuple: (bytes used afterwards, [(run folder, bytes freed), ...])
+    """
+    root = root or OUTPUT_DIR
+    usage = tree_size(root)
+    removed = []
+    if usage <= quota_bytes:
+        return usage, removed
+    keep = {os.path.realpath(p) for p in protected if p}
+    runs = []
+    for entry in os.scandir(root):
+        if (entry.name.endswith(RUN_SUFFIX) and entry.is_dir(follow_symlinks=False)
+                and os.path.realpath(entry.path) not in keep):
+            runs.append((entry.stat().st_mtime, entry.path))
+    for _, path in sorted(runs):
+        if usage <= quota_bytes:
+            break
+        freed = remove_tree(path)
+        usage -= freed
+        removed.append((path, freed))
+    return usage, removed
@@ -0,0 +1,136 @@
+"""
+Per-request trace IDs and timing spans of the pipeline stages.
+
+Every API request gets a trace ID (the client's X-Trace-Id header, or a new
+one), carried in a context variable into the handler and the background
+tasks it starts. Code wraps its stages in span(name); a finished span is
+observed in metrics.STAGE_SECONDS and kept under the current trace ID, so
+/api/traces/{trace_id} shows where the time of one upload went.
+
+Stages that run in a worker process (see StageExecutor) go through
+run_collected, which gathers their spans and returns them with the result;
+the API process records them under the trace of the request.
+"""
+import os
+import re
+import time
+import uuid
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from src import config, metrics
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+# Set inside run_collected: spans go to this list instead of being recorded
+_collector = contextvars.ContextVar("span_collector", default=None)
+
+class TraceStore:
+    """The spans of the newest max_traces traces, at most max_spans each."""
+
+    def __init__(self, max_traces=500, max_spans=256):
+        self.max_traces = max_traces
+        self.max_spans = max_spans
+        self.traces = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, trace_id, spans):
+        with self.lock:
+            trace = self.traces.get(trace_id)
+            if trace is None:
+                trace = self.traces[trace_id] = []
+            self.traces.move_to_end(trace_id)
+            trace.extend(spans[:max(0, self.max_spans - len(trace))])
+            while len(self.traces) > self.max_traces:
+                self.traces.popitem(last=False)
+
+    def get(self, trace_id):
+        """
+        Returns:
+            dict: {"trace_id", "spans"} with the spans ordered by start time,
+            or None for an unknown (or expired) trace.
+        """
+        with self.lock:
+            spans = self.traces.get(trace_id)
+            if spans is None:
+                return None
+            spans = sorted(spans, key=lambda s: s["start"])
+        return {"trace_id": trace_id, "spans": spans}
+
+TRACES = TraceStore(config.get_trace_max_traces())
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+def clean_trace_id(value):
+    """A client-supplied trace ID if it is safe to echo back and store, else None."""
+    if value and _TRACE_ID_PATTERN.match(value):
+        return value
+    return None
+
+def current_trace_id():
+    return _trace_id.get()
+
+def set_trace_id(trace_id):
+    """Returns a token for reset_trace_id."""
+    return _trace_id.set(trace_id)
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
+
+def make_span(name, start, seconds, error=None, **attrs):
+    """
+    A span record: {"name", "start" (epoch seconds), "seconds", "attrs",
+    "pid", "error"}.
+    """
+    return {"name": name, "start": start, "seconds": seconds, "attrs": attrs, "pid": os.getpid(), "error": error}
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time the enclosed block as a stage. Yields the span's attrs dict, which
+    the block may add to (e.g. the number of faces it processed).
+    """
+    record = make_span(name, time.time(), None, **attrs)
+    start = time.perf_counter()
+    try:
+        yield record["attrs"]
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        collector = _collector.get()
+        if collector is not None:
+            collector.append(record)
+        else:
+            record_spans([record])
+
+def record_spans(spans, trace_id=None):
+    """Observe finished spans in the stage metrics and store them under the (current) trace."""
+    for record in spans:
+        metrics.STAGE_SECONDS.observe(record["seconds"], stage=record["name"])
+    trace_id = trace_id or _trace_id.get()
+    if trace_id and spans:
+        TRACES.add(trace_id, spans)
+
+def run_collected(fn, args, kwargs):
+    """
+    Run fn(*args, **kwargs) inside a span named after it, collecting every
+    span it finishes. Top-level, so a stage worker process can run it.
+
+    Returns:
+        tuple: (result, spans); the span of fn itself comes last.
+    """
+    spans = []
+    token = _collector.set(spans)
+    try:
+        with span(getattr(fn, "__name__", "stage")):
+            result = fn(*args, **kwargs)
+    finally:
+        _collector.reset(token)
+    return result, spans
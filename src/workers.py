@@ -0,0 +1,103 @@
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from src import tracing
+
+class ExecutorSaturated(Exception):
+    """Raised when the stage queue is full; the API answers 503."""
+
+class StageExecutor:
+    """
+    Runs CPU-heavy pipeline stages off the asyncio event loop.
+    
+    Stages go to a process pool of max_workers processes (threads when
+    max_workers is 0). At most max_workers stages run at once and at most
+    max_pending more wait in the queue; anything beyond that is rejected with
+    ExecutorSaturated instead of piling up behind the running conversions.
+    
+    The spans a stage finishes (see src.tracing) are recorded under the
+    caller's trace, after a "queue_wait" span for the time it waited for a
+    worker.
+    """
+
+    def __init__(self, max_workers, max_pending):
+        self.use_processes = max_workers > 0
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(0, max_pending)
+        self.executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        if self.executor is None:
+            if self.use_processes:
+                # spawn: forking a process that runs an event loop and threads is unsafe
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="stage"
+                )
+        return self.executor
+
+    def is_saturated(self):
+        return self.in_flight >= self.max_workers + self.max_pending
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the pool and await its result.
+        
+        Raises:
+            ExecutorSaturated: If max_workers + max_pending stages are already queued.
+        """
+        # Only touched from the event loop thread, so no lock is needed
+        if self.is_saturated():
+            self.rejected += 1
+            raise ExecutorSaturated(
+                f"{self.in_flight} conversion stages already running or queued"
+            )
+        self.in_flight += 1
+        submitted, start = time.time(), time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            future = self._get_executor().submit(tracing.run_collected, fn, args, kwargs)
+            result, spans = await asyncio.wrap_future(future, loop=loop)
+            self.completed += 1
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # A worker died (e.g. OOM kill); start a fresh pool for later stages
+                self.executor = None
+            # The worker's own spans are lost with the exception
+            tracing.record_spans([tracing.make_span(
+                getattr(fn, "__name__", "stage"), submitted, time.perf_counter() - start, type(e).__name__
+            )])
+            raise
+        finally:
+            self.in_flight -= 1
+        # Its own span comes last and starts when a worker picked it up
+        waited = max(0.0, spans[-1]["start"] - submitted)
+        tracing.record_spans([tracing.make_span("queue_wait", submitted, waited, stage=spans[-1]["name"])] + spans)
+        return result
+
+    def stats(self):
+        return {
+            "mode": "process" if self.use_processes else "thread",
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.max_workers),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,83 @@
+"""
+Shared fixtures. Every output directory and database points into a
+temporary folder before any src module reads the configuration, and the
+LLM key is cleared so nothing leaves the machine.
+"""
+import os
+import tempfile
+import time
+
+_ROOT = tempfile.mkdtemp(prefix="stl2step_tests_")
+os.environ["OUTPUT_DIR"] = os.path.join(_ROOT, "runs")
+os.environ["HISTORY_DB"] = os.path.join(_ROOT, "history.sqlite3")
+os.environ["RESULT_CACHE_DIR"] = os.path.join(_ROOT, "cache")
+os.environ["LLM_CACHE_DIR"] = os.path.join(_ROOT, "llm_cache")
+os.environ["SESSION_DB"] = os.path.join(_ROOT, "sessions.sqlite3")
+os.environ["OPENAI_API_KEY"] = ""
+os.environ["WORKER_PROCESSES"] = "0"
+os.environ["LLM_MAX_RETRIES"] = "0"
+
+import numpy as np
+import pytest
+import trimesh
+
+@pytest.fixture
+def box_mesh():
+    """A closed 12-triangle box: six planar facets of two triangles each."""
+    return trimesh.creation.box(extents=(40.0, 30.0, 20.0))
+
+@pytest.fixture
+def random_mesh():
+    """Unrelated triangles with arbitrary coordinates, including a degenerate one."""
+    rng = np.random.default_rng(7)
+    vertices = rng.uniform(-50, 50, size=(60, 3))
+    faces = rng.integers(0, len(vertices), size=(80, 3))
+    faces[0] = (3, 3, 3)
+    return trimesh.Trimesh(vertices=vertices, faces=faces, process=False)
+
+def write_stl(mesh, path):
+    mesh.export(path, file_type="stl")
+    return path
+
+def strip_header_time(text):
+    """STEP text without the FILE_NAME timestamp, which changes every second."""
+    return "\n".join(line for line in text.splitlines() if not line.startswith("FILE_NAME("))
+
+def make_stl(directory, scale=1.0, name="part.stl"):
+    """A box STL whose content (and so its cache key) depends on scale."""
+    mesh = trimesh.creation.box(extents=(40.0 * scale, 30.0, 20.0))
+    return write_stl(mesh, os.path.join(str(directory), name))
+
+@pytest.fixture(scope="module")
+def client():
+    """The API app with its startup and shutdown events, run on threads."""
+    from fastapi.testclient import TestClient
+    from src import server
+    with TestClient(server.app) as test_client:
+        yield test_client
+
+def upload(client, stl_path):
+    with open(stl_path, "rb") as f:
+        response = client.post("/api/upload", files={"file": (os.path.basename(stl_path), f)})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def wait_for_job(client, job_id, timeout=30.0):
+    """Poll a generate job until it and its explanation are finished."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] == "failed":
+            return job
+        if job["status"] == "complete" and job["result"]["explanation_status"] != "pending":
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish: {job}")
+
+def convert(client, stl_path, format=None):
+    """Upload and generate; returns (session_id, finished job)."""
+    session_id = upload(client, stl_path)["session_id"]
+    url = f"/api/generate/{session_id}" + (f"?format={format}" if format else "")
+    response = client.post(url)
+    assert response.status_code == 202, response.text
+    return session_id, wait_for_job(client, response.json()["job_id"])
@@ -0,0 +1,49 @@
+import json
+import os
+import shutil
+
+from src import batch
+from tests.conftest import make_stl
+
+def _summary(path):
+    with open(path) as f:
+        return sorted((json.loads(line) for line in f), key=lambda r: r["file"])
+
+# user-021: headless batch conversion
+
+def test_batch_converts_skips_and_reports(tmp_path):
+    inputs = tmp_path / "in"
+    (inputs / "sub").mkdir(parents=True)
+    first = make_stl(str(inputs), scale=1.0, name="a.stl")
+    make_stl(str(inputs / "sub"), scale=2.0, name="b.stl")
+    shutil.copy(first, inputs / "sub" / "copy_of_a.stl")
+    (inputs / "broken.stl").write_bytes(b"not an stl")
+    out = tmp_path / "out"
+    summary = tmp_path / "summary.jsonl"
+    argv = [str(inputs), "--out", str(out), "--summary", str(summary), "--no-llm",
+            "--workers", "2", "--format", "faceted", "--compression", "gzip"]
+    
+    assert batch.main(argv) == 1
+    records = {os.path.basename(r["file"]): r for r in _summary(summary)}
+    assert records["broken.stl"]["status"] == "failed"
+    assert records["copy_of_a.stl"]["status"] == "duplicate"
+    converted = records["a.stl"]
+    assert converted["status"] == "converted"
+    assert converted["faces"] == 12
+    assert converted["step_path"] == str(out / converted["hash"] / "faceted-intern0-gzip" / "converted.step.gz")
+    assert os.path.exists(converted["step_path"])
+    assert not os.path.exists(os.path.join(os.path.dirname(converted["step_path"]), "arrays"))
+    assert set(converted["timings"]) == {"analyze", "llm", "build", "explain", "total"}
+    
+    # A second run finds every finished result and converts nothing
+    os.remove(inputs / "broken.stl")
+    assert batch.main(argv) == 0
+    assert {r["status"] for r in _summary(summary)} == {"skipped", "duplicate"}
+
+def test_find_inputs_accepts_files_directories_and_globs(tmp_path):
+    make_stl(str(tmp_path), name="x.stl")
+    make_stl(str(tmp_path), name="Y.STL")
+    (tmp_path / "notes.txt").write_text("")
+    by_dir = batch.find_inputs([str(tmp_path)])
+    assert [os.path.basename(p) for p in by_dir] == ["Y.STL", "x.stl"]
+    assert batch.find_inputs([str(tmp_path / "*.stl"), str(tmp_path / "x.stl")]) == [str(tmp_path / "x.stl")]
@@ -0,0 +1,50 @@
+import pytest
+
+from benchmarks import bench_stages
+from benchmarks.synthetic import SHAPES, make_mesh
+from src import feature_hints
+
+# user-022: stage benchmarks on synthetic meshes
+
+@pytest.mark.parametrize("shape", SHAPES)
+@pytest.mark.parametrize("target", [1000, 20000])
+def test_synthetic_meshes_have_the_requested_size(shape, target):
+    mesh = make_mesh(shape, target)
+    if shape == "sphere":
+        assert target / 2 <= len(mesh.faces) <= target * 2
+    else:
+        assert len(mesh.faces) == pytest.approx(target, rel=0.1)
+    assert mesh.is_watertight
+    assert mesh.is_winding_consistent
+
+def test_synthetic_shapes_give_their_hints():
+    assert len(feature_hints.extract_planar_hints(make_mesh("box", 5000))) == 6
+    assert feature_hints.extract_planar_hints(make_mesh("scan", 5000)) == []
+    cylinders = feature_hints.extract_cylindrical_hints(make_mesh("cylinder", 5000))
+    assert [round(c["radius"]) for c in cylinders] == [10]
+
+def test_run_case_times_every_stage(tmp_path):
+    stl_path = str(tmp_path / "box.stl")
+    make_mesh("box", 1000).export(stl_path, file_type="stl")
+    case = bench_stages.run_case(stl_path, "faceted")
+    assert set(case["stages"]) == set(bench_stages.STAGES)
+    assert case["planar_hints"] == 6
+    assert case["step_mb"] > 0
+    assert list(tmp_path.iterdir()) == [tmp_path / "box.stl"]
+
+def _case(seconds, peak_mb, target=1000):
+    return {"shape": "box", "target_faces": target, "face_mode": "faceted",
+            "stages": {"index": {"seconds": seconds, "peak_mb": peak_mb}}}
+
+def test_compare_flags_only_real_regressions():
+    baseline = {"cases": [_case(1.0, 100.0)]}
+    thresholds = bench_stages.DEFAULT_THRESHOLDS
+    assert bench_stages.compare([_case(1.2, 110.0)], baseline, thresholds) == []
+    assert bench_stages.compare([_case(1.5, 100.0)], baseline, thresholds) == [
+        ("box/1000", "index", "seconds", 1.0, 1.5)]
+    assert bench_stages.compare([_case(1.0, 130.0)], baseline, thresholds) == [
+        ("box/1000", "index", "peak_mb", 100.0, 130.0)]
+    # Relative slowdowns below the absolute floors are noise
+    assert bench_stages.compare([_case(0.02, 1.0)], {"cases": [_case(0.01, 0.5)]}, thresholds) == []
+    # Cases without a baseline are not compared
+    assert bench_stages.compare([_case(9.0, 900.0, target=5)], baseline, thresholds) == []
@@ -0,0 +1,49 @@
+import gzip
+
+import pytest
+
+from src import compression
+
+# user-020: compressed STEP artifacts
+
+@pytest.mark.parametrize("name", ["converted.step.gz", "converted.stpz"])
+def test_gzip_round_trip_is_deterministic(tmp_path, name):
+    payload = b"ISO-10303-21;\n" + b"#1=CARTESIAN_POINT('',(0.,0.,0.));\n" * 5000
+    paths = [tmp_path / "a" / name, tmp_path / "b" / name]
+    for path in paths:
+        path.parent.mkdir()
+        with compression.open_writer(str(path)) as f:
+            f.write(payload)
+    assert paths[0].read_bytes() == paths[1].read_bytes()
+    assert gzip.decompress(paths[0].read_bytes()) == payload
+    assert b"".join(compression.iter_decoded(str(paths[0]), chunk_size=1000)) == payload
+    assert len(paths[0].read_bytes()) < len(payload) / 10
+
+def test_uncompressed_artifacts_pass_through(tmp_path):
+    path = tmp_path / "converted.step"
+    with compression.open_writer(str(path)) as f:
+        f.write(b"plain")
+    assert path.read_bytes() == b"plain"
+    assert compression.encoding_of(str(path)) == "identity"
+
+@pytest.mark.parametrize("header, encoding, expected", [
+    ("gzip, deflate, br", "gzip", True),
+    ("deflate", "gzip", False),
+    ("gzip;q=0", "gzip", False),
+    ("*", "zstd", True),
+    ("*, zstd;q=0", "zstd", False),
+    ("x-gzip", "gzip", True),
+    (None, "gzip", False),
+    (None, "identity", True),
+])
+def test_accept_encoding_negotiation(header, encoding, expected):
+    assert compression.accepts(header, encoding) is expected
+
+def test_artifact_names():
+    assert compression.artifact_suffix("gzip") == ".step.gz"
+    assert compression.decoded_name("/runs/x/converted.step.gz") == "converted.step"
+    with pytest.raises(ValueError):
+        compression.artifact_suffix("lzma")
+    if compression.zstandard is None:
+        with pytest.raises(ValueError):
+            compression.artifact_suffix("zstd")
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+import trimesh
+
+from src import feature_hints
+from src.mesh_index import MeshIndex
+
+def _stepped_block():
+    """Two stacked boxes: planes of several sizes, some with the same normal."""
+    base = trimesh.creation.box(extents=(40, 30, 10))
+    top = trimesh.creation.box(extents=(20, 10, 10))
+    top.apply_translation((5, 0, 10))
+    return trimesh.util.concatenate([base, top])
+
+# user-014: vectorized planar facets
+
+def test_box_gives_six_planes():
+    hints = feature_hints.extract_planar_hints(trimesh.creation.box(extents=(40, 30, 20)))
+    assert len(hints) == 6
+    assert [h["area"] for h in hints] == pytest.approx([1200, 1200, 800, 800, 600, 600])
+    top = next(h for h in hints if h["normal"] == pytest.approx([0, 0, 1]))
+    assert top["center"] == pytest.approx([0, 0, 10])
+    assert sorted([top["param_u"], top["param_v"]]) == pytest.approx([30, 40])
+    assert top["face_count"] == 2
+
+@pytest.mark.parametrize("mesh", [
+    _stepped_block(),
+    trimesh.creation.cylinder(radius=5, height=20, sections=24),
+    trimesh.creation.annulus(r_min=3, r_max=8, height=4, sections=16),
+])
+def test_vectorized_planes_match_the_python_loop(mesh):
+    assert feature_hints.extract_planar_hints(mesh) == feature_hints._extract_planar_hints_python(mesh)
+
+def test_planes_from_a_mesh_index_match_the_mesh():
+    mesh = _stepped_block()
+    index = MeshIndex.build(mesh)
+    assert feature_hints.extract_planar_hints(index) == feature_hints.extract_planar_hints(mesh)
+
+def test_small_facets_are_dropped():
+    hints = feature_hints.extract_planar_hints(_stepped_block(), min_area_fraction=0.1)
+    assert hints
+    assert all(h["area"] >= 0.1 * _stepped_block().area for h in hints)
+    assert feature_hints.extract_planar_hints(trimesh.creation.icosphere(2)) == []
+
+# user-015: RANSAC cylinder detection
+
+def _boss_on_plate():
+    plate = trimesh.creation.box(extents=(100, 100, 10))
+    boss = trimesh.creation.cylinder(radius=10, height=40, sections=32)
+    boss.apply_translation((0, 0, 25))
+    return trimesh.util.concatenate([plate, boss])
+
+def test_cylinder_is_detected():
+    hints = feature_hints.extract_cylindrical_hints(trimesh.creation.cylinder(radius=5, height=20, sections=32))
+    assert len(hints) == 1
+    assert hints[0]["radius"] == pytest.approx(5, rel=0.01)
+    assert hints[0]["height"] == pytest.approx(20, rel=0.01)
+    assert hints[0]["axis"] == pytest.approx([0, 0, 1], abs=1e-3)
+    assert hints[0]["convex"]
+
+@pytest.mark.parametrize("seed", range(5))
+def test_boss_on_a_plate_is_detected(seed):
+    hints = feature_hints.extract_cylindrical_hints(_boss_on_plate(), seed=seed)
+    assert len(hints) == 1
+    assert hints[0]["radius"] == pytest.approx(10, rel=0.01)
+    assert hints[0]["origin"] == pytest.approx([0, 0, 25], abs=0.05)
+
+def test_bore_is_a_hole():
+    ring = trimesh.creation.annulus(r_min=6, r_max=10, height=12, sections=64)
+    hints = feature_hints.extract_cylindrical_hints(ring)
+    assert sorted((round(h["radius"]), h["convex"]) for h in hints) == [(6, False), (10, True)]
+
+@pytest.mark.parametrize("mesh", [
+    trimesh.creation.icosphere(3),
+    trimesh.creation.uv_sphere(),
+    trimesh.creation.torus(major_radius=10, minor_radius=3),
+], ids=["icosphere", "uv_sphere", "torus"])
+def test_doubly_curved_surfaces_give_no_cylinders(mesh):
+    assert feature_hints.extract_cylindrical_hints(mesh, time_budget=1.0) == []
+
+def test_box_returns_without_using_the_budget():
+    box = trimesh.creation.box(extents=(40, 30, 20))
+    for _ in range(5):
+        box = box.subdivide()
+    index = MeshIndex.build(box)
+    start = time.perf_counter()
+    assert feature_hints.extract_cylindrical_hints(index, time_budget=10.0) == []
+    assert time.perf_counter() - start < 1.0
+
+def test_time_budget_is_respected():
+    index = MeshIndex.build(trimesh.creation.uv_sphere(count=[96, 96]))
+    index.center_tree
+    start = time.perf_counter()
+    feature_hints.extract_cylindrical_hints(index, time_budget=0.3)
+    assert time.perf_counter() - start < 0.8
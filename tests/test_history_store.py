@@ -0,0 +1,128 @@
+import json
+import multiprocessing
+
+import pytest
+
+from src.history_store import HistoryStore, parse_file_size
+
+def _record(session_id, date="2024-06-01", time="10:00", **fields):
+    return dict({"id": session_id, "fileName": f"{session_id}.stl", "date": date, "time": time,
+                 "status": "success", "fileSize": "1.0 MB"}, **fields)
+
+def _add_from_process(db_path, session_id):
+    HistoryStore(db_path).add(_record(session_id))
+
+# user-009: history in SQLite
+
+def test_add_get_and_list_newest_first(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    store.add(_record("a"))
+    store.add(_record("b"))
+    assert store.get("a")["fileName"] == "a.stl"
+    assert store.get("missing") is None
+    assert [r["id"] for r in store.list()] == ["b", "a"]
+    assert [r["id"] for r in store.list(limit=1)] == ["b"]
+    # Writing an existing session replaces it and moves it to the top
+    store.add(_record("a", status="failed"))
+    assert [r["id"] for r in store.list()] == ["a", "b"]
+    assert store.count() == 2
+
+def test_update_merges_fields_in_place(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    store.add(_record("a", explanationStatus="pending"))
+    store.add(_record("b"))
+    store.update("a", {"explanationStatus": "ready", "edgeFeatures": 12})
+    store.update("missing", {"status": "x"})
+    assert store.get("a")["explanationStatus"] == "ready"
+    assert store.get("a")["edgeFeatures"] == 12
+    assert [r["id"] for r in store.list()] == ["b", "a"]
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "history.json"
+    legacy.write_text(json.dumps([_record("new"), _record("old")]))
+    store = HistoryStore(str(tmp_path / "h.sqlite3"), legacy_json_path=str(legacy))
+    assert [r["id"] for r in store.list()] == ["new", "old"]
+    assert not legacy.exists()
+    assert (tmp_path / "history.json.migrated").exists()
+
+def test_writers_in_other_processes_share_the_store(tmp_path):
+    db_path = str(tmp_path / "h.sqlite3")
+    HistoryStore(db_path).add(_record("parent"))
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=_add_from_process, args=(db_path, f"child{i}")) for i in range(3)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+    assert HistoryStore(db_path).count() == 4
+
+@pytest.mark.parametrize("text, expected", [
+    ("1.5 MB", int(1.5 * 1024 ** 2)), ("200 KB", 200 * 1024), ("7B", 7), ("n/a", None), (None, None),
+])
+def test_parse_file_size(text, expected):
+    assert parse_file_size(text) == expected
+
+# user-010: paginated, filtered history
+
+def _paged_store(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    for i in range(7):
+        store.add(_record(f"s{i}", date=f"2024-06-0{i + 1}", fileSize=f"{(i * 3) % 7 + 1} KB",
+                          status="failed" if i % 3 == 0 else "success"))
+    return store
+
+def _all_pages(store, **kwargs):
+    ids, cursor = [], None
+    while True:
+        items, cursor = store.page(limit=3, cursor=cursor, **kwargs)
+        ids += [r["id"] for r in items]
+        if cursor is None:
+            return ids
+
+def test_page_walks_every_record_once(tmp_path):
+    store = _paged_store(tmp_path)
+    assert _all_pages(store) == [f"s{i}" for i in reversed(range(7))]
+    assert _all_pages(store, order="asc") == [f"s{i}" for i in range(7)]
+    by_size = _all_pages(store, sort="fileSize")
+    sizes = [parse_file_size(store.get(i)["fileSize"]) for i in by_size]
+    assert sorted(by_size) == sorted(f"s{i}" for i in range(7))
+    assert sizes == sorted(sizes, reverse=True)
+
+def test_page_filters(tmp_path):
+    store = _paged_store(tmp_path)
+    items, _ = store.page(date_from="2024-06-02", date_to="2024-06-04")
+    assert [r["id"] for r in items] == ["s3", "s2", "s1"]
+    items, _ = store.page(status="failed")
+    assert [r["id"] for r in items] == ["s6", "s3", "s0"]
+    items, _ = store.page(name="S5")
+    assert [r["id"] for r in items] == ["s5"]
+    # LIKE wildcards in the search text are literal
+    assert store.page(name="%")[0] == []
+
+@pytest.mark.parametrize("kwargs", [
+    {"sort": "name"}, {"order": "up"}, {"date_from": "June"}, {"cursor": "not-a-cursor"},
+])
+def test_page_rejects_bad_arguments(tmp_path, kwargs):
+    with pytest.raises(ValueError):
+        _paged_store(tmp_path).page(**kwargs)
+
+def test_cursor_is_tied_to_its_sort(tmp_path):
+    store = _paged_store(tmp_path)
+    _, cursor = store.page(limit=2)
+    with pytest.raises(ValueError):
+        store.page(limit=2, cursor=cursor, sort="fileSize")
+
+# user-012: version() follows every write, including in-place updates
+
+def test_version_changes_on_update(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite3"))
+    store.add(_record("a", explanationStatus="pending"))
+    before = store.version()
+    assert store.version() == before
+    store.update("a", {"explanationStatus": "ready"})
+    after_update = store.version()
+    assert after_update != before
+    store.update("missing", {"status": "x"})
+    assert store.version() == after_update
+    store.add(_record("a"))
+    assert store.version() != after_update
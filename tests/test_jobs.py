@@ -0,0 +1,102 @@
+import json
+
+import pytest
+
+from src.jobs import JobStore
+from src.sessions import KeyValueBackend, LocalKeyValue, SQLiteBackend
+from src import pipeline, server
+from tests.conftest import convert, make_stl, upload
+
+# user-008: /api/generate runs as a background job
+
+def test_job_lifecycle_and_worker_progress(tmp_path):
+    jobs = JobStore(str(tmp_path))
+    job = jobs.create("s1", trace_id="t1")
+    assert (job["status"], job["session_id"], job["trace_id"]) == ("queued", "s1", "t1")
+    jobs.update(job["id"], status="running", stage="build")
+    pipeline.write_progress(jobs.progress_path(job["id"]), "faces", 5, 10, "faces emitted 5/10")
+    assert jobs.get(job["id"])["progress"]["done"] == 5
+    jobs.update(job["id"], status="complete", result={"download_url": "/x"})
+    finished = jobs.get(job["id"])
+    assert finished["status"] == "complete" and finished["result"] == {"download_url": "/x"}
+    assert jobs.get("missing") is None
+
+def test_finished_jobs_are_trimmed_first(tmp_path):
+    jobs = JobStore(str(tmp_path), max_jobs=2)
+    done = jobs.create("s1")
+    jobs.update(done["id"], status="complete")
+    running = jobs.create("s2")
+    jobs.update(running["id"], status="running")
+    jobs.create("s3")
+    assert jobs.get(done["id"]) is None
+    assert jobs.get(running["id"])["status"] == "running"
+
+def test_generate_returns_a_job_that_completes(client, tmp_path):
+    session_id, job = convert(client, make_stl(tmp_path, scale=1.11))
+    assert job["status"] == "complete"
+    assert job["result"]["download_url"] == f"/api/download/{session_id}"
+    assert job["result"]["format"] == "faceted"
+    assert client.get(job["result"]["download_url"]).status_code == 200
+
+def test_job_events_stream_ends_with_the_explanation(client, tmp_path):
+    session_id = upload(client, make_stl(tmp_path, scale=1.12))["session_id"]
+    started = client.post(f"/api/generate/{session_id}").json()
+    events = []
+    with client.stream("GET", started["events_url"]) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        for line in response.iter_lines():
+            if line.startswith("event: "):
+                events.append(line[len("event: "):])
+            elif line.startswith("data: "):
+                last = json.loads(line[len("data: "):])
+    assert "complete" in events
+    assert last["status"] == "complete"
+    assert last["result"]["explanation_status"] == "ready"
+
+def test_generate_rejects_bad_requests(client, tmp_path):
+    assert client.post("/api/generate/no-such-session").status_code == 404
+    session_id = upload(client, make_stl(tmp_path, scale=1.13))["session_id"]
+    assert client.post(f"/api/generate/{session_id}?format=obj").status_code == 400
+    assert client.get("/api/jobs/no-such-job").status_code == 404
+    assert client.get("/api/jobs/no-such-job/events").status_code == 404
+
+# user-025: jobs shared between API processes
+
+def _shared_backends(kind, tmp_path):
+    """Two backends over one store, as two processes would open them."""
+    if kind == "sqlite":
+        db_path = str(tmp_path / "sessions.sqlite3")
+        return SQLiteBackend(db_path, table="jobs"), SQLiteBackend(db_path, table="jobs")
+    client = LocalKeyValue()
+    return KeyValueBackend(client, name="job"), KeyValueBackend(client, name="job")
+
+@pytest.mark.parametrize("kind", ["sqlite", "keyvalue"])
+def test_jobs_are_visible_to_every_store_on_a_shared_backend(kind, tmp_path):
+    first_backend, second_backend = _shared_backends(kind, tmp_path)
+    first = JobStore(str(tmp_path / "jobs"), max_jobs=2, backend=first_backend)
+    second = JobStore(str(tmp_path / "jobs"), max_jobs=2, backend=second_backend)
+    job = first.create("s1", trace_id="t1")
+    second.update(job["id"], status="running", stage="build")
+    pipeline.write_progress(first.progress_path(job["id"]), "faces", 5, 10, "faces emitted 5/10")
+    assert second.get(job["id"])["progress"]["done"] == 5
+    first.update(job["id"], status="complete", result={"download_url": "/x"})
+    assert second.get(job["id"])["result"] == {"download_url": "/x"}
+    # The running job of one store is not trimmed by the other
+    running = second.create("s2")
+    first.create("s3")
+    assert second.get(job["id"]) is None
+    assert first.get(running["id"])["status"] == "queued"
+    assert sorted(job["session_id"] for job in second.snapshot().values()) == ["s2", "s3"]
+
+def test_another_worker_answers_for_a_job(client, tmp_path, monkeypatch):
+    db_path = str(tmp_path / "sessions.sqlite3")
+    root = str(tmp_path / "jobs")
+    monkeypatch.setattr(server, "JOBS", JobStore(root, backend=SQLiteBackend(db_path, table="jobs")))
+    _, job = convert(client, make_stl(tmp_path, scale=1.20))
+    # A second process opens the same file
+    monkeypatch.setattr(server, "JOBS", JobStore(root, backend=SQLiteBackend(db_path, table="jobs")))
+    assert client.get(f"/api/jobs/{job['id']}").json()["status"] == "complete"
+    with client.stream("GET", f"/api/jobs/{job['id']}/events") as response:
+        assert response.status_code == 200
+        lines = list(response.iter_lines())
+    assert "event: complete" in lines
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from src import llm_client, metrics
+
+def _response(payload):
+    message = SimpleNamespace(content=json.dumps(payload))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+def _connection_error():
+    return openai.APIConnectionError(request=httpx.Request("POST", "http://llm.test"))
+
+class FakeCompletions:
+    """Answers create() from a script of responses and exceptions."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+
+    def _next(self, kwargs):
+        self.calls += 1
+        assert kwargs["response_format"] == {"type": "json_object"}
+        item = self.script.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+class FakeClient(FakeCompletions):
+    def __init__(self, script):
+        super().__init__(script)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kw: self._next(kw)))
+
+class FakeAsyncClient(FakeCompletions):
+    def __init__(self, script):
+        super().__init__(script)
+
+        async def create(**kwargs):
+            return self._next(kwargs)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+def _call(mode, prompt):
+    if mode == "sync":
+        return llm_client.call_llm(prompt)
+    return asyncio.run(llm_client.call_llm_async(prompt))
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path):
+    """Installs a scripted client for both transports; returns a setter."""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_MAX_RETRIES", "2")
+    monkeypatch.setenv("LLM_RETRY_BASE_DELAY", "0")
+    monkeypatch.setattr(llm_client, "RESPONSE_CACHE", llm_client.ResponseCache(str(tmp_path), 60))
+
+    def install(script):
+        sync_client, async_client = FakeClient(script), FakeAsyncClient(script)
+        monkeypatch.setattr(llm_client, "get_client", lambda: sync_client)
+        monkeypatch.setattr(llm_client, "get_async_client", lambda: async_client)
+        return sync_client, async_client
+    return install
+
+def _calls(result):
+    return metrics.LLM_CALLS.values.get((result,), 0)
+
+# user-011: shared client, retries and response cache
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_transient_errors_are_retried(llm, mode):
+    clients = llm([_connection_error(), _response({"detected_shape": "Bracket"})])
+    before = _calls("api")
+    assert _call(mode, "retry me") == ({"detected_shape": "Bracket"}, True)
+    assert clients[mode == "async"].calls == 2
+    assert _calls("api") == before + 1
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_exhausted_retries_fall_back(llm, mode):
+    clients = llm([_connection_error() for _ in range(3)])
+    before = _calls("failed")
+    strategy, from_api = _call(mode, "always down")
+    assert (strategy, from_api) == (llm_client.get_fallback_strategy(), False)
+    assert clients[mode == "async"].calls == 3
+    assert _calls("failed") == before + 1
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_final_errors_are_not_retried(llm, mode):
+    clients = llm([ValueError("bad request"), _response({})])
+    assert _call(mode, "bad") == (llm_client.get_fallback_strategy(), False)
+    assert clients[mode == "async"].calls == 1
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_responses_are_cached_by_prompt(llm, mode):
+    clients = llm([_response({"detected_shape": "Plate"})])
+    assert _call(mode, "cache me") == ({"detected_shape": "Plate"}, True)
+    before = _calls("cached")
+    assert _call(mode, "cache me") == ({"detected_shape": "Plate"}, True)
+    assert clients[mode == "async"].calls == 1
+    assert _calls("cached") == before + 1
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_missing_key_uses_fallback_without_a_request(llm, mode, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "")
+    clients = llm([])
+    assert _call(mode, "no key") == (llm_client.get_fallback_strategy(), False)
+    assert clients[mode == "async"].calls == 0
+
+def test_expired_cache_entries_are_dropped(tmp_path):
+    cache = llm_client.ResponseCache(str(tmp_path), 0.05)
+    cache.put("m", "p", {"a": 1})
+    assert cache.get("m", "p") == {"a": 1}
+    time.sleep(0.1)
+    assert cache.get("m", "p") is None
+    assert llm_client.ResponseCache(str(tmp_path), 0).get("m", "p") is None
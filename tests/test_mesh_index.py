@@ -0,0 +1,64 @@
+import pickle
+
+import numpy as np
+import pytest
+import trimesh
+
+from src import feature_hints, mesh_stats, pipeline
+from src.mesh_index import MeshIndex, as_index, has_arrays, has_index, load_arrays
+
+# user-005: generate memory-maps the arrays parsed at upload
+
+def test_saved_arrays_are_memory_mapped(box_mesh, tmp_path):
+    MeshIndex.build(box_mesh).save(str(tmp_path))
+    assert has_arrays(str(tmp_path))
+    vertices, faces = load_arrays(str(tmp_path))
+    assert isinstance(vertices, np.memmap)
+    assert np.array_equal(faces, box_mesh.faces)
+
+def test_load_mesh_prefers_saved_arrays_over_the_stl(box_mesh, tmp_path):
+    MeshIndex.build(box_mesh).save(str(tmp_path))
+    mesh = pipeline.load_mesh(str(tmp_path / "deleted.stl"), str(tmp_path))
+    assert len(mesh.faces) == 12
+    assert pipeline.load_mesh(str(tmp_path / "deleted.stl"), str(tmp_path / "empty")) is None
+
+# user-016: one shared MeshIndex per mesh
+
+def test_index_matches_trimesh(box_mesh):
+    index = MeshIndex.build(box_mesh)
+    assert index.area == pytest.approx(box_mesh.area)
+    assert np.allclose(index.face_normals, box_mesh.face_normals)
+    assert np.allclose(index.face_centers, box_mesh.triangles_center)
+    assert index.num_facets == len(box_mesh.facets)
+    assert (index.facet_labels >= 0).all()
+    assert index.volume == pytest.approx(box_mesh.volume)
+    assert as_index(index) is index
+
+def test_save_and_load_round_trip(tmp_path):
+    mesh = trimesh.creation.cylinder(radius=5, height=20, sections=24)
+    index = MeshIndex.build(mesh)
+    assert not has_index(str(tmp_path))
+    index.save(str(tmp_path))
+    assert has_index(str(tmp_path))
+    loaded = MeshIndex.load(str(tmp_path))
+    assert isinstance(loaded.faces, np.memmap)
+    assert np.array_equal(loaded.facet_faces, index.facet_faces)
+    assert loaded.bounds.tolist() == index.bounds.tolist()
+    # Every stage gives the same answer from the loaded index as from the mesh
+    assert feature_hints.extract_planar_hints(loaded) == feature_hints.extract_planar_hints(mesh)
+    assert feature_hints.extract_cylindrical_hints(loaded) == feature_hints.extract_cylindrical_hints(mesh)
+    assert mesh_stats.compute_mesh_stats(loaded) == mesh_stats.compute_mesh_stats(mesh)
+
+def test_pickle_drops_the_tree(box_mesh):
+    index = MeshIndex.build(box_mesh)
+    index.center_tree
+    clone = pickle.loads(pickle.dumps(index))
+    assert clone._center_tree is None
+    assert clone.center_tree.query(index.face_centers[0])[1] == 0
+
+def test_normal_band_matches_a_full_scan():
+    index = MeshIndex.build(trimesh.creation.icosphere(3))
+    axis = np.array([0.3, -0.4, 0.866])
+    axis /= np.linalg.norm(axis)
+    expected = np.flatnonzero(np.abs(index.face_normals @ axis) < 0.1)
+    assert np.array_equal(index.faces_in_normal_band(axis, 0.1), expected)
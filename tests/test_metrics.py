@@ -0,0 +1,90 @@
+import pytest
+
+from src import metrics, tracing
+from tests.conftest import make_stl
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_registry", [])
+
+# user-023: Prometheus metrics and per-request traces
+
+def test_render_text_format(registry):
+    counter = metrics.Counter("demo_total", "Things done", ("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind='say "hi"\n')
+    gauge = metrics.Gauge("demo_bytes", "A size")
+    gauge.set(1.5)
+    histogram = metrics.Histogram("demo_seconds", "A duration", buckets=(0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(5)
+    metrics.Sampled("demo_sampled", "Read on render", "gauge", lambda: {("x",): 3}, ("name",))
+    assert metrics.render().splitlines() == [
+        "# HELP demo_total Things done",
+        "# TYPE demo_total counter",
+        'demo_total{kind="a"} 1',
+        'demo_total{kind="say \\"hi\\"\\n"} 2',
+        "# HELP demo_bytes A size",
+        "# TYPE demo_bytes gauge",
+        "demo_bytes 1.5",
+        "# HELP demo_seconds A duration",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{le="0.1"} 1',
+        'demo_seconds_bucket{le="1"} 1',
+        'demo_seconds_bucket{le="+Inf"} 2',
+        "demo_seconds_sum 5.05",
+        "demo_seconds_count 2",
+        "# HELP demo_sampled Read on render",
+        "# TYPE demo_sampled gauge",
+        'demo_sampled{name="x"} 3',
+    ]
+
+def test_labels_are_checked_and_failing_samples_skipped(registry):
+    counter = metrics.Counter("demo_total", "Things", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc(other="x")
+    metrics.Sampled("broken", "Fails", "gauge", lambda: 1 / 0)
+    assert "broken" not in metrics.render()
+
+def test_spans_are_collected_and_timed(registry):
+    def stage():
+        with tracing.span("inner", faces=3) as attrs:
+            attrs["extra"] = True
+        return "done"
+    result, spans = tracing.run_collected(stage, (), {})
+    assert result == "done"
+    assert [s["name"] for s in spans] == ["inner", "stage"]
+    assert spans[0]["attrs"] == {"faces": 3, "extra": True}
+    with pytest.raises(ZeroDivisionError):
+        tracing.run_collected(lambda: 1 / 0, (), {})
+
+def test_trace_store_is_bounded():
+    store = tracing.TraceStore(max_traces=2, max_spans=3)
+    for trace_id in ("a", "b", "c"):
+        store.add(trace_id, [tracing.make_span(f"s{i}", start=10 - i, seconds=0) for i in range(5)])
+    assert store.get("a") is None
+    spans = store.get("c")["spans"]
+    assert [s["name"] for s in spans] == ["s2", "s1", "s0"]
+
+@pytest.mark.parametrize("value, expected", [
+    ("abc-123_x.y", "abc-123_x.y"), ("bad id", None), ("x" * 65, None), (None, None),
+])
+def test_clean_trace_id(value, expected):
+    assert tracing.clean_trace_id(value) == expected
+
+def test_requests_carry_traces_and_metrics(client, tmp_path):
+    with open(make_stl(tmp_path, scale=1.18), "rb") as f:
+        response = client.post("/api/upload", files={"file": ("t.stl", f)},
+                               headers={tracing.TRACE_HEADER: "trace-upload-1"})
+    assert response.headers[tracing.TRACE_HEADER] == "trace-upload-1"
+    assert response.json()["trace_id"] == "trace-upload-1"
+    trace = client.get("/api/traces/trace-upload-1").json()
+    assert "analyze_mesh" in [s["name"] for s in trace["spans"]]
+    assert client.get("/api/traces/unknown").status_code == 404
+    # A bad client ID is replaced, not echoed
+    assert client.get("/api/history", headers={tracing.TRACE_HEADER: "no spaces"}).headers[
+        tracing.TRACE_HEADER] != "no spaces"
+    page = client.get("/api/metrics")
+    assert page.headers["content-type"] == metrics.CONTENT_TYPE
+    assert 'stl2step_http_requests_total{method="POST",route="/api/upload",status="200"}' in page.text
+    assert 'stl2step_stage_seconds_count{stage="analyze_mesh"}' in page.text
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+import trimesh
+
+from src import feature_hints, mesh_stats, prompt_builder
+
+def _features(plane_count=60):
+    """A box's real hints plus many small synthetic planes."""
+    box = trimesh.creation.box(extents=(40, 30, 20))
+    planes = feature_hints.extract_planar_hints(box)
+    for i in range(plane_count):
+        planes.append({"type": "plane", "normal": [0.0, 0.6, 0.8], "area": 1.0 + i * 0.123456789,
+                       "center": [i * 0.333333, 1.0, 2.0], "param_u": 1.0, "param_v": 1.0,
+                       "x_axis": [1.0, 0.0, 0.0], "y_axis": [0.0, 0.8, -0.6], "face_count": 2})
+    cylinder = trimesh.creation.cylinder(radius=5, height=20, sections=32)
+    return mesh_stats.compute_mesh_stats(box), {
+        "planar": planes,
+        "cylindrical": feature_hints.extract_cylindrical_hints(cylinder),
+    }
+
+def _data(prompt):
+    """The JSON block of a compact prompt."""
+    start = prompt.index("{")
+    return json.JSONDecoder().raw_decode(prompt[start:])[0]
+
+# user-013: compact prompt under a token budget
+
+def test_compact_prompt_is_smaller_than_full():
+    stats, features = _features()
+    full = prompt_builder.build_structured_prompt(stats, features, {"mode": "full"})
+    compact = prompt_builder.build_structured_prompt(stats, features, {"mode": "compact", "token_budget": 100000})
+    assert prompt_builder.count_tokens(compact) < prompt_builder.count_tokens(full) / 2
+
+def test_compact_prompt_lists_largest_planes_first():
+    stats, features = _features()
+    data = _data(prompt_builder.build_compact_prompt(stats, features, token_budget=100000, top_k=4))
+    assert data["planes"]["area"] == sorted(data["planes"]["area"], reverse=True)
+    assert len(data["planes"]["area"]) == 4
+    assert data["planes_tail"]["count"] == len(features["planar"]) - 4
+    assert len(data["cylinders"]) == 1
+
+@pytest.mark.parametrize("budget", [430, 500, 900])
+def test_compact_prompt_fits_the_budget(budget):
+    stats, features = _features()
+    prompt = prompt_builder.build_compact_prompt(stats, features, token_budget=budget)
+    assert prompt_builder.count_tokens(prompt) <= budget
+
+def test_tighter_budget_lists_fewer_planes():
+    stats, features = _features()
+    loose = _data(prompt_builder.build_compact_prompt(stats, features, token_budget=2000))
+    tight = _data(prompt_builder.build_compact_prompt(stats, features, token_budget=500))
+    assert len(tight["planes"]["area"]) < len(loose["planes"]["area"])
+
+def test_impossible_budget_raises():
+    stats, features = _features()
+    with pytest.raises(ValueError):
+        prompt_builder.build_compact_prompt(stats, features, token_budget=10)
@@ -0,0 +1,61 @@
+import os
+
+from src.result_cache import ResultCache
+
+# user-006: content-addressed result cache
+
+def test_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    analysis = {"version": 1, "stats": {"num_faces": 12}, "planar_hints": [], "cylindrical_hints": []}
+    cache.put_analysis("h1", analysis)
+    cache.put_strategy("h1", {"detected_shape": "Box"})
+    assert cache.get_analysis("h1") == analysis
+    assert cache.get_strategy("h1") == {"detected_shape": "Box"}
+    assert cache.get_strategy("h2") is None
+    assert cache.get_analysis(None) is None
+    assert (cache.hits, cache.misses) == (2, 2)
+
+def test_generation_needs_its_step_file(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    step_path = run_dir / "converted.step"
+    step_path.write_text("ISO-10303-21;")
+    generation = {"step_path": str(step_path), "explanation_path": str(run_dir / "explanation.md")}
+    cache.put_generation("h1", "faceted-intern0", generation)
+    # The explanation is still being written
+    assert cache.get_generation("h1", "faceted-intern0")["report"] is None
+    (run_dir / "explanation.md").write_text("report")
+    assert cache.get_generation("h1", "faceted-intern0")["report"] == "report"
+    assert cache.get_generation("h1", "merged-intern0") is None
+    os.remove(step_path)
+    assert cache.get_generation("h1", "faceted-intern0") is None
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path), max_entries=2)
+    cache.put_strategy("a", {})
+    cache.put_strategy("b", {})
+    cache.get_strategy("a")
+    cache.put_strategy("c", {})
+    assert sorted(os.listdir(tmp_path)) == ["a", "c"]
+    assert cache.evictions == 1
+
+def test_byte_budget_is_enforced(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=300)
+    for name in "abc":
+        cache.put_strategy(name, {"text": "x" * 100})
+    assert sorted(os.listdir(tmp_path)) == ["b", "c"]
+    assert cache.total_bytes <= 300
+
+def test_puts_do_not_rescan_the_cache(tmp_path, monkeypatch):
+    ResultCache(str(tmp_path)).put_strategy("old", {})
+    cache = ResultCache(str(tmp_path), max_entries=2)
+    cache.put_strategy("a", {})
+    assert list(cache.index) == ["old", "a"]
+
+    def no_listing(path):
+        raise AssertionError("cache directory listed again")
+    monkeypatch.setattr(os, "listdir", no_listing)
+    cache.put_strategy("b", {})
+    assert list(cache.index) == ["a", "b"]
+    assert not os.path.exists(tmp_path / "old")
@@ -0,0 +1,205 @@
+import os
+import gzip
+import time
+import asyncio
+import threading
+
+from src import config, llm_client, server, storage
+from src.history_store import HistoryStore
+from tests.conftest import convert, make_stl, upload, wait_for_job
+
+def _step_text(session_id):
+    with open(server.SESSIONS.get(session_id)["step_path"]) as f:
+        return f.read()
+
+def _cached_strategy_path(stl_path):
+    return os.path.join(config.get_result_cache_dir(), storage.hash_file(stl_path), "strategy.json")
+
+# user-006: repeated uploads reuse cached results
+
+def test_fallback_strategy_is_not_cached(client, tmp_path):
+    stl_path = make_stl(tmp_path, scale=1.06)
+    first, job = convert(client, stl_path)
+    assert job["result"]["explanation_status"] == "ready"
+    assert not os.path.exists(_cached_strategy_path(stl_path))
+    second, _ = convert(client, stl_path, format="merged")
+    # The product name does not flip to the fallback's on the next run
+    assert "PRODUCT('Converted Model'" in _step_text(first)
+    assert "PRODUCT('Converted Model'" in _step_text(second)
+
+def test_api_strategy_is_cached_and_reused(client, tmp_path, monkeypatch):
+    calls = []
+    async def fake_llm(prompt):
+        calls.append(prompt)
+        return {"detected_shape": "Bracket", "assumptions": []}, True
+    monkeypatch.setattr(llm_client, "call_llm_async", fake_llm)
+    stl_path = make_stl(tmp_path, scale=1.07)
+    convert(client, stl_path)
+    assert os.path.exists(_cached_strategy_path(stl_path))
+    second, _ = convert(client, stl_path, format="merged")
+    assert len(calls) == 1
+    assert "PRODUCT('Bracket'" in _step_text(second)
+
+def test_repeated_upload_reuses_analysis_and_artifacts(client, tmp_path):
+    stl_path = make_stl(tmp_path, scale=1.08)
+    first, _ = convert(client, stl_path)
+    assert upload(client, stl_path)["cached"] is True
+    second, _ = convert(client, stl_path)
+    assert server.SESSIONS.get(second)["step_path"] == server.SESSIONS.get(first)["step_path"]
+
+# user-010: paginated history endpoint
+
+def _history_store(tmp_path, monkeypatch, count=5):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"))
+    for i in range(count):
+        store.add({"id": f"h{i}", "fileName": f"part{i}.stl", "date": f"2024-05-0{i + 1}",
+                   "time": "09:00", "status": "success", "fileSize": "1 KB"})
+    monkeypatch.setattr(server, "HISTORY", store)
+    return store
+
+def test_history_pages_with_cursor(client, tmp_path, monkeypatch):
+    _history_store(tmp_path, monkeypatch)
+    first = client.get("/api/history", params={"limit": 2}).json()
+    assert [r["id"] for r in first["items"]] == ["h4", "h3"]
+    second = client.get("/api/history", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    assert [r["id"] for r in second["items"]] == ["h2", "h1"]
+    filtered = client.get("/api/history", params={"q": "part0", "order": "asc"}).json()
+    assert [r["id"] for r in filtered["items"]] == ["h0"]
+    assert filtered["next_cursor"] is None
+
+def test_history_rejects_bad_queries(client, tmp_path, monkeypatch):
+    _history_store(tmp_path, monkeypatch)
+    assert client.get("/api/history", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/api/history", params={"sort": "color"}).status_code == 400
+    assert client.get("/api/history", params={"limit": 0}).status_code == 422
+
+def test_history_etag_answers_304_until_a_write(client, tmp_path, monkeypatch):
+    store = _history_store(tmp_path, monkeypatch)
+    response = client.get("/api/history")
+    etag = response.headers["etag"]
+    assert client.get("/api/history", headers={"If-None-Match": etag}).status_code == 304
+    # Another query has its own tag
+    assert client.get("/api/history", params={"limit": 1}).headers["etag"] != etag
+    store.add({"id": "h9", "fileName": "new.stl", "date": "2024-05-09", "time": "09:00"})
+    assert client.get("/api/history", headers={"If-None-Match": etag}).status_code == 200
+
+def test_history_etag_is_compared_as_a_whole_tag(client, tmp_path, monkeypatch):
+    _history_store(tmp_path, monkeypatch)
+    etag = client.get("/api/history").headers["etag"]
+    # A header that merely contains the tag is not a match
+    assert client.get("/api/history", headers={"If-None-Match": "v1" + etag}).status_code == 200
+    for header in (f'"other", {etag}', f"W/{etag}", "*"):
+        assert client.get("/api/history", headers={"If-None-Match": header}).status_code == 304
+
+def test_history_etag_changes_when_a_record_is_updated(client, tmp_path, monkeypatch):
+    store = _history_store(tmp_path, monkeypatch)
+    etag = client.get("/api/history").headers["etag"]
+    store.update("h0", {"explanationStatus": "ready"})
+    response = client.get("/api/history", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+class OffLoopHistory:
+    """Wraps a HistoryStore and records calls made on an event loop thread."""
+
+    def __init__(self, store):
+        self.store = store
+        self.on_loop = []
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        def call(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                self.on_loop.append(name)
+            except RuntimeError:
+                pass
+            return method(*args, **kwargs)
+        return call
+
+# user-009: history SQLite calls stay off the event loop
+
+def test_history_calls_run_off_the_event_loop(client, tmp_path, monkeypatch):
+    history = OffLoopHistory(_history_store(tmp_path, monkeypatch))
+    monkeypatch.setattr(server, "HISTORY", history)
+    session_id, job = convert(client, make_stl(tmp_path, scale=1.21))
+    assert job["result"]["explanation_status"] == "ready"
+    assert client.get("/api/history").status_code == 200
+    assert client.get(f"/api/session/{session_id}").status_code == 200
+    assert history.store.get(session_id)["explanationStatus"] == "ready"
+    assert history.on_loop == []
+
+# user-012: the STEP file is delivered before the explanation
+
+def test_step_is_ready_before_the_explanation(client, tmp_path, monkeypatch):
+    release = threading.Event()
+    async def slow_llm(prompt):
+        await asyncio.to_thread(release.wait, 30)
+        return llm_client.get_fallback_strategy(), False
+    monkeypatch.setattr(llm_client, "call_llm_async", slow_llm)
+    session_id = upload(client, make_stl(tmp_path, scale=1.14))["session_id"]
+    job_id = client.post(f"/api/generate/{session_id}").json()["job_id"]
+    deadline = time.monotonic() + 30
+    job = client.get(f"/api/jobs/{job_id}").json()
+    while job["status"] != "complete" and time.monotonic() < deadline:
+        time.sleep(0.05)
+        job = client.get(f"/api/jobs/{job_id}").json()
+    try:
+        assert job["result"]["explanation_status"] == "pending"
+        assert client.get(job["result"]["download_url"]).status_code == 200
+    finally:
+        release.set()
+    assert wait_for_job(client, job_id)["result"]["explanation_status"] == "ready"
+
+# user-020: compressed artifacts and resumable downloads
+
+def test_gzip_artifact_is_sent_as_stored(client, tmp_path, monkeypatch):
+    monkeypatch.setenv("STEP_COMPRESSION", "gzip")
+    session_id, job = convert(client, make_stl(tmp_path, scale=1.15))
+    step_path = server.SESSIONS.get(session_id)["step_path"]
+    assert step_path.endswith(".step.gz")
+    url = job["result"]["download_url"]
+    
+    encoded = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert encoded.headers["content-encoding"] == "gzip"
+    assert int(encoded.headers["content-length"]) == os.path.getsize(step_path)
+    assert encoded.content.startswith(b"ISO-10303-21;")
+    
+    plain = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.content == encoded.content
+    assert plain.headers["etag"] != encoded.headers["etag"]
+    
+    stpz = client.get(url, params={"variant": "stpz"}, headers={"Accept-Encoding": "identity"})
+    assert stpz.headers["content-type"] == "application/gzip"
+    assert 'filename="converted.stpz"' in stpz.headers["content-disposition"]
+    assert gzip.decompress(stpz.content) == plain.content
+
+def test_download_supports_etag_and_range(client, tmp_path, monkeypatch):
+    monkeypatch.setenv("STEP_COMPRESSION", "none")
+    session_id, job = convert(client, make_stl(tmp_path, scale=1.16))
+    url = job["result"]["download_url"]
+    full = client.get(url)
+    etag = full.headers["etag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    
+    part = client.get(url, headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206
+    assert part.content == full.content[100:200]
+    # A stale If-Range validator gets the whole file again
+    stale = client.get(url, headers={"Range": "bytes=100-199", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == full.content
+    assert client.get(url, params={"variant": "stpz"}).status_code == 404
+    assert client.get(url, params={"variant": "zip"}).status_code == 400
+
+def test_cached_generation_follows_the_compression_setting(client, tmp_path, monkeypatch):
+    stl_path = make_stl(tmp_path, scale=1.17)
+    monkeypatch.setenv("STEP_COMPRESSION", "none")
+    first, _ = convert(client, stl_path)
+    monkeypatch.setenv("STEP_COMPRESSION", "gzip")
+    second, job = convert(client, stl_path)
+    assert server.SESSIONS.get(first)["step_path"].endswith(".step")
+    assert server.SESSIONS.get(second)["step_path"].endswith(".step.gz")
+    assert job["result"]["cached"] is False
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import server, sessions, storage
+from src.sessions import KeyValueBackend, LocalKeyValue, MemoryBackend, SQLiteBackend, SessionStore
+from tests.conftest import make_stl, upload
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions, "time", SimpleNamespace(time=clock.time))
+    return clock
+
+BACKENDS = {
+    "memory": lambda tmp_path: MemoryBackend(),
+    "sqlite": lambda tmp_path: SQLiteBackend(str(tmp_path / "sessions.sqlite3")),
+    "keyvalue": lambda tmp_path: KeyValueBackend(LocalKeyValue()),
+}
+
+@pytest.fixture(params=sorted(BACKENDS))
+def make_store(request, tmp_path):
+    """Builds a store on each backend in turn; returns (store, removed)."""
+    def make(ttl=60, max_sessions=100):
+        removed = []
+        store = SessionStore(ttl, max_sessions, on_remove=lambda sid, data, reason: removed.append((sid, reason)),
+                             backend=BACKENDS[request.param](tmp_path))
+        return store, removed
+    return make
+
+# user-024: session TTL, the sweeper and the disk quota
+
+def test_sessions_expire_after_ttl_since_last_use(clock, make_store):
+    store, removed = make_store(ttl=60)
+    store.create("a", {"n": 1})
+    store.create("b", {"n": 2})
+    clock.now += 40
+    assert store.get("a") == {"n": 1}
+    clock.now += 40
+    assert store.expire() == 1
+    assert removed == [("b", "ttl")]
+    assert "a" in store and "b" not in store
+
+def test_oldest_sessions_are_dropped_beyond_max_count(clock, make_store):
+    store, removed = make_store(max_sessions=2)
+    for sid in ("a", "b"):
+        store.create(sid, {})
+        clock.now += 1
+    store.update("a", seen=True)
+    store.create("c", {})
+    assert removed == [("b", "max_count")]
+    assert sorted(store.ids()) == ["a", "c"]
+    assert store.get("a") == {"seen": True}
+
+def test_held_sessions_survive_until_released(clock, make_store):
+    store, removed = make_store(ttl=60, max_sessions=1)
+    store.create("a", {})
+    assert store.acquire("a")
+    clock.now += 100
+    store.create("b", {})
+    assert store.expire() == 0
+    assert "a" in store
+    store.release("a")
+    # The TTL restarts on release
+    clock.now += 30
+    assert store.expire() == 0
+    clock.now += 40
+    store.expire()
+    assert ("a", "ttl") in removed
+    assert not store.acquire("a")
+
+def test_a_hold_left_by_a_dead_process_lapses(clock, make_store):
+    store, removed = make_store(ttl=60)
+    store.create("a", {})
+    store.acquire("a")
+    clock.now += 100
+    assert store.expire() == 0
+    clock.now += 30
+    assert store.expire() == 1
+    assert removed == [("a", "ttl")]
+
+# user-025: shared backends
+
+def test_touch_does_not_bring_back_a_dropped_session(clock):
+    client = LocalKeyValue()
+    first, second = KeyValueBackend(client), KeyValueBackend(client)
+    first.put("a", {"n": 1}, clock.now)
+    assert second.get("a", clock.now) == {"n": 1}
+    assert second.pop_excess(0) == [("a", {"n": 1})]
+    # A process that still knows the session neither reads nor re-adds it
+    assert first.get("a", clock.now + 1) is None
+    first.update("a", {"n": 2}, clock.now + 1)
+    assert not first.acquire("a", clock.now + 1)
+    assert first.count() == 0
+    assert client.hgetall("stl2step:session:a") == {}
+
+def test_local_key_value_zadd_follows_redis():
+    client = LocalKeyValue()
+    assert client.zadd("z", {"a": 1}, xx=True) == 0
+    assert client.zcard("z") == 0
+    assert client.zadd("z", {"a": 1, "b": 2}) == 2
+    assert client.zadd("z", {"a": 5, "c": 3}) == 1
+    assert client.zadd("z", {"a": 6, "b": 2, "d": 4}, xx=True, ch=True) == 1
+    assert client.zrange("z", 0, -1) == ["b", "c", "a"]
+    assert client.zscore("z", "a") == 6.0
+
+def test_session_kinds_share_a_file_apart(tmp_path, clock):
+    db_path = str(tmp_path / "shared.sqlite3")
+    sessions_backend, jobs_backend = SQLiteBackend(db_path), SQLiteBackend(db_path, table="jobs")
+    sessions_backend.put("a", {"kind": "session"}, clock.now)
+    jobs_backend.put("a", {"kind": "job"}, clock.now)
+    assert sessions_backend.get("a", clock.now) == {"kind": "session"}
+    assert jobs_backend.get("a", clock.now) == {"kind": "job"}
+    assert SQLiteBackend(db_path, table="jobs").count() == 1
+
+def _run_folder(root, name, size, age):
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, "converted.step"), "wb") as f:
+        f.write(b"x" * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+def test_reclaim_space_removes_least_recently_used_runs(tmp_path):
+    root = str(tmp_path)
+    old = _run_folder(root, "old" + storage.RUN_SUFFIX, 1000, age=300)
+    kept = _run_folder(root, "kept" + storage.RUN_SUFFIX, 1000, age=200)
+    mid = _run_folder(root, "mid" + storage.RUN_SUFFIX, 1000, age=100)
+    new = _run_folder(root, "new" + storage.RUN_SUFFIX, 1000, age=0)
+    # Only <id>_run folders are candidates
+    _run_folder(root, "llm_cache", 1000, age=400)
+    # A download marks its run as recently used
+    storage.touch_run(os.path.join(old, "converted.step"))
+    usage, removed = storage.reclaim_space(4000, protected=[kept], root=root)
+    assert removed == [(mid, 1000)]
+    assert usage == 4000
+    assert all(os.path.exists(p) for p in (old, kept, new))
+    assert storage.reclaim_space(10 ** 6, root=root)[1] == []
+
+def test_sweep_deletes_expired_and_orphaned_temp_folders(client, tmp_path, monkeypatch):
+    session_id = upload(client, make_stl(tmp_path, scale=1.19))["session_id"]
+    temp_dir = server._session_temp_dir(session_id)
+    orphan = server._session_temp_dir("orphan")
+    os.makedirs(orphan)
+    stamp = time.time() - 10 * server.config.get_session_ttl()
+    os.utime(orphan, (stamp, stamp))
+    assert os.path.isdir(temp_dir)
+    monkeypatch.setattr(server.SESSIONS, "ttl", -1)
+    asyncio.run(server.sweep())
+    assert server.SESSIONS.get(session_id) is None
+    assert not os.path.exists(temp_dir)
+    assert not os.path.exists(orphan)
@@ -0,0 +1,227 @@
+import io
+import collections
+import os
+import re
+
+import pytest
+import trimesh
+
+from src import config, pipeline, step_builder
+from src.mesh_index import MeshIndex
+from src.step_builder import StepBuilder
+from tests.conftest import strip_header_time, write_stl
+
+def _entities(builder_call, **kwargs):
+    builder = StepBuilder(**kwargs)
+    builder_call(builder)
+    return builder.entities
+
+# user-001: batched FACETED_BREP emission
+
+@pytest.mark.parametrize("mesh_name", ["box_mesh", "random_mesh"])
+def test_batched_mesh_solid_matches_per_face_reference(mesh_name, request):
+    mesh = request.getfixturevalue(mesh_name)
+    batched = _entities(lambda b: b.add_mesh_solid(mesh.vertices, mesh.faces), intern=False)
+    reference = _entities(lambda b: b._add_mesh_solid_python(mesh.vertices, mesh.faces), intern=False)
+    assert "\n".join(batched) == "\n".join(reference)
+
+def test_batched_mesh_solid_across_chunks(random_mesh, monkeypatch):
+    monkeypatch.setattr(step_builder, "MESH_CHUNK_FACES", 7)
+    batched = _entities(lambda b: b.add_mesh_solid(random_mesh.vertices, random_mesh.faces), intern=False)
+    reference = _entities(lambda b: b._add_mesh_solid_python(random_mesh.vertices, random_mesh.faces),
+                          intern=False)
+    assert "\n".join(batched) == "\n".join(reference)
+
+def test_ragged_faces_use_the_reference_path():
+    vertices = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)]
+    faces = [[0, 1, 2, 3], [0, 1, 2]]
+    builder = StepBuilder()
+    builder.add_mesh_solid(vertices, faces)
+    text = "\n".join(builder.entities)
+    assert text.count("FACE_SURFACE(") == 2
+    assert "POLY_LOOP('',(#1,#2,#3,#4))" in text
+
+# user-002: streaming writer
+
+def _streamed_and_buffered(mesh, **kwargs):
+    stream = io.BytesIO()
+    streamed = StepBuilder(stream=stream, **kwargs)
+    streamed.add_mesh_solid(mesh.vertices, mesh.faces)
+    written = streamed.generate_step_from_strategy({"entities": [], "assumptions": []})
+    buffered = StepBuilder(**kwargs)
+    buffered.add_mesh_solid(mesh.vertices, mesh.faces)
+    text = buffered.generate_step_from_strategy({"entities": [], "assumptions": []})
+    return stream.getvalue(), written, text
+
+def test_streamed_output_matches_buffered(box_mesh):
+    data, written, text = _streamed_and_buffered(box_mesh)
+    assert written == len(data)
+    assert strip_header_time(data.decode("utf-8")) == strip_header_time(text)
+    assert data.decode("utf-8").endswith("END-ISO-10303-21;")
+
+def test_streaming_keeps_no_entities(box_mesh):
+    builder = StepBuilder(stream=io.BytesIO())
+    builder.add_mesh_solid(box_mesh.vertices, box_mesh.faces)
+    assert builder.entities == []
+
+def test_build_step_streams_to_file(box_mesh, tmp_path):
+    stl_path = write_stl(box_mesh, str(tmp_path / "box.stl"))
+    step_path = str(tmp_path / "run" / "converted.step")
+    os.makedirs(os.path.dirname(step_path))
+    result = pipeline.build_step(step_path, {"detected_shape": "Box"}, stl_path)
+    assert result["num_faces"] == 12
+    assert result["step_bytes"] == result["stored_bytes"] == os.path.getsize(step_path)
+    with open(step_path) as f:
+        text = f.read()
+    assert text.count("FACE_SURFACE(") == 12
+    assert "PRODUCT('Box','Box'" in text
+
+# user-003: entity interning
+
+def test_interning_is_opt_in(monkeypatch):
+    monkeypatch.delenv("STEP_INTERN", raising=False)
+    assert config.get_step_intern_enabled() is False
+    monkeypatch.setenv("STEP_INTERN", "1")
+    assert config.get_step_intern_enabled() is True
+    assert StepBuilder().intern_stats()["enabled"] is False
+
+def test_interning_shares_entities_and_keeps_references_valid(box_mesh):
+    plain = _entities(lambda b: b.add_mesh_solid(box_mesh.vertices, box_mesh.faces), intern=False)
+    interned_builder = StepBuilder(intern=True)
+    interned_builder.add_mesh_solid(box_mesh.vertices, box_mesh.faces)
+    interned = interned_builder.entities
+    text = "\n".join(interned)
+    defined = set(re.findall(r"^#(\d+)=", text, re.MULTILINE))
+    referenced = set(re.findall(r"#(\d+)(?!=)", text))
+    assert referenced <= defined
+    assert text.count("FACE_SURFACE(") == 12
+    # Every distinct direction is written once, shared by the faces using it
+    directions = re.findall(r"=DIRECTION\('',\(([^)]*)\)\)", text)
+    assert len(directions) == len(set(directions)) < 12
+    assert len(text.splitlines()) < len("\n".join(plain).splitlines())
+    assert interned_builder.intern_stats()["hits"] > 0
+
+def test_intern_hits_count_table_lookups_only():
+    mesh = trimesh.creation.icosphere(subdivisions=2)
+    builder = StepBuilder(intern=True)
+    builder.add_mesh_solid(mesh.vertices, mesh.faces)
+    stats = builder.intern_stats()
+    # Distinct vertices and normals: no lookup finds an earlier entity
+    assert stats["hits"] == 0
+    assert stats["misses"] == len(mesh.vertices) + len(mesh.faces) + 2
+    assert stats["reused_refs"] == 2 * len(mesh.faces)
+
+def test_intern_table_is_bounded(random_mesh):
+    builder = StepBuilder(intern=True, intern_max_entries=10)
+    builder.add_mesh_solid(random_mesh.vertices, random_mesh.faces)
+    stats = builder.intern_stats()
+    assert stats["entries"] <= 10
+    assert stats["evictions"] > 0
+
+def _entity_counts(text):
+    return collections.Counter(re.findall(r"=([A-Z_0-9]+)\(", text))
+
+def _references_are_defined(text):
+    defined = set(re.findall(r"^#(\d+)=", text, re.MULTILINE))
+    return set(re.findall(r"#(\d+)(?!=)", text)) <= defined
+
+# user-017: merged ADVANCED_FACE export
+
+def _region_text(mesh):
+    index = MeshIndex.build(mesh)
+    builder = StepBuilder()
+    builder.add_region_solid(index.vertices, index.faces, index.facet_faces, index.facet_starts,
+                             normals=index.face_normals)
+    return builder.generate_step_from_strategy({"entities": [], "assumptions": []})
+
+def test_merged_box_has_one_face_per_side(box_mesh):
+    text = _region_text(box_mesh)
+    counts = _entity_counts(text)
+    assert counts["ADVANCED_FACE"] == counts["PLANE"] == 6
+    assert counts["EDGE_CURVE"] == 12
+    assert counts["VERTEX_POINT"] == 8
+    assert counts["MANIFOLD_SOLID_BREP"] == 1
+    assert "FACETED_BREP" not in counts
+    assert _references_are_defined(text)
+
+def test_merged_faces_keep_their_holes():
+    ring = trimesh.creation.annulus(r_min=3, r_max=8, height=4, sections=16)
+    counts = _entity_counts(_region_text(ring))
+    # 32 side quads and two caps, each cap bounded by an outer and an inner loop
+    assert counts["ADVANCED_FACE"] == 34
+    assert counts["FACE_BOUND"] == 2
+    assert counts["EDGE_LOOP"] == 36
+
+def test_non_manifold_mesh_falls_back_to_faceted():
+    builder = StepBuilder()
+    builder.add_region_solid([(0, 0, 0), (1, 0, 0), (0, 1, 0)], [[0, 1, 2], [0, 1, 2]], [], [0])
+    counts = _entity_counts("\n".join(builder.entities))
+    assert counts["FACETED_BREP"] == 1
+    assert "ADVANCED_FACE" not in counts
+
+# user-018: AP242 tessellated export
+
+def test_tessellated_box_indexes_one_point_list(box_mesh):
+    builder = StepBuilder(schema="AP242")
+    builder.add_tessellated_solid(box_mesh.vertices, box_mesh.faces)
+    text = builder.generate_step_from_strategy({"entities": [], "assumptions": []})
+    assert "AP242_MANAGED_MODEL_BASED_3D_ENGINEERING_MIM_LF" in text
+    assert re.search(r"=COORDINATES_LIST\('',8,", text)
+    triangles = re.search(r"=TRIANGULATED_FACE\('',#\d+,8,\(\),\$,\(\),\((.*)\)\);", text).group(1)
+    indices = [int(i) for i in re.findall(r"\d+", triangles)]
+    assert len(indices) == 36
+    assert sorted(set(indices)) == list(range(1, 9))
+    assert "TESSELLATED_SHAPE_REPRESENTATION" in text
+    assert _references_are_defined(text)
+
+def test_tessellated_export_needs_triangles():
+    with pytest.raises(ValueError):
+        StepBuilder(schema="AP242").add_tessellated_solid([(0, 0, 0)] * 4, [[0, 1, 2, 3]])
+
+@pytest.mark.parametrize("face_mode", ["merged", "tessellated"])
+def test_build_step_face_modes(box_mesh, tmp_path, face_mode):
+    stl_path = write_stl(box_mesh, str(tmp_path / "box.stl"))
+    step_path = str(tmp_path / f"{face_mode}.step")
+    result = pipeline.build_step(step_path, {"detected_shape": "Box"}, stl_path, face_mode=face_mode)
+    assert result["num_faces"] == 12
+    assert pipeline.FACE_MODE_ASSUMPTIONS[face_mode] in result["strategy"]["assumptions"]
+    with open(step_path) as f:
+        counts = _entity_counts(f.read())
+    assert counts["ADVANCED_FACE" if face_mode == "merged" else "TRIANGULATED_FACE"] > 0
+
+# user-019: faceted export formatted in parallel
+
+def _write_faceted(path, mesh, emit_workers, normals=None):
+    with open(path, "wb") as stream:
+        builder = StepBuilder(stream=stream, emit_workers=emit_workers)
+        builder.add_mesh_solid(mesh.vertices, mesh.faces, normals=normals)
+        builder.generate_step_from_strategy({"entities": [], "assumptions": []})
+    with open(path) as f:
+        return strip_header_time(f.read())
+
+@pytest.fixture
+def small_parallel_chunks(monkeypatch):
+    monkeypatch.setattr(step_builder, "PARALLEL_MIN_FACES", 0)
+    monkeypatch.setattr(step_builder, "PARALLEL_MIN_CHUNK_FACES", 100)
+    monkeypatch.setattr(step_builder, "MESH_CHUNK_FACES", 300)
+
+def test_parallel_emission_matches_single_process(small_parallel_chunks, tmp_path, monkeypatch):
+    calls = []
+    parallel_solid = StepBuilder._add_mesh_solid_parallel
+    monkeypatch.setattr(StepBuilder, "_add_mesh_solid_parallel",
+                        lambda self, *args: calls.append(args[-1]) or parallel_solid(self, *args))
+    mesh = trimesh.creation.icosphere(3)
+    single = _write_faceted(str(tmp_path / "single.step"), mesh, emit_workers=0)
+    parallel = _write_faceted(str(tmp_path / "parallel.step"), mesh, emit_workers=2)
+    assert calls == [1280]
+    assert parallel == single
+    # The part files are cleaned up
+    assert sorted(os.listdir(tmp_path)) == ["parallel.step", "single.step"]
+
+def test_parallel_emission_reads_a_saved_index(small_parallel_chunks, tmp_path):
+    mesh = trimesh.creation.icosphere(3)
+    MeshIndex.build(mesh).save(str(tmp_path / "index"))
+    index = MeshIndex.load(str(tmp_path / "index"))
+    single = _write_faceted(str(tmp_path / "single.step"), index, emit_workers=0, normals=index.face_normals)
+    parallel = _write_faceted(str(tmp_path / "parallel.step"), index, emit_workers=2, normals=index.face_normals)
+    assert parallel == single
@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pytest
+import trimesh
+
+from src import stl_io
+from tests.conftest import write_stl
+
+def _binary_stl(triangles):
+    records = np.zeros(len(triangles), dtype=stl_io.STL_RECORD_DTYPE)
+    records["vertices"] = triangles
+    return b"\0" * 80 + np.uint32(len(triangles)).tobytes() + records.tobytes()
+
+def _nudged_box(scale):
+    """A box STL whose shared corners differ by one float32 ulp between triangles."""
+    triangles = trimesh.creation.box(extents=(4.0, 3.0, 2.0)).triangles.astype(np.float32) * np.float32(scale)
+    corners = triangles.reshape(-1, 3)
+    corners[::2] = np.nextafter(corners[::2], np.float32(np.inf))
+    return _binary_stl(triangles)
+
+# user-004: direct binary STL reader
+
+def test_binary_reader_matches_trimesh(box_mesh, tmp_path):
+    path = write_stl(box_mesh, str(tmp_path / "box.stl"))
+    mesh = stl_io.load_stl(path)
+    reference = trimesh.load(path)
+    assert len(mesh.vertices) == len(reference.vertices) == 8
+    assert len(mesh.faces) == 12
+    assert mesh.is_watertight
+    assert np.allclose(mesh.area, reference.area)
+
+def test_file_objects_are_read_once(box_mesh, tmp_path):
+    path = write_stl(box_mesh, str(tmp_path / "box.stl"))
+    with open(path, "rb") as f:
+        mesh = stl_io.load_stl(f)
+    assert len(mesh.faces) == 12
+
+def test_weld_merges_corners_within_trimesh_tolerance():
+    # At millimetre-to-metre scale one ulp is below trimesh.tol.merge
+    data = _nudged_box(0.001)
+    vertices, faces = stl_io.read_binary_stl(io.BytesIO(data))
+    assert len(vertices) == len(trimesh.load(io.BytesIO(data), file_type="stl").vertices) == 8
+    assert trimesh.Trimesh(vertices=vertices, faces=faces, process=False).is_watertight
+
+def test_weld_keeps_corners_farther_apart_than_the_tolerance():
+    corners = np.array([[0, 0, 0], [1e-6, 0, 0], [0, 1, 0], [-0.0, 0, 0]], dtype=np.float32)
+    vertices, faces = stl_io.weld_vertices(np.concatenate([corners[:3], corners[[3, 2, 1]]]))
+    assert len(vertices) == 3
+    assert faces.tolist() == [[0, 1, 2], [0, 2, 1]]
+
+def test_unwelded_triangles_keep_their_own_corners(box_mesh, tmp_path):
+    path = write_stl(box_mesh, str(tmp_path / "box.stl"))
+    vertices, faces = stl_io.read_binary_stl(path, weld=False)
+    assert len(vertices) == 36
+    assert faces.tolist()[:2] == [[0, 1, 2], [3, 4, 5]]
+
+@pytest.mark.parametrize("data", [b"", b"\0" * 84, b"\0" * 80 + np.uint32(5).tobytes() + b"\0" * 50])
+def test_malformed_binaries_are_rejected(data):
+    assert stl_io.read_binary_stl(io.BytesIO(data)) is None
+
+def test_ascii_stl_falls_back_to_trimesh(box_mesh, tmp_path):
+    path = str(tmp_path / "box_ascii.stl")
+    with open(path, "w") as f:
+        f.write(trimesh.exchange.stl.export_stl_ascii(box_mesh))
+    mesh = stl_io.load_stl(path)
+    assert len(mesh.faces) == 12
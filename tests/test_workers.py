@@ -0,0 +1,60 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from src.workers import ExecutorSaturated, StageExecutor
+
+# user-007: heavy stages run off the event loop, with a bounded queue
+
+def test_stages_run_in_another_process():
+    executor = StageExecutor(1, 0)
+    try:
+        pid = asyncio.run(executor.run(os.getpid))
+    finally:
+        executor.shutdown()
+    assert pid != os.getpid()
+    assert executor.stats()["completed"] == 1
+
+def test_thread_mode_keeps_the_event_loop_free():
+    executor = StageExecutor(0, 0)
+
+    async def main():
+        ticks = 0
+        stage = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+        while not stage.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks, executor.stats()["mode"]
+
+    ticks, mode = asyncio.run(main())
+    executor.shutdown()
+    assert mode == "thread"
+    assert ticks > 5
+
+def test_full_queue_is_rejected():
+    executor = StageExecutor(0, 1)
+    release = threading.Event()
+
+    async def main():
+        running = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.is_saturated()
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+
+    asyncio.run(main())
+    executor.shutdown()
+    assert executor.stats()["rejected"] == 1
+    assert executor.in_flight == 0
+
+def test_stage_errors_reach_the_caller():
+    executor = StageExecutor(0, 0)
+    with pytest.raises(ValueError):
+        asyncio.run(executor.run(int, "not a number"))
+    executor.shutdown()
+    assert executor.in_flight == 0